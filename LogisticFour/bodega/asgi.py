@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LogisticFour.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bodega.settings')
 
-application = get_asgi_application()
+# lo mismo que get_asgi_application(), con el handler que atiende los eventos
+# sin un hilo por cliente (ver core.asgi)
+django.setup(set_prefix=False)
+
+# después de django.setup(): las apps ya están cargadas
+from core.apps import preparar_servidor  # noqa: E402
+from core.asgi import ManejadorASGI  # noqa: E402
+
+application = ManejadorASGI()
+
+preparar_servidor()
@@ -0,0 +1,110 @@
+"""
+Configuración de conexiones a PostgreSQL (Supabase) desde variables de entorno.
+
+Modos soportados:
+
+* Conexiones persistentes (``DB_CONN_MAX_AGE`` segundos, ``None`` = sin límite)
+  con ``CONN_HEALTH_CHECKS`` para descartar conexiones caídas antes de usarlas.
+* Pool de conexiones de psycopg 3 (``DB_POOL=1``; requiere ``psycopg[pool]``).
+  Con pool, Django exige ``CONN_MAX_AGE = 0``: la reutilización la hace el pool.
+* Pooler en modo transacción (``DB_POOLER=transaction``, p.ej. PgBouncer o el
+  puerto 6543 de Supabase): se desactivan los cursores del lado servidor y el
+  binding del lado servidor, que no sobreviven a un cambio de backend entre
+  transacciones. Si no se indica, se asume este modo cuando el puerto es 6543.
+  Ojo: ``LISTEN`` (``EVENTOS_BACKEND=postgres``) necesita conexión directa o
+  pooler en modo sesión.
+"""
+import importlib.util
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+PUERTO_POOLER_TRANSACCION = "6543"
+
+
+def _entero_o_none(valor, defecto):
+    if valor is None or valor == "":
+        return defecto
+    if valor.lower() == "none":
+        return None
+    return int(valor)
+
+
+def _booleano(valor, defecto):
+    if valor is None or valor == "":
+        return defecto
+    return valor.lower() in ("1", "true", "yes", "si", "on")
+
+
+def base_de_datos(prefijo="SUPABASE", entorno=None):
+    """Construye un diccionario de ``DATABASES`` a partir de ``<prefijo>_*`` y ``DB_*``."""
+    env = os.environ if entorno is None else entorno
+    puerto = env.get(f"{prefijo}_PORT", "5432")
+
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get(f"{prefijo}_DBNAME"),
+        "USER": env.get(f"{prefijo}_USER"),
+        "PASSWORD": env.get(f"{prefijo}_PASSWORD"),
+        "HOST": env.get(f"{prefijo}_HOST"),
+        "PORT": puerto,
+        "CONN_MAX_AGE": _entero_o_none(env.get("DB_CONN_MAX_AGE"), 60),
+        "CONN_HEALTH_CHECKS": _booleano(env.get("DB_CONN_HEALTH_CHECKS"), True),
+        "OPTIONS": {
+            "sslmode": env.get("DB_SSLMODE", "require"),
+            "connect_timeout": int(env.get("DB_CONNECT_TIMEOUT", "10")),
+            # detectar conexiones muertas detrás de NAT/balanceadores
+            "keepalives": 1,
+            "keepalives_idle": int(env.get("DB_KEEPALIVES_IDLE", "60")),
+        },
+    }
+
+    pooler = env.get("DB_POOLER") or ("transaction" if puerto == PUERTO_POOLER_TRANSACCION else "")
+    if pooler == "transaction":
+        config["DISABLE_SERVER_SIDE_CURSORS"] = True
+        if _psycopg3_disponible():
+            config["OPTIONS"]["server_side_binding"] = False
+    elif pooler not in ("", "session"):
+        raise ImproperlyConfigured(f"DB_POOLER inválido: {pooler!r} (use 'transaction' o 'session').")
+
+    if _booleano(env.get("DB_POOL"), False):
+        if not _psycopg3_disponible():
+            raise ImproperlyConfigured("DB_POOL=1 requiere psycopg 3 con el extra [pool] instalado.")
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"]["pool"] = {
+            "min_size": int(env.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(env.get("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(env.get("DB_POOL_TIMEOUT", "10")),
+        }
+
+    return config
+
+
+def _psycopg3_disponible():
+    return importlib.util.find_spec("psycopg") is not None
+
+
+def replicas(primaria, entorno=None):
+    """
+    Alias de réplicas de lectura derivados de ``primaria``.
+
+    ``DB_REPLICA_HOSTS`` es una lista ``host[:puerto]`` separada por comas; cada
+    entrada genera ``replica_1``, ``replica_2``... con las mismas credenciales.
+    Con ``DB_REPLICA_ALIAS_DEFAULT=1`` y sin hosts se crea una ``replica`` que
+    apunta a la misma base que la primaria (útil para probar el ruteo en local).
+    En tests las réplicas espejan a ``default``.
+    """
+    env = os.environ if entorno is None else entorno
+    hosts = [h.strip() for h in env.get("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+
+    alias = {}
+    for i, host in enumerate(hosts, start=1):
+        nombre, _, puerto = host.partition(":")
+        config = dict(primaria, HOST=nombre, PORT=puerto or primaria["PORT"], OPTIONS=dict(primaria["OPTIONS"]))
+        alias[f"replica_{i}"] = config
+    if not alias and _booleano(env.get("DB_REPLICA_ALIAS_DEFAULT"), False):
+        alias["replica"] = dict(primaria, OPTIONS=dict(primaria["OPTIONS"]))
+
+    for config in alias.values():
+        config["TEST"] = {"MIRROR": "default"}
+    return alias
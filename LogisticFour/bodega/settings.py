@@ -11,10 +11,15 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from dotenv import load_dotenv
 import os
 
-load_dotenv()
+from bodega.db import base_de_datos, replicas
+
+# .env para desarrollo; en producción y workers las variables ya vienen del
+# entorno y BODEGA_DOTENV=0 evita importar y leer dotenv en cada arranque
+if os.environ.get("BODEGA_DOTENV", "1").lower() not in ("0", "false", "no", "off"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,16 +47,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
 
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.instrumentacion.InstrumentacionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,6 +76,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.notificaciones',
             ],
         },
     },
@@ -79,19 +88,14 @@ WSGI_APPLICATION = 'bodega.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexiones persistentes, pool y modo pooler se controlan con DB_* (ver bodega/db.py)
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": os.environ.get("SUPABASE_DBNAME"),
-        "USER": os.environ.get("SUPABASE_USER"),
-        "PASSWORD": os.environ.get("SUPABASE_PASSWORD"),
-        "HOST": os.environ.get("SUPABASE_HOST"),
-        "PORT": os.environ.get("SUPABASE_PORT", "5432"),
-        "OPTIONS": {
-            "sslmode": "require"
-        }
-    }
+    "default": base_de_datos("SUPABASE"),
 }
+# Réplicas de lectura opcionales (DB_REPLICA_HOSTS / DB_REPLICA_ALIAS_DEFAULT)
+DATABASES.update(replicas(DATABASES["default"]))
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+DB_REPLICA_PEGADO_SEGUNDOS = int(os.environ.get("DB_REPLICA_PEGADO_SEGUNDOS", "5"))
 
 
 # Password validation
@@ -136,7 +140,100 @@ STATICFILES_DIRS = [BASE_DIR / "Static"]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché: Redis si hay REDIS_URL (compartida entre procesos), si no memoria local
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Bitácora de auditoría (core.services.auditoria)
+# "directo": fuera de transacciones se escribe de inmediato; "hilo": cola acotada + hilo escritor
+AUDITORIA_MODO = os.environ.get("AUDITORIA_MODO", "directo")
+AUDITORIA_COLA_MAX = int(os.environ.get("AUDITORIA_COLA_MAX", "10000"))
+AUDITORIA_LOTE = int(os.environ.get("AUDITORIA_LOTE", "500"))
+AUDITORIA_TIMEOUT_COLA = float(os.environ.get("AUDITORIA_TIMEOUT_COLA", "1.0"))
+
+# Archivo histórico (manage.py archivar_historico)
+ARCHIVO_HISTORICO_DIR = Path(os.environ.get("ARCHIVO_HISTORICO_DIR", BASE_DIR / "archivo"))
+ARCHIVO_HISTORICO_DIAS = int(os.environ.get("ARCHIVO_HISTORICO_DIAS", "180"))
+
+# Eventos en vivo (core.services.eventos)
+# "local": pub/sub en memoria del proceso; "postgres": LISTEN/NOTIFY entre procesos
+EVENTOS_BACKEND = os.environ.get("EVENTOS_BACKEND", "local")
+EVENTOS_LATIDO = int(os.environ.get("EVENTOS_LATIDO", "15"))
+EVENTOS_LONG_POLL = int(os.environ.get("EVENTOS_LONG_POLL", "25"))
+EVENTOS_HISTORIAL = int(os.environ.get("EVENTOS_HISTORIAL", "500"))
+
+# Costeo de inventario (core.services.costeo): "PROMEDIO" o "FIFO"
+COSTEO_METODO = os.environ.get("COSTEO_METODO", "PROMEDIO")
+
+# Conciliación de compras (core.services.conciliacion): tolerancia en % sobre lo pedido
+CONCILIACION_TOLERANCIA_PCT = float(os.environ.get("CONCILIACION_TOLERANCIA_PCT", "2"))
+
+# Portal de proveedores (core.services.portal_proveedor)
+PORTAL_PROVEEDOR_CACHE_SEGUNDOS = int(os.environ.get("PORTAL_PROVEEDOR_CACHE_SEGUNDOS", "300"))
+
+# Desempeño de proveedores (core.services.desempeno): ventana móvil en días
+DESEMPENO_VENTANA_DIAS = int(os.environ.get("DESEMPENO_VENTANA_DIAS", "365"))
+
+# Resolución de escaneos (core.services.escaneo)
+# ESCANEO_PRECALENTAR: construir el índice al arrancar los workers web (bodega.wsgi / bodega.asgi; los
+# comandos de gestión no lo hacen); ESCANEO_TTL: reconstrucción periódica
+ESCANEO_PRECALENTAR = os.environ.get("ESCANEO_PRECALENTAR", "1").lower() in ("1", "true", "yes", "si", "on")
+ESCANEO_TTL = int(os.environ.get("ESCANEO_TTL", "300"))
+
+# Vencimientos (manage.py revisar_vencimientos); el horizonte de aviso es configuracion["dias"] de la regla EXPIRY_SOON
+VENCIMIENTO_UBICACION_CUARENTENA = os.environ.get("VENCIMIENTO_UBICACION_CUARENTENA", "CUARENTENA")
+
+# Tablero (core.services.indicadores): caché por bodega y ventana de exactitud de recuentos
+INDICADORES_CACHE_SEGUNDOS = int(os.environ.get("INDICADORES_CACHE_SEGUNDOS", "60"))
+INDICADORES_VENTANA_RECUENTO_DIAS = int(os.environ.get("INDICADORES_VENTANA_RECUENTO_DIAS", "30"))
+
+# Instrumentación de consultas por petición (core.instrumentacion)
+# Presupuestos por nombre de URL, p. ej. {"dashboard": {"consultas": 10, "ms_db": 100}};
+# las vistas sin entrada usan los máximos generales; None en una clave = sin límite
+INSTRUMENTACION_ACTIVA = os.environ.get("INSTRUMENTACION_ACTIVA", "1").lower() in ("1", "true", "yes", "si", "on")
+INSTRUMENTACION_CONSULTAS_MAX = int(os.environ.get("INSTRUMENTACION_CONSULTAS_MAX", "50"))
+INSTRUMENTACION_DB_MS_MAX = float(os.environ.get("INSTRUMENTACION_DB_MS_MAX", "500"))
+INSTRUMENTACION_CONSULTA_LENTA_MS = float(os.environ.get("INSTRUMENTACION_CONSULTA_LENTA_MS", "500"))
+INSTRUMENTACION_TOP_LENTAS = int(os.environ.get("INSTRUMENTACION_TOP_LENTAS", "5"))
+INSTRUMENTACION_PRESUPUESTOS = {
+    "dashboard": {"consultas": 12, "ms_db": 100},
+    "productos_buscar": {"consultas": 5, "ms_db": 200},
+    "escaneo_resolver": {"consultas": 5},
+    # las exportaciones y la trazabilidad recorren volúmenes grandes a propósito
+    "exportar_datos": {"consultas": None, "ms_db": None},
+    "trazabilidad_lote": {"consultas": None, "ms_db": None},
+    "trazabilidad_serie": {"ms_db": 2000},
+}
+# Token para GET /metricas/ (Authorization: Bearer <token>); sin token sólo superusuarios
+INSTRUMENTACION_METRICAS_TOKEN = os.environ.get("INSTRUMENTACION_METRICAS_TOKEN", "")
+
+# Perfilado de comandos (--profile, core.perfilado)
+# PERFILADO_MUESTREO: fracción de corridas con --cprofile que guardan el volcado de cProfile
+PERFILADO_DIR = Path(os.environ.get("PERFILADO_DIR", BASE_DIR / "perfiles"))
+PERFILADO_MUESTREO = float(os.environ.get("PERFILADO_MUESTREO", "1.0"))
+
+# Trabajos en segundo plano (core.services.trabajos, manage.py procesar_trabajos)
+# Reintentos con backoff exponencial BASE·2^(intento-1) hasta MAX segundos; un trabajo
+# sin latido por TIMEOUT segundos se da por huérfano y vuelve a la cola
+TRABAJOS_MAX_INTENTOS = int(os.environ.get("TRABAJOS_MAX_INTENTOS", "5"))
+TRABAJOS_BACKOFF_BASE = float(os.environ.get("TRABAJOS_BACKOFF_BASE", "10"))
+TRABAJOS_BACKOFF_MAX = float(os.environ.get("TRABAJOS_BACKOFF_MAX", "3600"))
+TRABAJOS_LATIDO_SEGUNDOS = float(os.environ.get("TRABAJOS_LATIDO_SEGUNDOS", "10"))
+TRABAJOS_TIMEOUT_SEGUNDOS = int(os.environ.get("TRABAJOS_TIMEOUT_SEGUNDOS", "300"))
+TRABAJOS_ESPERA_MAX_SEGUNDOS = float(os.environ.get("TRABAJOS_ESPERA_MAX_SEGUNDOS", "2"))
@@ -0,0 +1,23 @@
+"""
+Settings para workers y tareas programadas (``python worker.py <comando>``).
+
+Parte de ``bodega.settings`` y quita lo que sólo usa la web: admin, sesiones,
+mensajes y archivos estáticos (sus ``ready()``, chequeos y el autodiscover del
+admin cuestan en cada arranque), el middleware y la URLconf completa. El
+índice de escaneo no se precalienta: los workers no resuelven escaneos.
+"""
+from bodega.settings import *  # noqa: F401,F403
+from bodega.settings import INSTALLED_APPS
+
+_SOLO_WEB = {
+    "django.contrib.admin",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in _SOLO_WEB]
+MIDDLEWARE = []
+ROOT_URLCONF = "bodega.urls_worker"
+ESCANEO_PRECALENTAR = False
+INSTRUMENTACION_ACTIVA = False
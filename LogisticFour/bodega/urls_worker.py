@@ -0,0 +1,2 @@
+"""URLconf vacía para ``bodega.settings_worker``: los workers no sirven HTTP."""
+urlpatterns = []
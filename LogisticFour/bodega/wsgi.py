@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LogisticFour.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bodega.settings')
 
 application = get_wsgi_application()
+
+# después de get_*_application(): las apps ya están cargadas
+from core.apps import preparar_servidor  # noqa: E402
+
+preparar_servidor()
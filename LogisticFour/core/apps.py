@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import signals  # noqa: F401
+
+
+def preparar_servidor():
+    """
+    Arranque propio de los procesos web (``bodega.wsgi`` / ``bodega.asgi``,
+    que también usa runserver). No corre en ``ready()`` para que los comandos
+    de gestión y los workers no abran conexiones que no van a usar.
+    """
+    from django.conf import settings
+
+    if getattr(settings, "ESCANEO_PRECALENTAR", True):
+        from core.services import escaneo
+        escaneo.precalentar_en_segundo_plano()
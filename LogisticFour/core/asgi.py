@@ -0,0 +1,34 @@
+"""
+Handler ASGI del proyecto (``bodega.asgi``).
+
+Django atiende cada petición dentro de un ``ThreadSensitiveContext``: el código
+síncrono de la petición (señales ``request_started``/``request_finished``,
+middleware síncrono, ORM) corre en un hilo propio que vive hasta que la
+respuesta termina. Para un stream de eventos o un long-poll eso es un hilo
+ocioso por cliente conectado.
+
+``ManejadorASGI`` atiende las rutas de eventos sin ese contexto: los tramos
+síncronos sensibles al hilo (señales y middleware, al conectar y al cerrar)
+comparten el hilo único de asgiref, y las vistas hacen sus consultas con
+``sync_to_async(thread_sensitive=False)`` cerrando la conexión al terminar
+(``core.views._usuario_y_rol``). El resto de las rutas no cambia.
+"""
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import reverse
+
+RUTAS_SIN_HILO = ("eventos_stream", "eventos_poll")
+
+
+class ManejadorASGI(ASGIHandler):
+    _rutas_sin_hilo = None
+
+    def sin_hilo_propio(self, scope):
+        if self._rutas_sin_hilo is None:
+            self._rutas_sin_hilo = {reverse(nombre) for nombre in RUTAS_SIN_HILO}
+        return scope["type"] == "http" and scope["path"] in self._rutas_sin_hilo
+
+    async def __call__(self, scope, receive, send):
+        if self.sin_hilo_propio(scope):
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
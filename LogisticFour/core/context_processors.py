@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from core.services import notificaciones as notificaciones_service
+
+
+def notificaciones(request):
+    """Expone el contador de no leídas; sólo consulta si la plantilla lo usa."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {"notificaciones_no_leidas": SimpleLazyObject(lambda: notificaciones_service.no_leidas(user))}
@@ -0,0 +1,317 @@
+"""
+Instrumentación de consultas SQL por petición.
+
+Cada conexión lleva un ``execute_wrapper`` permanente (se instala al
+conectar) que alimenta las mediciones activas del contexto (``ContextVar``);
+como ``sync_to_async`` copia el contexto, las consultas que una vista async
+hace en otro hilo también cuentan. ``InstrumentacionMiddleware`` (sync y
+async) abre una medición por petición: cuenta las consultas, suma el tiempo de base de
+datos y guarda las ``INSTRUMENTACION_TOP_LENTAS`` sentencias más lentas. Al
+terminar:
+
+* alimenta histogramas por nombre de URL (duración de la petición, consultas
+  y tiempo de base de datos) que ``metricas_prometheus`` expone en formato de
+  texto de Prometheus (vista ``core.views.metricas``);
+* registra en el logger ``core.instrumentacion`` las peticiones que exceden
+  el presupuesto de su vista (``INSTRUMENTACION_PRESUPUESTOS``, con
+  ``INSTRUMENTACION_CONSULTAS_MAX`` / ``INSTRUMENTACION_DB_MS_MAX`` por
+  defecto) junto con las sentencias más lentas, y cada sentencia que supera
+  ``INSTRUMENTACION_CONSULTA_LENTA_MS``.
+
+Las respuestas en streaming (exportaciones, trazabilidad) se miden hasta el
+último trozo enviado. Los histogramas son por proceso: con varios workers
+cada uno expone los suyos y Prometheus los suma por instancia.
+
+``core.testing`` usa ``medir`` y ``excesos`` para fallar los tests de vistas
+que superan su presupuesto.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+SIN_RUTA = "<sin_ruta>"
+_mediciones = ContextVar("mediciones_activas", default=())
+# límites superiores de los buckets (la clase +Inf es implícita)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _config(nombre, defecto):
+    return getattr(settings, f"INSTRUMENTACION_{nombre}", defecto)
+
+
+# -------------------- Medición por petición --------------------
+@dataclass
+class Medicion:
+    consultas: int = 0
+    segundos_db: float = 0.0
+    lentas: list = field(default_factory=list)     # heap de (segundos, orden, alias, sql)
+    top: int = 5
+
+    @property
+    def ms_db(self):
+        return self.segundos_db * 1000
+
+    def sentencias_lentas(self):
+        """Las más lentas primero, como dicts serializables."""
+        return [
+            {"ms": round(segundos * 1000, 2), "alias": alias, "sql": sql}
+            for segundos, _, alias, sql in sorted(self.lentas, reverse=True)
+        ]
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            transcurrido = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos_db += transcurrido
+            alias = context["connection"].alias
+            entrada = (transcurrido, self.consultas, alias, sql)
+            if len(self.lentas) < self.top:
+                heapq.heappush(self.lentas, entrada)
+            elif transcurrido > self.lentas[0][0]:
+                heapq.heapreplace(self.lentas, entrada)
+            umbral = _config("CONSULTA_LENTA_MS", 500)
+            if umbral and transcurrido * 1000 >= umbral:
+                logger.warning(
+                    "Consulta lenta (%.1f ms) en %s: %s", transcurrido * 1000, alias, sql[:2000],
+                    extra={"db_alias": alias, "ms": round(transcurrido * 1000, 2)},
+                )
+
+
+def _envoltura(execute, sql, params, many, context):
+    for medicion in _mediciones.get():
+        execute = partial(medicion, execute)
+    return execute(sql, params, many, context)
+
+
+def _instalar(conexion):
+    # al principio de la lista: los execute_wrapper temporales se quitan del final
+    if _envoltura not in conexion.execute_wrappers:
+        conexion.execute_wrappers.insert(0, _envoltura)
+
+
+@receiver(connection_created)
+def _al_conectar(sender, connection, **kwargs):
+    _instalar(connection)
+
+
+@contextmanager
+def medir(top=None):
+    """
+    Mide las consultas de todas las conexiones mientras dura el bloque, en este
+    hilo y en los que hereden el contexto (``sync_to_async``).
+    """
+    medicion = Medicion(top=top or _config("TOP_LENTAS", 5))
+    for alias in settings.DATABASES:
+        _instalar(connections[alias])
+    token = _mediciones.set(_mediciones.get() + (medicion,))
+    try:
+        yield medicion
+    finally:
+        _mediciones.reset(token)
+
+
+# -------------------- Presupuestos --------------------
+def presupuesto(nombre_vista):
+    """``{"consultas": n, "ms_db": ms}`` para la vista; ``None`` en una clave = sin límite."""
+    propio = _config("PRESUPUESTOS", {}).get(nombre_vista, {})
+    return {
+        "consultas": propio.get("consultas", _config("CONSULTAS_MAX", None)),
+        "ms_db": propio.get("ms_db", _config("DB_MS_MAX", None)),
+    }
+
+
+def excesos(medicion, limites):
+    """Descripciones de los límites superados (lista vacía si está dentro del presupuesto)."""
+    resultado = []
+    if limites.get("consultas") is not None and medicion.consultas > limites["consultas"]:
+        resultado.append(f"{medicion.consultas} consultas (máximo {limites['consultas']})")
+    if limites.get("ms_db") is not None and medicion.ms_db > limites["ms_db"]:
+        resultado.append(f"{medicion.ms_db:.1f} ms de base de datos (máximo {limites['ms_db']} ms)")
+    return resultado
+
+
+# -------------------- Histogramas --------------------
+class Histograma:
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(buckets)
+        self._series = {}        # vista -> ([conteo por bucket..., +Inf], suma)
+        self._lock = threading.Lock()
+
+    def observar(self, vista, valor):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            conteos, suma = self._series.get(vista) or ([0] * (len(self.buckets) + 1), 0.0)
+            conteos[indice] += 1
+            self._series[vista] = (conteos, suma + valor)
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+
+    def exposicion(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = sorted((vista, list(conteos), suma) for vista, (conteos, suma) in self._series.items())
+        for vista, conteos, suma in series:
+            etiqueta = vista.replace("\\", "\\\\").replace('"', '\\"')
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ("+Inf",), conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{vista="{etiqueta}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{{vista="{etiqueta}"}} {suma:.6f}')
+            lineas.append(f'{self.nombre}_count{{vista="{etiqueta}"}} {acumulado}')
+        return lineas
+
+
+DURACION = Histograma("bodega_peticion_segundos", "Duración de la petición por vista.", BUCKETS_SEGUNDOS)
+CONSULTAS = Histograma("bodega_peticion_consultas", "Consultas SQL por petición y vista.", BUCKETS_CONSULTAS)
+TIEMPO_DB = Histograma("bodega_peticion_db_segundos", "Tiempo de base de datos por petición y vista.", BUCKETS_SEGUNDOS)
+HISTOGRAMAS = (DURACION, CONSULTAS, TIEMPO_DB)
+
+
+def metricas_prometheus():
+    lineas = []
+    for histograma in HISTOGRAMAS:
+        lineas.extend(histograma.exposicion())
+    return "\n".join(lineas) + "\n"
+
+
+def reiniciar():
+    for histograma in HISTOGRAMAS:
+        histograma.reiniciar()
+
+
+# -------------------- Middleware --------------------
+def nombre_vista(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name if match else None) or SIN_RUTA
+
+
+def registrar(request, medicion, segundos):
+    vista = nombre_vista(request)
+    DURACION.observar(vista, segundos)
+    CONSULTAS.observar(vista, medicion.consultas)
+    TIEMPO_DB.observar(vista, medicion.segundos_db)
+    superados = excesos(medicion, presupuesto(vista))
+    if superados:
+        logger.warning(
+            "%s %s (%s) excede su presupuesto: %s", request.method, request.path, vista, "; ".join(superados),
+            extra={
+                "vista": vista, "consultas": medicion.consultas, "ms_db": round(medicion.ms_db, 2),
+                "ms_total": round(segundos * 1000, 2), "lentas": medicion.sentencias_lentas(),
+            },
+        )
+
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _config("ACTIVA", True):
+            return self.get_response(request)
+        inicio = time.perf_counter()
+        pila = ExitStack()
+        medicion = pila.enter_context(medir())
+        request.instrumentacion = medicion
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            pila.close()
+            registrar(request, medicion, time.perf_counter() - inicio)
+            raise
+        if response.streaming and not response.is_async:
+            response.streaming_content = _CuerpoMedido(response.streaming_content, pila, request, medicion, inicio)
+            return response
+        pila.close()
+        registrar(request, medicion, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        # sin esta rama Django adaptaría las vistas async (eventos en vivo) a un hilo
+        if not _config("ACTIVA", True):
+            return await self.get_response(request)
+        inicio = time.perf_counter()
+        with medir() as medicion:
+            request.instrumentacion = medicion
+            try:
+                response = await self.get_response(request)
+            except BaseException:
+                registrar(request, medicion, time.perf_counter() - inicio)
+                raise
+        if response.streaming and response.is_async:
+            response.streaming_content = _cuerpo_medido_async(response.streaming_content, request, medicion, inicio)
+            return response
+        registrar(request, medicion, time.perf_counter() - inicio)
+        return response
+
+
+async def _cuerpo_medido_async(contenido, request, medicion, inicio):
+    """
+    Equivalente async de ``_CuerpoMedido``. Django consume el cuerpo en la
+    misma tarea que llamó al middleware, ya fuera de ``medir``: la medición se
+    reactiva aquí.
+    """
+    token = _mediciones.set(_mediciones.get() + (medicion,))
+    try:
+        async for trozo in contenido:
+            yield trozo
+    finally:
+        _mediciones.reset(token)
+        registrar(request, medicion, time.perf_counter() - inicio)
+
+
+class _CuerpoMedido:
+    """
+    El cuerpo en streaming se genera después de salir del middleware: se mide
+    hasta el último trozo y se cierra la medición con ``close()``, que el
+    servidor llama aunque el cliente corte antes de empezar.
+    """
+
+    def __init__(self, contenido, pila, request, medicion, inicio):
+        self.contenido = contenido
+        self.pila = pila
+        self.request = request
+        self.medicion = medicion
+        self.inicio = inicio
+        self.cerrado = False
+
+    def __iter__(self):
+        try:
+            yield from self.contenido
+        finally:
+            self.close()
+
+    def close(self):
+        if self.cerrado:
+            return
+        self.cerrado = True
+        self.pila.close()
+        registrar(self.request, self.medicion, time.perf_counter() - self.inicio)
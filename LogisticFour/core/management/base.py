@@ -0,0 +1,39 @@
+"""
+Base de los comandos de gestión del proyecto.
+
+``ComandoPerfilable`` agrega ``--profile`` (alias ``--perfilar``) y
+``--cprofile``: el comando corre dentro de una ``core.perfilado.corrida`` con
+su nombre, y al terminar imprime el desglose por etapa y la ruta del resultado
+guardado.
+"""
+from django.core.management.base import BaseCommand
+
+from core import perfilado
+
+
+class ComandoPerfilable(BaseCommand):
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        self._nombre_comando = subcommand
+        parser.add_argument(
+            "--profile", "--perfilar", dest="perfilar", action="store_true",
+            help="Mide tiempo, CPU, consultas y filas por etapa e imprime el desglose.",
+        )
+        parser.add_argument(
+            "--cprofile", action="store_true",
+            help="Con --profile, guarda además un volcado de cProfile (según PERFILADO_MUESTREO).",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        if not options.get("perfilar"):
+            return super().execute(*args, **options)
+        nombre = getattr(self, "_nombre_comando", None) or self.__module__.rsplit(".", 1)[-1]
+        with perfilado.corrida(nombre, cprofile=options.get("cprofile", False)) as corrida:
+            salida = super().execute(*args, **options)
+        self.stdout.write("")
+        self.stdout.write(corrida.resumen())
+        self.stdout.write(f"Perfil {corrida.id} guardado en {corrida.ruta_json}")
+        if corrida.ruta_prof:
+            self.stdout.write(f"cProfile: {corrida.ruta_prof}")
+        return salida
@@ -0,0 +1,22 @@
+from core.management.base import ComandoPerfilable
+from core.services import desempeno
+
+
+class Command(ComandoPerfilable):
+    help = "Recalcula lead time (p50/p90) y tasa de cumplimiento por proveedor y producto."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--proveedor", type=int, help="Limitar a este id de proveedor.")
+        parser.add_argument(
+            "--sincronizar-tiempos", action="store_true",
+            help="Actualizar ProductoUsuarioProveedor.tiempo_entrega_dias con el p90 observado.",
+        )
+        parser.add_argument("--minimo-recepciones", type=int, default=3,
+                            help="Recepciones mínimas para confiar en el p90 al sincronizar.")
+
+    def handle(self, *args, **opts):
+        escritas = desempeno.recalcular(opts["proveedor"])
+        self.stdout.write(self.style.SUCCESS(f"{escritas} pares proveedor/producto actualizados."))
+        if opts["sincronizar_tiempos"]:
+            n = desempeno.sincronizar_tiempos_entrega(opts["minimo_recepciones"])
+            self.stdout.write(f"{n} tiempos de entrega actualizados.")
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from core.management.base import ComandoPerfilable
+from core.services import archivo
+
+
+class Command(ComandoPerfilable):
+    help = "Mueve bitácora y notificaciones antiguas a archivos mensuales comprimidos y las borra por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias", type=int, default=getattr(settings, "ARCHIVO_HISTORICO_DIAS", 180),
+            help="Antigüedad mínima (en días) de las filas a archivar.",
+        )
+        parser.add_argument(
+            "--modelos", nargs="+", choices=sorted(archivo.ARCHIVABLES), default=sorted(archivo.ARCHIVABLES),
+        )
+        parser.add_argument("--formato", choices=["jsonl", "parquet"], default="jsonl")
+        parser.add_argument("--lote", type=int, default=5000, help="Filas por lote de exportación/borrado.")
+        parser.add_argument("--destino", help="Directorio raíz del archivo (por defecto ARCHIVO_HISTORICO_DIR).")
+
+    def handle(self, *args, **opts):
+        if opts["dias"] < 1:
+            raise CommandError("--dias debe ser mayor o igual a 1.")
+        corte = timezone.now() - timedelta(days=opts["dias"])
+
+        for nombre in opts["modelos"]:
+            try:
+                exportadas, borradas = archivo.archivar(
+                    nombre, corte, formato=opts["formato"], lote=opts["lote"], destino=opts["destino"],
+                )
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre}: {exportadas} filas archivadas, {borradas} borradas (anteriores a {corte:%Y-%m-%d})."
+            ))
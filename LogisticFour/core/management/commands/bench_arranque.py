@@ -0,0 +1,97 @@
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# sin trabajo de base de datos: mide sólo el arranque
+COMANDO_POR_DEFECTO = "consolidar_indicadores --horas 0 --dias 0"
+
+
+def _importtime(salida):
+    """``[(profundidad, modulo, propio_us, acumulado_us)]`` desde la salida de ``-X importtime``."""
+    modulos = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "[us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2 - 1
+        modulos.append((profundidad, nombre.strip(), int(propio), int(acumulado)))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el arranque de manage.py frente a worker.py (settings livianos, sin chequeos del sistema): "
+        "tiempo de pared por corrida y desglose de imports con -X importtime."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--comando", default=COMANDO_POR_DEFECTO, help="Comando y opciones a lanzar en cada corrida.")
+        parser.add_argument("--repeticiones", type=int, default=10)
+        parser.add_argument("--settings-worker", default="bodega.settings_worker")
+        parser.add_argument("--top", type=int, default=15, help="Módulos de primer nivel a listar por escenario.")
+        parser.add_argument("--salida", help="Archivo JSON donde guardar el resultado.")
+
+    def _escenarios(self, opts):
+        comando = shlex.split(opts["comando"])
+        entorno = dict(os.environ)
+        entorno.setdefault("DJANGO_SETTINGS_MODULE", "bodega.settings")
+        # un worker en producción recibe las variables del entorno y no lee .env
+        worker = dict(entorno, DJANGO_SETTINGS_MODULE=opts["settings_worker"], BODEGA_DOTENV="0")
+        return {
+            "python": (["-c", "pass"], entorno),
+            "manage.py": (["manage.py", *comando], entorno),
+            "worker.py": (["worker.py", *comando], worker),
+        }
+
+    def _correr(self, argumentos, entorno, *flags):
+        inicio = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, *flags, *argumentos], cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+        )
+        transcurrido = time.perf_counter() - inicio
+        if proceso.returncode:
+            raise CommandError(f"{' '.join(argumentos)} falló:\n{proceso.stderr[-2000:]}")
+        return transcurrido, proceso.stderr
+
+    def handle(self, *args, **opts):
+        resultado = {"comando": opts["comando"], "python": sys.version.split()[0], "escenarios": {}}
+        escenarios = self._escenarios(opts)
+        tiempos = {nombre: [] for nombre in escenarios}
+        for argumentos, entorno in escenarios.values():
+            self._correr(argumentos, entorno)          # calienta la caché de bytecode y del sistema de archivos
+        # intercaladas, para que el ruido de la máquina afecte a todos los escenarios por igual
+        for _ in range(opts["repeticiones"]):
+            for nombre, (argumentos, entorno) in escenarios.items():
+                tiempos[nombre].append(self._correr(argumentos, entorno)[0] * 1000)
+
+        for nombre, (argumentos, entorno) in escenarios.items():
+            modulos = _importtime(self._correr(argumentos, entorno, "-X", "importtime")[1])
+            primer_nivel = sorted((m for m in modulos if m[0] == 0), key=lambda m: m[3], reverse=True)
+            resultado["escenarios"][nombre] = {
+                "mediana_ms": round(statistics.median(tiempos[nombre]), 1),
+                "min_ms": round(min(tiempos[nombre]), 1),
+                "max_ms": round(max(tiempos[nombre]), 1),
+                "imports_ms": round(sum(m[3] for m in primer_nivel) / 1000, 1),
+                "modulos": len(modulos),
+                "proyecto_ms": round(sum(m[2] for m in modulos if m[1].split(".")[0] in ("core", "bodega")) / 1000, 1),
+                "top": [{"modulo": m[1], "ms": round(m[3] / 1000, 1)} for m in primer_nivel[:opts["top"]]],
+            }
+
+        for nombre, datos in resultado["escenarios"].items():
+            self.stdout.write(
+                f"{nombre:<10} mediana {datos['mediana_ms']:>7.1f} ms  (mín {datos['min_ms']:.1f}, máx {datos['max_ms']:.1f})  "
+                f"imports {datos['imports_ms']:>6.1f} ms en {datos['modulos']} módulos, proyecto {datos['proyecto_ms']:.1f} ms"
+            )
+            for modulo in datos["top"]:
+                self.stdout.write(f"    {modulo['ms']:>7.1f} ms  {modulo['modulo']}")
+        if opts["salida"]:
+            Path(opts["salida"]).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {opts['salida']}."))
@@ -0,0 +1,98 @@
+import copy
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from bodega.db import _psycopg3_disponible
+
+
+def _percentil(valores, p):
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia por petición de los modos de conexión (sin persistencia, "
+        "persistente, pooler en modo transacción y pool de psycopg) contra una base PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--peticiones", type=int, default=200)
+        parser.add_argument("--consultas", type=int, default=3, help="Consultas por petición simulada.")
+        parser.add_argument("--modos", nargs="+", choices=["nueva", "persistente", "pooler", "pool"])
+        parser.add_argument("--host", help="Sobrescribe HOST (p.ej. localhost para un PostgreSQL local).")
+        parser.add_argument("--puerto")
+        parser.add_argument("--nombre")
+        parser.add_argument("--usuario")
+        parser.add_argument("--password")
+        parser.add_argument("--sslmode", help="p.ej. disable para un PostgreSQL local sin TLS.")
+        parser.add_argument("--json", action="store_true", help="Imprime el resultado como JSON.")
+
+    def _base(self, opts):
+        base = copy.deepcopy(connections.settings["default"])
+        for opcion, clave in (("host", "HOST"), ("puerto", "PORT"), ("nombre", "NAME"),
+                              ("usuario", "USER"), ("password", "PASSWORD")):
+            if opts[opcion] is not None:
+                base[clave] = opts[opcion]
+        base["OPTIONS"] = {k: v for k, v in base["OPTIONS"].items() if k != "pool"}
+        if opts["sslmode"]:
+            base["OPTIONS"]["sslmode"] = opts["sslmode"]
+        return base
+
+    def _modos(self, base):
+        nueva = dict(copy.deepcopy(base), CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+        persistente = dict(copy.deepcopy(base), CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        pooler = dict(copy.deepcopy(persistente), DISABLE_SERVER_SIDE_CURSORS=True)
+        modos = {"nueva": nueva, "persistente": persistente, "pooler": pooler}
+        if _psycopg3_disponible():
+            pool = dict(copy.deepcopy(base), CONN_MAX_AGE=0)
+            pool["OPTIONS"]["pool"] = {"min_size": 1, "max_size": 4}
+            modos["pool"] = pool
+        return modos
+
+    def _medir(self, alias, peticiones, consultas):
+        conn = connections[alias]
+        tiempos = []
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            # mismo ciclo que request_started / request_finished
+            conn.close_if_unusable_or_obsolete()
+            with conn.cursor() as cursor:
+                for _ in range(consultas):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            conn.close_if_unusable_or_obsolete()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        conn.close()
+        if getattr(conn, "pool", None):
+            conn.close_pool()
+        return {
+            "peticiones": peticiones,
+            "media_ms": round(statistics.fmean(tiempos), 3),
+            "p50_ms": round(_percentil(tiempos, 50), 3),
+            "p99_ms": round(_percentil(tiempos, 99), 3),
+        }
+
+    def handle(self, *args, **opts):
+        modos = self._modos(self._base(opts))
+        seleccion = opts["modos"] or list(modos)
+
+        resultados = {}
+        for nombre in seleccion:
+            if nombre not in modos:
+                self.stderr.write(f"{nombre}: omitido (requiere psycopg 3 con [pool]).")
+                continue
+            alias = f"bench_{nombre}"
+            connections.settings[alias] = modos[nombre]
+            resultados[nombre] = self._medir(alias, opts["peticiones"], opts["consultas"])
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for nombre, r in resultados.items():
+            self.stdout.write(f"{nombre:<12} media {r['media_ms']:>8.3f} ms   p50 {r['p50_ms']:>8.3f} ms   p99 {r['p99_ms']:>8.3f} ms")
@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p99), throughput y consultas por operación de posteo, reserva, listado, "
+        "búsqueda, kardex y barrido de alertas; guarda el resultado como JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operaciones", nargs="+", choices=list(benchmark.OPERACIONES))
+        parser.add_argument("--iteraciones", type=int, default=100)
+        parser.add_argument("--calentamiento", type=int, default=5)
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--confirmar", action="store_true", help="Confirmar las escrituras en vez de revertirlas.")
+        parser.add_argument("--salida", help="Archivo JSON donde guardar el resultado.")
+        parser.add_argument("--comparar", help="Resultado JSON anterior contra el cual comparar.")
+
+    def _fila(self, nombre, r):
+        self.stdout.write(
+            f"{nombre:<10} p50 {r['p50_ms']:>9.3f} ms   p99 {r['p99_ms']:>9.3f} ms   "
+            f"{r['ops_por_s']:>9.1f} ops/s   consultas {r['consultas_media']:>6.2f} (máx {r['consultas_max']})"
+        )
+
+    def handle(self, *args, **opts):
+        anterior = None
+        if opts["comparar"]:
+            try:
+                anterior = json.loads(Path(opts["comparar"]).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"No se pudo leer {opts['comparar']}: {exc}")
+        try:
+            resultado = benchmark.ejecutar(
+                opts["operaciones"], iteraciones=opts["iteraciones"], calentamiento=opts["calentamiento"],
+                confirmar=opts["confirmar"], semilla=opts["semilla"], informar=self._fila,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if anterior is not None:
+            resultado["comparacion"] = benchmark.comparar(resultado, anterior)
+            for nombre, deltas in resultado["comparacion"].items():
+                cambios = "   ".join(f"{m} {'—' if v is None else f'{v:+.1f} %'}" for m, v in deltas.items())
+                self.stdout.write(f"{nombre:<10} vs. anterior: {cambios}")
+        if opts["salida"]:
+            Path(opts["salida"]).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {opts['salida']}."))
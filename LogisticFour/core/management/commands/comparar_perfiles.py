@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import perfilado
+
+
+class Command(BaseCommand):
+    help = "Compara dos corridas guardadas con --profile (variación % por etapa)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("actual", help="Id de la corrida (o ruta a su .json).")
+        parser.add_argument("anterior", help="Id de la corrida de referencia (o ruta a su .json).")
+        parser.add_argument("--json", action="store_true", help="Imprime la comparación como JSON.")
+
+    def handle(self, *args, **opts):
+        try:
+            actual = perfilado.cargar(opts["actual"])
+            anterior = perfilado.cargar(opts["anterior"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo leer la corrida: {exc}")
+        deltas = perfilado.comparar(actual, anterior)
+        if opts["json"]:
+            self.stdout.write(json.dumps(deltas, indent=2))
+            return
+        self.stdout.write(f"{'etapa':<40} {'pared':>8} {'cpu':>8} {'consultas':>9} {'filas/s':>8}")
+        for nombre, variacion in deltas.items():
+            celdas = [f"{v:+.1f}%" if v is not None else "-" for v in variacion.values()]
+            self.stdout.write(f"{nombre[:40]:<40} {celdas[0]:>8} {celdas[1]:>8} {celdas[2]:>9} {celdas[3]:>8}")
+        self.stdout.write(self.style.SUCCESS(f"{len(deltas)} etapas comparadas ({actual['id']} vs {anterior['id']})."))
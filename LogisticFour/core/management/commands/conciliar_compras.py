@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.management.base import ComandoPerfilable
+from core.models import ConciliacionOrdenCompra
+from core.services import conciliacion
+
+
+class Command(ComandoPerfilable):
+    help = "Recalcula el match de tres vías (pedido/recibido/facturado) de las órdenes de compra."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=365, help="Órdenes creadas en los últimos N días (0 = todas).")
+        parser.add_argument("--ordenes", nargs="+", type=int, help="Limitar a estos ids de orden de compra.")
+
+    def handle(self, *args, **opts):
+        desde = timezone.now() - timedelta(days=opts["dias"]) if opts["dias"] else None
+        cambios = conciliacion.conciliar(opts["ordenes"], desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"{cambios} conciliaciones actualizadas."))
+        for estado, etiqueta in ConciliacionOrdenCompra.Estado.choices:
+            n = ConciliacionOrdenCompra.objects.filter(estado=estado).count()
+            self.stdout.write(f"  {etiqueta}: {n}")
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.management.base import ComandoPerfilable
+from core.services import indicadores
+
+
+class Command(ComandoPerfilable):
+    help = "Consolida los KPIs del tablero por bodega (hora actual y día en curso)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=int, default=1, help="Horas a consolidar hacia atrás, incluida la actual.")
+        parser.add_argument("--dias", type=int, default=1, help="Días a agregar hacia atrás, incluido hoy.")
+        parser.add_argument("--bodegas", nargs="+", type=int, help="Limitar a estos ids de bodega.")
+
+    def handle(self, *args, **opts):
+        ahora = timezone.now()
+        filas_hora = sum(
+            indicadores.consolidar_hora(ahora - timedelta(hours=h), opts["bodegas"]) for h in range(opts["horas"])
+        )
+        hoy = timezone.localdate()
+        filas_dia = sum(
+            indicadores.consolidar_dia(hoy - timedelta(days=d), opts["bodegas"]) for d in range(opts["dias"])
+        )
+        self.stdout.write(self.style.SUCCESS(f"{filas_hora} filas horarias y {filas_dia} diarias consolidadas."))
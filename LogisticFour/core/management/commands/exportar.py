@@ -0,0 +1,47 @@
+import time
+from datetime import date
+
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.management.base import ComandoPerfilable
+from core.routers import alias_replicas
+from core.services import exportacion
+
+
+class Command(ComandoPerfilable):
+    help = "Exporta stock, movimientos o productos a CSV, CSV gzip, Parquet o XLSX sin cargar la tabla en memoria."
+
+    def add_arguments(self, parser):
+        parser.add_argument("nombre", choices=sorted(exportacion.EXPORTABLES))
+        parser.add_argument("destino", help="Ruta del archivo a escribir.")
+        parser.add_argument("--formato", choices=exportacion.FORMATOS, help="Por defecto se deduce de la extensión.")
+        parser.add_argument("--copy", action="store_true", help="CSV vía COPY TO STDOUT (el camino más rápido).")
+        parser.add_argument("--desde", type=date.fromisoformat, help="Fecha inicial (AAAA-MM-DD), inclusive.")
+        parser.add_argument("--hasta", type=date.fromisoformat, help="Fecha final (AAAA-MM-DD), exclusiva.")
+        parser.add_argument("--bodega", type=int, help="Sólo esta bodega (exportación de stock).")
+        parser.add_argument("--lote", type=int, default=exportacion.TAMANO_BLOQUE, help="Filas por bloque / row group.")
+        parser.add_argument("--database", help="Alias de base (por defecto la primera réplica, si hay).")
+
+    def handle(self, *args, **opts):
+        formato = opts["formato"] or next(
+            (f for f in sorted(exportacion.FORMATOS, key=len, reverse=True) if opts["destino"].endswith("." + f)), "csv"
+        )
+        if opts["copy"] and formato not in ("csv", "csv.gz"):
+            raise CommandError("--copy sólo aplica a csv y csv.gz.")
+        using = opts["database"] or next(iter(alias_replicas()), DEFAULT_DB_ALIAS)
+
+        inicio = time.perf_counter()
+        try:
+            filas = exportacion.escribir(
+                opts["nombre"], opts["destino"], formato,
+                usar_copy=opts["copy"], tamano=opts["lote"],
+                desde=opts["desde"], hasta=opts["hasta"], bodega_id=opts["bodega"], using=using,
+            )
+        except (RuntimeError, ValueError) as exc:
+            raise CommandError(str(exc))
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{opts['nombre']}: {filas} filas en {opts['destino']} ({formato}, {using}) "
+            f"en {segundos:.1f} s ({filas / max(segundos, 1e-9):,.0f} filas/s)."
+        ))
@@ -0,0 +1,66 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.services import trabajos
+
+
+def _proceso(detener, ejecutados, opts):
+    # Ctrl-C llega a todo el grupo: cada hijo termina su trabajo en curso y sale
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(senal, lambda *_: detener.set())
+    cantidad = trabajos.trabajar(
+        tipos=opts["tipos"], detener=detener, max_trabajos=opts["max_trabajos"], una_vez=opts["una_vez"],
+    )
+    with ejecutados.get_lock():
+        ejecutados.value += cantidad
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa la cola de trabajos en segundo plano con N procesos worker "
+        "(SIGTERM/Ctrl-C: terminan el trabajo en curso y salen)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=1, help="Procesos worker en paralelo.")
+        parser.add_argument("--tipos", nargs="+", help="Sólo estos tipos de tarea.")
+        parser.add_argument("--una-vez", action="store_true", help="Salir cuando la cola quede vacía.")
+        parser.add_argument("--max-trabajos", type=int, help="Trabajos por proceso antes de salir (reciclado).")
+
+    def handle(self, *args, **opts):
+        if opts["procesos"] < 1:
+            raise CommandError("--procesos debe ser al menos 1.")
+        desconocidos = set(opts["tipos"] or ()) - set(trabajos._registro())
+        if desconocidos:
+            raise CommandError(f"Tareas desconocidas: {', '.join(sorted(desconocidos))}.")
+
+        contexto = multiprocessing.get_context("fork")
+        detener, ejecutados = contexto.Event(), contexto.Value("i", 0)
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(senal, lambda *_: detener.set())
+        trabajos.recuperar_vencidos()
+        inicio = time.perf_counter()
+        if opts["procesos"] == 1:
+            _proceso(detener, ejecutados, opts)
+        else:
+            # los hijos abren sus propias conexiones: no deben heredar la del padre
+            connections.close_all()
+            hijos = [
+                contexto.Process(target=_proceso, args=(detener, ejecutados, opts), name=f"trabajos-{n}")
+                for n in range(opts["procesos"])
+            ]
+            for hijo in hijos:
+                hijo.start()
+            for hijo in hijos:
+                hijo.join()
+            fallidos = [h.name for h in hijos if h.exitcode]
+            if fallidos:
+                raise CommandError(f"Procesos worker terminados con error: {', '.join(fallidos)}.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{ejecutados.value} trabajos procesados con {opts['procesos']} procesos "
+            f"en {time.perf_counter() - inicio:.1f} s."
+        ))
@@ -0,0 +1,14 @@
+from django.db import transaction
+
+from core.management.base import ComandoPerfilable
+from core.services import totales
+
+
+class Command(ComandoPerfilable):
+    help = "Recalcula subtotal/impuesto/total de todas las órdenes de compra y facturas con un UPDATE por tabla."
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            ordenes = totales.recalcular_ordenes()
+            facturas = totales.recalcular_facturas()
+        self.stdout.write(self.style.SUCCESS(f"{ordenes} órdenes y {facturas} facturas actualizadas."))
@@ -0,0 +1,13 @@
+from core.management.base import ComandoPerfilable
+from core.services import precios
+
+
+class Command(ComandoPerfilable):
+    help = "Recalcula la tabla caché de precios vigentes (correr a diario después de medianoche)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", nargs="+", type=int, help="Limitar a estos ids de producto.")
+
+    def handle(self, *args, **opts):
+        total = precios.refrescar_vigentes(opts["productos"])
+        self.stdout.write(self.style.SUCCESS(f"{total} precios vigentes actualizados."))
@@ -0,0 +1,13 @@
+from core.management.base import ComandoPerfilable
+from core.services import busqueda
+
+
+class Command(ComandoPerfilable):
+    help = "Regenera los documentos de búsqueda de todos los productos (por lotes de id)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=10000)
+
+    def handle(self, *args, **opts):
+        total = busqueda.reindexar(opts["lote"])
+        self.stdout.write(self.style.SUCCESS(f"{total} documentos de búsqueda actualizados."))
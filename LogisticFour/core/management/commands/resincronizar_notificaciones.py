@@ -0,0 +1,13 @@
+from core.management.base import ComandoPerfilable
+from core.services import notificaciones
+
+
+class Command(ComandoPerfilable):
+    help = "Recalcula los contadores de notificaciones no leídas (pensado para cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuarios", nargs="+", type=int, help="Limitar a estos ids de usuario.")
+
+    def handle(self, *args, **opts):
+        actualizados = notificaciones.resincronizar(opts["usuarios"])
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} contadores resincronizados."))
@@ -0,0 +1,20 @@
+from core.management.base import ComandoPerfilable
+from core.services import vencimientos
+
+
+class Command(ComandoPerfilable):
+    help = "Genera alertas de lotes vencidos o por vencer y, opcionalmente, mueve lo vencido a cuarentena."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, help="Horizonte de aviso en días (por defecto, los días de la regla EXPIRY_SOON).")
+        parser.add_argument("--bodegas", nargs="+", type=int, help="Limitar a estos ids de bodega.")
+        parser.add_argument("--cuarentena", action="store_true", help="Transferir el stock vencido a la ubicación de cuarentena.")
+        parser.add_argument("--lote", type=int, default=5000, help="Filas de stock por transacción al mover.")
+
+    def handle(self, *args, **opts):
+        creadas = vencimientos.generar_alertas(opts["dias"], opts["bodegas"])
+        self.stdout.write(self.style.SUCCESS(f"{creadas} alertas de vencimiento creadas."))
+        if opts["cuarentena"]:
+            movidos = vencimientos.mover_a_cuarentena(opts["bodegas"], lote=opts["lote"])
+            for bodega_id, filas in sorted(movidos.items()):
+                self.stdout.write(f"  bodega {bodega_id}: {filas} filas movidas a cuarentena")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bitacoraauditoria',
+            index=models.Index(fields=['tabla', 'entidad_id'], name='idx_bitacora_tabla_entidad'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacoraauditoria',
+            index=models.Index(fields=['usuario', 'creado_en'], name='idx_bitacora_usuario_fecha'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# contadores iniciales para los usuarios que ya tienen notificaciones sin leer
+CREAR_CONTADORES = """
+INSERT INTO contadores_notificaciones (usuario_id, no_leidas, actualizado_en)
+SELECT usuario_id, COUNT(*), NOW()
+FROM notificaciones
+WHERE NOT leida
+GROUP BY usuario_id
+ON CONFLICT (usuario_id) DO NOTHING
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0002_bitacora_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorNotificaciones',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contador_notificaciones', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('no_leidas', models.IntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'contadores_notificaciones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leida', False)), fields=['usuario'], name='idx_notif_usuario_no_leida'),
+        ),
+        migrations.RunSQL(CREAR_CONTADORES, migrations.RunSQL.noop),
+    ]
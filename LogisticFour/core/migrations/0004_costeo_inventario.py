@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+TIPOS_MOVIMIENTO_BASE = [
+    # codigo, nombre, direccion, afecta_costo
+    ("IN", "Entrada", 1, True),
+    ("OUT", "Salida", -1, True),
+    ("TRANSFER", "Transferencia", 0, True),
+    ("ADJUST_POS", "Ajuste positivo", 1, True),
+    ("ADJUST_NEG", "Ajuste negativo", -1, True),
+    ("RETURN_SUPPLIER", "Devolución a proveedor", -1, True),
+]
+
+
+def crear_tipos_movimiento(apps, schema_editor):
+    TipoMovimiento = apps.get_model("core", "TipoMovimiento")
+    for codigo, nombre, direccion, afecta_costo in TIPOS_MOVIMIENTO_BASE:
+        TipoMovimiento.objects.get_or_create(
+            codigo=codigo,
+            defaults={"nombre": nombre, "direccion": direccion, "afecta_costo": afecta_costo},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_notificaciones_contador'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientostock',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=20, null=True),
+        ),
+        migrations.CreateModel(
+            name='CapaCosto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('cantidad_inicial', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('cantidad_restante', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('costo_unitario', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capas_costo', to='core.bodega')),
+                ('movimiento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.movimientostock')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capas_costo', to='core.producto')),
+            ],
+            options={
+                'db_table': 'capas_costo',
+                'indexes': [models.Index(condition=models.Q(('cantidad_restante__gt', 0)), fields=['producto', 'bodega', 'fecha', 'id'], name='idx_capa_costo_abierta')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ValorizacionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('valor_total', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('costo_promedio', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valorizaciones', to='core.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valorizaciones', to='core.producto')),
+            ],
+            options={
+                'db_table': 'valorizacion_inventario',
+                'indexes': [models.Index(fields=['bodega'], include=('valor_total', 'cantidad'), name='idx_valorizacion_bodega')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'bodega'), name='uq_valorizacion_producto_bodega')],
+            },
+        ),
+        migrations.RunPython(crear_tipos_movimiento, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:22
+
+import core.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import django.db.models.deletion
+import django.utils.timezone
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+# Antes de crear la restricción se normalizan los datos existentes: de varios
+# precios activos con la misma fecha de inicio queda el más reciente, y cada
+# vigencia abierta se cierra el día anterior al inicio del precio siguiente.
+NORMALIZAR_VIGENCIAS = [
+    """
+    UPDATE precios_producto p SET activo = false
+    FROM (
+        SELECT id, row_number() OVER (PARTITION BY producto_id, vigente_desde ORDER BY id DESC) AS rn
+        FROM precios_producto WHERE activo
+    ) d
+    WHERE p.id = d.id AND d.rn > 1
+    """,
+    """
+    UPDATE precios_producto p SET vigente_hasta = s.siguiente - 1
+    FROM (
+        SELECT id, lead(vigente_desde) OVER (PARTITION BY producto_id ORDER BY vigente_desde) AS siguiente
+        FROM precios_producto WHERE activo
+    ) s
+    WHERE p.id = s.id AND s.siguiente IS NOT NULL
+      AND (p.vigente_hasta IS NULL OR p.vigente_hasta >= s.siguiente)
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_costeo_inventario'),
+    ]
+
+    operations = [
+        # la restricción de exclusión usa '=' sobre bigint dentro de un índice GiST
+        BtreeGistExtension(),
+        migrations.CreateModel(
+            name='PrecioVigente',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='precio_vigente', serialize=False, to='core.producto')),
+                ('precio', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('vigente_desde', models.DateField()),
+                ('vigente_hasta', models.DateField(blank=True, null=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'precios_vigentes',
+            },
+        ),
+        migrations.AlterField(
+            model_name='precioproducto',
+            name='vigente_desde',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddIndex(
+            model_name='precioproducto',
+            index=models.Index(fields=['producto', '-vigente_desde'], name='idx_precio_prod_desde'),
+        ),
+        migrations.RunSQL(NORMALIZAR_VIGENCIAS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='precioproducto',
+            constraint=models.CheckConstraint(condition=models.Q(('vigente_hasta__isnull', True), ('vigente_hasta__gte', models.F('vigente_desde')), _connector='OR'), name='ck_precio_vigencia_orden'),
+        ),
+        migrations.AddConstraint(
+            model_name='precioproducto',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('activo', True)), expressions=[('producto', '='), (core.models.RangoFechas('vigente_desde', 'vigente_hasta', django.contrib.postgres.fields.ranges.RangeBoundary(inclusive_upper=True)), '&&')], name='excl_precio_vigencia_solapada', violation_error_message='El producto ya tiene un precio activo que se solapa con esas fechas.'),
+        ),
+        migrations.AddField(
+            model_name='preciovigente',
+            name='precio_producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.precioproducto'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copia de core.services.totales al momento de la migración (sin filtros):
+# completa una vez los totales de las órdenes y facturas existentes.
+RECALCULAR_ORDENES = """
+UPDATE ordenes_compra oc
+SET subtotal = n.subtotal, monto_impuesto = n.impuesto, total = n.subtotal + n.impuesto
+FROM (
+    SELECT o.id,
+           COALESCE(a.subtotal, 0) AS subtotal,
+           ROUND(COALESCE(a.subtotal, 0) * COALESCE(t.porcentaje, 0) / 100, 4) AS impuesto
+    FROM ordenes_compra o
+    LEFT JOIN (
+        SELECT orden_compra_id,
+               ROUND(SUM(cantidad_pedida * precio * (1 - descuento_pct / 100)), 4) AS subtotal
+        FROM lineas_orden_compra
+        GROUP BY orden_compra_id
+    ) a ON a.orden_compra_id = o.id
+    LEFT JOIN tasas_impuesto t ON t.id = o.tasa_impuesto_id
+) n
+WHERE oc.id = n.id
+  AND (oc.subtotal, oc.monto_impuesto, oc.total) IS DISTINCT FROM (n.subtotal, n.impuesto, n.subtotal + n.impuesto)
+"""
+
+RECALCULAR_FACTURAS = """
+UPDATE facturas_proveedor f
+SET subtotal = n.subtotal, monto_impuesto = f.monto_total - n.subtotal
+FROM (
+    SELECT fp.id, ROUND(fp.monto_total / (1 + COALESCE(t.porcentaje, 0) / 100), 4) AS subtotal
+    FROM facturas_proveedor fp
+    LEFT JOIN tasas_impuesto t ON t.id = fp.tasa_impuesto_id
+) n
+WHERE f.id = n.id
+  AND (f.subtotal, f.monto_impuesto) IS DISTINCT FROM (n.subtotal, f.monto_total - n.subtotal)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_precios_vigencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facturaproveedor',
+            name='monto_impuesto',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='facturaproveedor',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ordencompra',
+            name='monto_impuesto',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ordencompra',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='ordencompra',
+            name='total',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='facturaproveedor',
+            index=models.Index(fields=['-monto_total'], name='idx_factura_monto'),
+        ),
+        migrations.AddIndex(
+            model_name='ordencompra',
+            index=models.Index(fields=['-total'], name='idx_oc_total'),
+        ),
+        migrations.AddIndex(
+            model_name='ordencompra',
+            index=models.Index(fields=['proveedor', '-total'], name='idx_oc_proveedor_total'),
+        ),
+        migrations.RunSQL(RECALCULAR_ORDENES, migrations.RunSQL.noop),
+        migrations.RunSQL(RECALCULAR_FACTURAS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_totales_compras'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facturaproveedor',
+            name='orden_compra',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='facturas', to='core.ordencompra'),
+        ),
+        migrations.CreateModel(
+            name='ConciliacionOrdenCompra',
+            fields=[
+                ('orden_compra', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='conciliacion', serialize=False, to='core.ordencompra')),
+                ('cantidad_pedida', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('cantidad_recibida', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('monto_pedido', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('monto_recibido', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('monto_facturado', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('diferencia', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('estado', models.CharField(choices=[('OK', 'Conciliada'), ('PENDIENTE_RECEPCION', 'Pendiente de recepción'), ('PENDIENTE_FACTURA', 'Pendiente de factura'), ('DIFERENCIA', 'Diferencia fuera de tolerancia')], max_length=30)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conciliaciones_compra', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'conciliaciones_orden_compra',
+                'indexes': [models.Index(fields=['estado', 'proveedor'], name='idx_conciliacion_estado_prov')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_conciliacion_compras'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('OC', 'Orden de compra'), ('REC', 'Recepción de mercadería')], max_length=10)),
+                ('prefijo', models.CharField(max_length=30)),
+                ('relleno', models.PositiveSmallIntegerField(default=6)),
+                ('reinicio_anual', models.BooleanField(default=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_documento', to='core.bodega')),
+            ],
+            options={
+                'db_table': 'series_documento',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'bodega'), name='uq_serie_tipo_bodega'), models.UniqueConstraint(fields=('prefijo',), name='uq_serie_prefijo')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_series_documento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='devolucionproveedor',
+            index=models.Index(fields=['proveedor', '-creado_en'], name='idx_devolucion_prov_creado'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaproveedor',
+            index=models.Index(fields=['proveedor', '-fecha_factura'], name='idx_factura_proveedor_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='ordencompra',
+            index=models.Index(fields=['proveedor', '-creado_en'], name='idx_oc_proveedor_creado'),
+        ),
+        migrations.AddIndex(
+            model_name='recepcionmercaderia',
+            index=models.Index(fields=['orden_compra', '-recibido_en'], name='idx_recepcion_oc_recibido'),
+        ),
+    ]
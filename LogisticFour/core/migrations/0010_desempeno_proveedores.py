@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_portal_proveedor_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesempenoProveedorProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordenes', models.IntegerField(default=0)),
+                ('recepciones', models.IntegerField(default=0)),
+                ('lead_time_promedio', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('lead_time_p50', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('lead_time_p90', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('cantidad_pedida', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('cantidad_recibida', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('tasa_cumplimiento', models.DecimalField(blank=True, decimal_places=4, max_digits=6, null=True)),
+                ('ultima_recepcion', models.DateTimeField(blank=True, null=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='desempeno_proveedores', to='core.producto')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='desempeno_productos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'desempeno_proveedor_producto',
+                'indexes': [models.Index(fields=['producto'], include=('proveedor', 'lead_time_p90', 'tasa_cumplimiento'), name='idx_desempeno_producto')],
+                'constraints': [models.UniqueConstraint(fields=('proveedor', 'producto'), name='uq_desempeno_proveedor_producto')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+TABLAS = [
+    "productos_usuarios_proveedor",
+    "devoluciones_proveedor",
+    "ordenes_compra",
+    "facturas_proveedor",
+    "adjuntos",
+]
+
+FUNCION = """
+CREATE OR REPLACE FUNCTION verificar_rol_proveedor() RETURNS trigger AS $$
+BEGIN
+    IF NEW.proveedor_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM usuarios_perfil WHERE usuario_id = NEW.proveedor_id AND rol = 'PROVEEDOR'
+    ) THEN
+        RAISE EXCEPTION 'El usuario % no tiene rol PROVEEDOR (%)', NEW.proveedor_id, TG_TABLE_NAME
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def crear_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(FUNCION, params=None)
+    for tabla in TABLAS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS trg_{tabla}_rol_proveedor ON {tabla}")
+        schema_editor.execute(
+            f"CREATE TRIGGER trg_{tabla}_rol_proveedor "
+            f"BEFORE INSERT OR UPDATE OF proveedor_id ON {tabla} "
+            f"FOR EACH ROW EXECUTE FUNCTION verificar_rol_proveedor()"
+        )
+
+
+def borrar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for tabla in TABLAS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS trg_{tabla}_rol_proveedor ON {tabla}")
+    schema_editor.execute("DROP FUNCTION IF EXISTS verificar_rol_proveedor()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_desempeno_proveedores'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_triggers, borrar_triggers),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:31
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# Copia de core.services.busqueda al momento de la migración (sin filtros):
+# genera una vez los documentos de los productos existentes. Para catálogos muy
+# grandes, `manage.py reindexar_busqueda` hace lo mismo por rangos de id.
+POBLAR_DOCUMENTOS = """
+WITH RECURSIVE rutas AS (
+    SELECT id, nombre::text AS ruta, 1 AS nivel
+    FROM categorias_productos WHERE padre_id IS NULL
+    UNION ALL
+    SELECT c.id, r.ruta || ' > ' || c.nombre, r.nivel + 1
+    FROM categorias_productos c JOIN rutas r ON c.padre_id = r.id
+    WHERE r.nivel < 20
+),
+fuente AS (
+    SELECT p.id, p.sku, p.nombre,
+           COALESCE(m.nombre, '') AS marca,
+           COALESCE(r.ruta, '') AS ruta,
+           COALESCE(pp.skus, '') AS skus_proveedor,
+           COALESCE(pa.valores, '') AS atributos
+    FROM productos p
+    LEFT JOIN marcas m ON m.id = p.marca_id
+    LEFT JOIN rutas r ON r.id = p.categoria_id
+    LEFT JOIN LATERAL (
+        SELECT string_agg(sku_proveedor, ' ') AS skus
+        FROM productos_usuarios_proveedor
+        WHERE producto_id = p.id AND sku_proveedor <> ''
+    ) pp ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT string_agg(valor_texto, ' ') AS valores
+        FROM atributos_producto
+        WHERE producto_id = p.id AND valor_texto <> ''
+    ) pa ON TRUE
+)
+INSERT INTO documentos_busqueda_producto AS d (producto_id, texto, documento, actualizado_en)
+SELECT id,
+       lower(concat_ws(' ', sku, skus_proveedor, nombre, marca, ruta, atributos)),
+       setweight(to_tsvector('simple', sku || ' ' || skus_proveedor), 'A')
+       || setweight(to_tsvector('spanish', nombre), 'B')
+       || setweight(to_tsvector('simple', marca), 'C')
+       || setweight(to_tsvector('spanish', ruta || ' ' || atributos), 'D'),
+       NOW()
+FROM fuente
+ON CONFLICT (producto_id) DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_trigger_rol_proveedor'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='DocumentoBusquedaProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='core.producto')),
+                ('texto', models.TextField()),
+                ('documento', django.contrib.postgres.search.SearchVectorField()),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'documentos_busqueda_producto',
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['documento'], name='idx_busqueda_documento'), django.contrib.postgres.indexes.GinIndex(fields=['texto'], name='idx_busqueda_texto_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+        migrations.RunSQL(POBLAR_DOCUMENTOS, migrations.RunSQL.noop),
+    ]
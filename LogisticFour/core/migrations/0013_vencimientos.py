@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+REGLAS_VENCIMIENTO = [
+    ("EXPIRY_SOON", "Lote próximo a vencer", {"dias": 30, "scope": "ubicacion"}),
+    ("EXPIRED", "Lote vencido", {"dias": 0, "scope": "ubicacion"}),
+]
+
+
+def crear_reglas_vencimiento(apps, schema_editor):
+    ReglaAlerta = apps.get_model("core", "ReglaAlerta")
+    for codigo, nombre, configuracion in REGLAS_VENCIMIENTO:
+        ReglaAlerta.objects.get_or_create(codigo=codigo, defaults={"nombre": nombre, "configuracion": configuracion})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_busqueda_productos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(condition=models.Q(('reconocida_en__isnull', True)), fields=['regla', 'producto', 'ubicacion'], name='idx_alerta_abierta'),
+        ),
+        migrations.AddIndex(
+            model_name='loteproducto',
+            index=models.Index(condition=models.Q(('fecha_vencimiento__isnull', False)), fields=['fecha_vencimiento'], name='idx_lote_vencimiento'),
+        ),
+        migrations.RunPython(crear_reglas_vencimiento, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_vencimientos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(condition=models.Q(('serie__isnull', False)), fields=['serie', 'ocurrido_en'], name='idx_mov_stock_serie_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(condition=models.Q(('lote__isnull', False)), fields=['lote', 'ocurrido_en'], name='idx_mov_stock_lote_fecha'),
+        ),
+    ]
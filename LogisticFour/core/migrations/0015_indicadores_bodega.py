@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:40
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_trazabilidad_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicadorBodega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('HORA', 'Hora'), ('DIA', 'Día')], max_length=4)),
+                ('periodo', models.DateTimeField()),
+                ('valor_stock', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('unidades_stock', models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ('alertas_info', models.IntegerField(default=0)),
+                ('alertas_warn', models.IntegerField(default=0)),
+                ('alertas_critical', models.IntegerField(default=0)),
+                ('recepciones_pendientes', models.IntegerField(default=0)),
+                ('transferencias_entrantes', models.IntegerField(default=0)),
+                ('transferencias_salientes', models.IntegerField(default=0)),
+                ('lineas_contadas', models.IntegerField(default=0)),
+                ('lineas_exactas', models.IntegerField(default=0)),
+                ('movimientos', models.IntegerField(default=0)),
+                ('movimientos_entrada', models.IntegerField(default=0)),
+                ('movimientos_salida', models.IntegerField(default=0)),
+                ('calculado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'indicadores_bodega',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['ocurrido_en'], name='brin_mov_stock_fecha'),
+        ),
+        migrations.AddField(
+            model_name='indicadorbodega',
+            name='bodega',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indicadores', to='core.bodega'),
+        ),
+        migrations.AddIndex(
+            model_name='indicadorbodega',
+            index=models.Index(fields=['granularidad', '-periodo'], name='idx_indicador_periodo'),
+        ),
+        migrations.AddConstraint(
+            model_name='indicadorbodega',
+            constraint=models.UniqueConstraint(fields=('bodega', 'granularidad', 'periodo'), name='uq_indicador_bodega_periodo'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:00
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_indicadores_bodega'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=80)),
+                ('parametros', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('clave_idempotencia', models.CharField(blank=True, max_length=200, null=True)),
+                ('estado', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'En curso'), ('DONE', 'Terminado'), ('FAILED', 'Fallido')], default='PENDING', max_length=10)),
+                ('prioridad', models.SmallIntegerField(default=0)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=5)),
+                ('disponible_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bloqueado_por', models.CharField(blank=True, max_length=120)),
+                ('latido_en', models.DateTimeField(blank=True, null=True)),
+                ('progreso_actual', models.IntegerField(default=0)),
+                ('progreso_total', models.IntegerField(blank=True, null=True)),
+                ('mensaje', models.CharField(blank=True, max_length=255)),
+                ('resultado', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('terminado_en', models.DateTimeField(blank=True, null=True)),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'trabajos',
+                'indexes': [models.Index(models.OrderBy(models.F('prioridad'), descending=True), models.F('disponible_en'), models.F('id'), condition=models.Q(('estado', 'PENDING')), name='idx_trabajo_pendiente'), models.Index(condition=models.Q(('estado', 'RUNNING')), fields=['latido_en'], name='idx_trabajo_en_curso')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('clave_idempotencia__isnull', False)), fields=('tipo', 'clave_idempotencia'), name='uq_trabajo_tipo_clave')],
+            },
+        ),
+    ]
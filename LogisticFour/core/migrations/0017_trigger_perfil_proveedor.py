@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# las mismas tablas que 0011: las que guardan un proveedor_id
+TABLAS = [
+    "productos_usuarios_proveedor",
+    "devoluciones_proveedor",
+    "ordenes_compra",
+    "facturas_proveedor",
+    "adjuntos",
+]
+
+REFERENCIAS = " OR ".join(f"EXISTS (SELECT 1 FROM {tabla} WHERE proveedor_id = OLD.usuario_id)" for tabla in TABLAS)
+
+# Diferido hasta el commit: al borrar un User, el CASCADE de Django puede
+# eliminar el perfil antes que sus órdenes; al cierre de la transacción sólo
+# cuenta si quedan filas que apunten a un usuario que ya no es PROVEEDOR.
+FUNCION = f"""
+CREATE OR REPLACE FUNCTION verificar_perfil_proveedor() RETURNS trigger AS $$
+BEGIN
+    IF OLD.rol = 'PROVEEDOR' AND NOT EXISTS (
+        SELECT 1 FROM usuarios_perfil WHERE usuario_id = OLD.usuario_id AND rol = 'PROVEEDOR'
+    ) AND ({REFERENCIAS}) THEN
+        RAISE EXCEPTION 'El usuario % tiene registros como proveedor y debe conservar el rol PROVEEDOR', OLD.usuario_id
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def crear_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(FUNCION, params=None)
+    schema_editor.execute("DROP TRIGGER IF EXISTS trg_usuarios_perfil_rol_proveedor ON usuarios_perfil")
+    schema_editor.execute(
+        "CREATE CONSTRAINT TRIGGER trg_usuarios_perfil_rol_proveedor "
+        "AFTER UPDATE OF rol, usuario_id OR DELETE ON usuarios_perfil "
+        "DEFERRABLE INITIALLY DEFERRED "
+        "FOR EACH ROW EXECUTE FUNCTION verificar_perfil_proveedor()"
+    )
+
+
+def borrar_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP TRIGGER IF EXISTS trg_usuarios_perfil_rol_proveedor ON usuarios_perfil")
+    schema_editor.execute("DROP FUNCTION IF EXISTS verificar_perfil_proveedor()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_trabajos'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_trigger, borrar_trigger),
+    ]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations
+
+# Valoriza una vez el stock que existía antes del costeo (0004). Por
+# (producto, bodega) se agrega la diferencia entre el stock y lo ya valorizado,
+# al costo promedio vigente o, si es 0, al último costo de movimiento o de
+# orden de compra conocido. En FIFO la diferencia abre una capa anterior a las
+# existentes, de modo que se consume primero. (La CTE ``valorizadas`` se
+# ejecuta aunque la sentencia principal no la lea.)
+VALORIZAR_EXISTENTE = """
+WITH faltantes AS (
+    SELECT s.producto_id, u.bodega_id,
+           SUM(s.cantidad_disponible) - COALESCE(MAX(v.cantidad), 0) AS cantidad,
+           MAX(v.costo_promedio) AS promedio
+    FROM stock s
+    JOIN ubicaciones u ON u.id = s.ubicacion_id
+    LEFT JOIN valorizacion_inventario v ON v.producto_id = s.producto_id AND v.bodega_id = u.bodega_id
+    GROUP BY s.producto_id, u.bodega_id
+    HAVING SUM(s.cantidad_disponible) > COALESCE(MAX(v.cantidad), 0)
+),
+costeadas AS (
+    SELECT f.producto_id, f.bodega_id, f.cantidad,
+           COALESCE(
+               NULLIF(f.promedio, 0),
+               (SELECT m.costo_unitario FROM movimientos_stock m
+                WHERE m.producto_id = f.producto_id AND m.costo_unitario IS NOT NULL
+                ORDER BY m.ocurrido_en DESC, m.id DESC LIMIT 1),
+               (SELECT ROUND(l.precio * (1 - l.descuento_pct / 100), 6) FROM lineas_orden_compra l
+                WHERE l.producto_id = f.producto_id
+                ORDER BY l.id DESC LIMIT 1),
+               0
+           ) AS costo
+    FROM faltantes f
+),
+valorizadas AS (
+    INSERT INTO valorizacion_inventario AS v (producto_id, bodega_id, cantidad, valor_total, costo_promedio, actualizado_en)
+    SELECT producto_id, bodega_id, cantidad, ROUND(cantidad * costo, 6), costo, NOW()
+    FROM costeadas
+    ON CONFLICT (producto_id, bodega_id) DO UPDATE SET
+        cantidad = v.cantidad + EXCLUDED.cantidad,
+        valor_total = v.valor_total + EXCLUDED.valor_total,
+        costo_promedio = ROUND((v.valor_total + EXCLUDED.valor_total) / (v.cantidad + EXCLUDED.cantidad), 6),
+        actualizado_en = EXCLUDED.actualizado_en
+)
+INSERT INTO capas_costo (producto_id, bodega_id, movimiento_id, fecha, cantidad_inicial, cantidad_restante, costo_unitario)
+SELECT c.producto_id, c.bodega_id, NULL,
+       COALESCE(
+           (SELECT MIN(k.fecha) FROM capas_costo k WHERE k.producto_id = c.producto_id AND k.bodega_id = c.bodega_id),
+           NOW()
+       ) - INTERVAL '1 microsecond',
+       c.cantidad, c.cantidad, c.costo
+FROM costeadas c
+WHERE %(fifo)s
+"""
+
+
+def valorizar_existente(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    fifo = getattr(settings, "COSTEO_METODO", "PROMEDIO").upper() == "FIFO"
+    schema_editor.execute(VALORIZAR_EXISTENTE, params={"fifo": fifo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_trigger_perfil_proveedor'),
+    ]
+
+    operations = [
+        migrations.RunPython(valorizar_existente, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+# ids de los eventos en vivo (core.services.eventos, backend "postgres"):
+# compartidos por todos los procesos que publican en el canal
+CREAR_SECUENCIA = "CREATE SEQUENCE IF NOT EXISTS eventos_id_seq"
+BORRAR_SECUENCIA = "DROP SEQUENCE IF EXISTS eventos_id_seq"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_valorizacion_inicial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREAR_SECUENCIA, BORRAR_SECUENCIA),
+    ]
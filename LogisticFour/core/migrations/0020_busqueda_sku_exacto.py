@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_eventos_secuencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(django.db.models.functions.text.Lower('sku'), name='idx_producto_sku_lower'),
+        ),
+    ]
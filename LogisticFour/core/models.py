@@ -1,9 +1,16 @@
 # apps/inventario/models.py
 from django.db import models
 from django.contrib.auth.models import User, Group
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeBoundary, RangeOperators
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Lower
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 # =============================================
@@ -57,6 +64,29 @@ def crear_o_actualizar_perfil(sender, instance, created, **kwargs):
         instance.groups.add(Group.objects.get(name=perfil.rol))
 
 
+def validar_rol_proveedor(instancia, mensaje, campo="proveedor"):
+    """
+    Valida que ``instancia.<campo>`` sea un usuario con rol PROVEEDOR.
+
+    Usa, en orden: la marca que deja ``core.services.validacion`` al validar en
+    bloque, el perfil ya cargado en memoria o, como último recurso, un único
+    ``exists()`` sobre ``usuarios_perfil`` (sin cargar el User).
+    """
+    usuario_id = getattr(instancia, f"{campo}_id")
+    if usuario_id is not None and getattr(instancia, "_proveedor_validado", None) == usuario_id:
+        return
+    descriptor = getattr(type(instancia), campo)
+    if usuario_id is not None and descriptor.is_cached(instancia) and User.perfil.is_cached(getattr(instancia, campo)):
+        valido = getattr(instancia, campo).perfil.rol == UsuarioPerfil.Rol.PROVEEDOR
+    else:
+        valido = usuario_id is not None and UsuarioPerfil.objects.filter(
+            usuario_id=usuario_id, rol=UsuarioPerfil.Rol.PROVEEDOR
+        ).exists()
+    if not valido:
+        raise ValidationError(mensaje)
+    instancia._proveedor_validado = usuario_id
+
+
 # =============================================
 # 0) Catálogos / Utilidades
 # =============================================
@@ -207,6 +237,10 @@ class BitacoraAuditoria(MarcaTiempo):
 
     class Meta:
         db_table = "bitacora_auditoria"
+        indexes = [
+            models.Index(fields=["tabla", "entidad_id"], name="idx_bitacora_tabla_entidad"),
+            models.Index(fields=["usuario", "creado_en"], name="idx_bitacora_usuario_fecha"),
+        ]
 
 
 # =============================================
@@ -226,6 +260,10 @@ class Producto(MarcaTiempo):
 
     class Meta:
         db_table = "productos"
+        indexes = [
+            # coincidencia exacta de sku en core.services.busqueda
+            models.Index(Lower("sku"), name="idx_producto_sku_lower"),
+        ]
 
     def __str__(self):
         return f"{self.sku} - {self.nombre}"
@@ -248,9 +286,27 @@ class ProductoUsuarioProveedor(models.Model):
         ]
 
     def clean(self):
-        perfil = getattr(self.proveedor, "perfil", None)
-        if not perfil or perfil.rol != UsuarioPerfil.Rol.PROVEEDOR:
-            raise ValidationError("El usuario seleccionado debe tener rol PROVEEDOR.")
+        validar_rol_proveedor(self, "El usuario seleccionado debe tener rol PROVEEDOR.")
+
+
+class DocumentoBusquedaProducto(models.Model):
+    """
+    Documento de búsqueda desnormalizado por producto (sku, nombre, marca, ruta
+    de categoría y SKUs de proveedor). Lo mantiene ``core.services.busqueda``;
+    ``documento`` se consulta con full-text y ``texto`` con trigramas para
+    coincidencias parciales de SKU.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name="busqueda")
+    texto = models.TextField()
+    documento = SearchVectorField()
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "documentos_busqueda_producto"
+        indexes = [
+            GinIndex(fields=["documento"], name="idx_busqueda_documento"),
+            GinIndex(fields=["texto"], opclasses=["gin_trgm_ops"], name="idx_busqueda_texto_trgm"),
+        ]
 
 
 class ImagenProducto(models.Model):
@@ -262,15 +318,56 @@ class ImagenProducto(models.Model):
         db_table = "imagenes_producto"
 
 
+class RangoFechas(models.Func):
+    function = "DATERANGE"
+    output_field = DateRangeField()
+
+
 class PrecioProducto(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="precios")
     precio = models.DecimalField(max_digits=14, decimal_places=4)
-    vigente_desde = models.DateField(auto_now_add=True)
-    vigente_hasta = models.DateField(null=True, blank=True)
+    vigente_desde = models.DateField(default=timezone.localdate)
+    vigente_hasta = models.DateField(null=True, blank=True)  # inclusive; NULL = sin término
     activo = models.BooleanField(default=True)
 
     class Meta:
         db_table = "precios_producto"
+        indexes = [
+            models.Index(fields=["producto", "-vigente_desde"], name="idx_precio_prod_desde"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(vigente_hasta__isnull=True) | models.Q(vigente_hasta__gte=models.F("vigente_desde")),
+                name="ck_precio_vigencia_orden",
+            ),
+            # dos precios activos del mismo producto no pueden solaparse en fechas
+            ExclusionConstraint(
+                name="excl_precio_vigencia_solapada",
+                expressions=[
+                    ("producto", RangeOperators.EQUAL),
+                    (RangoFechas("vigente_desde", "vigente_hasta", RangeBoundary(inclusive_upper=True)), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(activo=True),
+                violation_error_message="El producto ya tiene un precio activo que se solapa con esas fechas.",
+            ),
+        ]
+
+
+class PrecioVigente(models.Model):
+    """
+    Precio en vigor hoy por producto (tabla caché). La mantiene
+    core.services.precios al cambiar PrecioProducto y con el comando diario
+    ``refrescar_precios_vigentes``.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name="precio_vigente")
+    precio_producto = models.ForeignKey(PrecioProducto, on_delete=models.CASCADE, related_name="+")
+    precio = models.DecimalField(max_digits=14, decimal_places=4)
+    vigente_desde = models.DateField()
+    vigente_hasta = models.DateField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "precios_vigentes"
 
 
 class DefinicionAtributo(models.Model):
@@ -308,6 +405,13 @@ class LoteProducto(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["producto", "codigo_lote"], name="uq_producto_lote")
         ]
+        indexes = [
+            models.Index(
+                fields=["fecha_vencimiento"],
+                condition=models.Q(fecha_vencimiento__isnull=False),
+                name="idx_lote_vencimiento",
+            ),
+        ]
 
 
 class SerieProducto(models.Model):
@@ -370,11 +474,17 @@ class MovimientoStock(models.Model):
     ocurrido_en = models.DateTimeField(auto_now_add=True)
     creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     notas = models.TextField(blank=True)
+    costo_unitario = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
 
     class Meta:
         db_table = "movimientos_stock"
         indexes = [
             models.Index(fields=["producto", "ocurrido_en"], name="idx_mov_stock_prod_fecha"),
+            # trazabilidad (core.services.trazabilidad)
+            models.Index(fields=["serie", "ocurrido_en"], condition=models.Q(serie__isnull=False), name="idx_mov_stock_serie_fecha"),
+            models.Index(fields=["lote", "ocurrido_en"], condition=models.Q(lote__isnull=False), name="idx_mov_stock_lote_fecha"),
+            # ventanas por hora de core.services.indicadores (tabla de sólo inserción)
+            BrinIndex(fields=["ocurrido_en"], name="brin_mov_stock_fecha"),
         ]
 
 
@@ -490,11 +600,12 @@ class DevolucionProveedor(MarcaTiempo):
 
     class Meta:
         db_table = "devoluciones_proveedor"
+        indexes = [
+            models.Index(fields=["proveedor", "-creado_en"], name="idx_devolucion_prov_creado"),
+        ]
 
     def clean(self):
-        perfil = getattr(self.proveedor, "perfil", None)
-        if not perfil or perfil.rol != UsuarioPerfil.Rol.PROVEEDOR:
-            raise ValidationError("El proveedor debe ser un Usuario con rol PROVEEDOR.")
+        validar_rol_proveedor(self, "El proveedor debe ser un Usuario con rol PROVEEDOR.")
 
 
 class LineaDevolucionProveedor(models.Model):
@@ -521,17 +632,24 @@ class OrdenCompra(MarcaTiempo):
     estado = models.CharField(max_length=30, default="DRAFT")  # DRAFT, APPROVED, PARTIAL, RECEIVED, CLOSED, CANCELED
     fecha_esperada = models.DateField(null=True, blank=True)
     creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # totales desnormalizados (core.services.totales)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    monto_impuesto = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=4, default=0)
 
     class Meta:
         db_table = "ordenes_compra"
+        indexes = [
+            models.Index(fields=["-total"], name="idx_oc_total"),
+            models.Index(fields=["proveedor", "-total"], name="idx_oc_proveedor_total"),
+            models.Index(fields=["proveedor", "-creado_en"], name="idx_oc_proveedor_creado"),
+        ]
 
     def __str__(self):
         return self.numero_orden
 
     def clean(self):
-        perfil = getattr(self.proveedor, "perfil", None)
-        if not perfil or perfil.rol != UsuarioPerfil.Rol.PROVEEDOR:
-            raise ValidationError("El proveedor debe ser un Usuario con rol PROVEEDOR.")
+        validar_rol_proveedor(self, "El proveedor debe ser un Usuario con rol PROVEEDOR.")
 
 
 class LineaOrdenCompra(models.Model):
@@ -557,6 +675,9 @@ class RecepcionMercaderia(MarcaTiempo):
 
     class Meta:
         db_table = "recepciones_mercaderia"
+        indexes = [
+            models.Index(fields=["orden_compra", "-recibido_en"], name="idx_recepcion_oc_recibido"),
+        ]
 
 
 class LineaRecepcionMercaderia(models.Model):
@@ -574,23 +695,31 @@ class LineaRecepcionMercaderia(models.Model):
 
 class FacturaProveedor(models.Model):
     proveedor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="facturas_emitidas")
+    orden_compra = models.ForeignKey(
+        OrdenCompra, on_delete=models.SET_NULL, null=True, blank=True, related_name="facturas"
+    )
     numero_factura = models.CharField(max_length=80)
     tasa_impuesto = models.ForeignKey(TasaImpuesto, on_delete=models.SET_NULL, null=True, blank=True)
     monto_total = models.DecimalField(max_digits=14, decimal_places=4)
     fecha_factura = models.DateField()
     fecha_vencimiento = models.DateField(null=True, blank=True)
     estado = models.CharField(max_length=30, default="OPEN")  # OPEN, PAID, CANCELED
+    # desglose derivado de monto_total y la tasa (core.services.totales)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    monto_impuesto = models.DecimalField(max_digits=14, decimal_places=4, default=0)
 
     class Meta:
         db_table = "facturas_proveedor"
         constraints = [
             models.UniqueConstraint(fields=["proveedor", "numero_factura"], name="uq_proveedor_numero_factura")
         ]
+        indexes = [
+            models.Index(fields=["-monto_total"], name="idx_factura_monto"),
+            models.Index(fields=["proveedor", "-fecha_factura"], name="idx_factura_proveedor_fecha"),
+        ]
 
     def clean(self):
-        perfil = getattr(self.proveedor, "perfil", None)
-        if not perfil or perfil.rol != UsuarioPerfil.Rol.PROVEEDOR:
-            raise ValidationError("El proveedor debe ser un Usuario con rol PROVEEDOR.")
+        validar_rol_proveedor(self, "El proveedor debe ser un Usuario con rol PROVEEDOR.")
 
 
 # =============================================
@@ -618,6 +747,14 @@ class Alerta(MarcaTiempo):
 
     class Meta:
         db_table = "alertas"
+        indexes = [
+            # alertas abiertas: evita duplicar avisos en corridas periódicas
+            models.Index(
+                fields=["regla", "producto", "ubicacion"],
+                condition=models.Q(reconocida_en__isnull=True),
+                name="idx_alerta_abierta",
+            ),
+        ]
 
 
 class Notificacion(MarcaTiempo):
@@ -628,6 +765,22 @@ class Notificacion(MarcaTiempo):
 
     class Meta:
         db_table = "notificaciones"
+        indexes = [
+            models.Index(fields=["usuario"], condition=models.Q(leida=False), name="idx_notif_usuario_no_leida"),
+        ]
+
+
+class ContadorNotificaciones(models.Model):
+    """
+    Contador desnormalizado de notificaciones no leídas por usuario
+    (lo mantiene core.services.notificaciones).
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="contador_notificaciones")
+    no_leidas = models.IntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "contadores_notificaciones"
 
 
 # =============================================
@@ -656,7 +809,273 @@ class Adjunto(MarcaTiempo):
         db_table = "adjuntos"
 
     def clean(self):
-        if self.proveedor:
-            perfil = getattr(self.proveedor, "perfil", None)
-            if not perfil or perfil.rol != UsuarioPerfil.Rol.PROVEEDOR:
-                raise ValidationError("El proveedor del adjunto debe ser un Usuario con rol PROVEEDOR.")
\ No newline at end of file
+        if self.proveedor_id:
+            validar_rol_proveedor(self, "El proveedor del adjunto debe ser un Usuario con rol PROVEEDOR.")
+
+
+# =============================================
+# 9) Costeo de Inventario
+# =============================================
+
+class CapaCosto(models.Model):
+    """
+    Capa de costo FIFO por (producto, bodega): una por entrada valorizada.
+    Las salidas consumen ``cantidad_restante`` de la capa más antigua.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="capas_costo")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="capas_costo")
+    movimiento = models.ForeignKey(MovimientoStock, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField()
+    cantidad_inicial = models.DecimalField(max_digits=20, decimal_places=6)
+    cantidad_restante = models.DecimalField(max_digits=20, decimal_places=6)
+    costo_unitario = models.DecimalField(max_digits=20, decimal_places=6)
+
+    class Meta:
+        db_table = "capas_costo"
+        indexes = [
+            models.Index(
+                fields=["producto", "bodega", "fecha", "id"],
+                condition=models.Q(cantidad_restante__gt=0),
+                name="idx_capa_costo_abierta",
+            ),
+        ]
+
+
+class ValorizacionInventario(models.Model):
+    """
+    Cantidad y valor vigentes por (producto, bodega), mantenidos en la misma
+    transacción que postea el movimiento. La valorización de una bodega es un
+    SUM sobre el índice de cobertura, sin recorrer el kardex.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="valorizaciones")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="valorizaciones")
+    cantidad = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    valor_total = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    costo_promedio = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "valorizacion_inventario"
+        constraints = [
+            models.UniqueConstraint(fields=["producto", "bodega"], name="uq_valorizacion_producto_bodega")
+        ]
+        indexes = [
+            models.Index(fields=["bodega"], include=["valor_total", "cantidad"], name="idx_valorizacion_bodega"),
+        ]
+
+
+# =============================================
+# 10) Conciliación de Compras (OC / Recepción / Factura)
+# =============================================
+
+class ConciliacionOrdenCompra(models.Model):
+    """
+    Resultado del match de tres vías por orden de compra, recalculado en bloque
+    por ``core.services.conciliacion``. Los montos incluyen impuesto para ser
+    comparables con ``FacturaProveedor.monto_total``.
+    """
+    class Estado(models.TextChoices):
+        OK = "OK", "Conciliada"
+        PENDIENTE_RECEPCION = "PENDIENTE_RECEPCION", "Pendiente de recepción"
+        PENDIENTE_FACTURA = "PENDIENTE_FACTURA", "Pendiente de factura"
+        DIFERENCIA = "DIFERENCIA", "Diferencia fuera de tolerancia"
+
+    orden_compra = models.OneToOneField(
+        OrdenCompra, on_delete=models.CASCADE, primary_key=True, related_name="conciliacion"
+    )
+    proveedor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conciliaciones_compra")
+    cantidad_pedida = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    cantidad_recibida = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    monto_pedido = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    monto_recibido = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    monto_facturado = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    diferencia = models.DecimalField(max_digits=14, decimal_places=4, default=0)  # facturado - recibido
+    estado = models.CharField(max_length=30, choices=Estado.choices)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "conciliaciones_orden_compra"
+        indexes = [
+            models.Index(fields=["estado", "proveedor"], name="idx_conciliacion_estado_prov"),
+        ]
+
+
+# =============================================
+# 11) Numeración de Documentos
+# =============================================
+
+class SerieDocumento(models.Model):
+    """
+    Formato de numeración por tipo de documento y bodega. Los números salen de
+    secuencias PostgreSQL (core.services.numeracion); esta tabla sólo guarda el
+    prefijo, el relleno y si la serie se reinicia cada año.
+    """
+    class Tipo(models.TextChoices):
+        ORDEN_COMPRA = "OC", "Orden de compra"
+        RECEPCION = "REC", "Recepción de mercadería"
+
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="series_documento")
+    prefijo = models.CharField(max_length=30)                 # ej: "OC-STGO-"
+    relleno = models.PositiveSmallIntegerField(default=6)     # dígitos del correlativo
+    reinicio_anual = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = "series_documento"
+        constraints = [
+            models.UniqueConstraint(fields=["tipo", "bodega"], name="uq_serie_tipo_bodega"),
+            # dos series con el mismo prefijo generarían números repetidos
+            models.UniqueConstraint(fields=["prefijo"], name="uq_serie_prefijo"),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.prefijo}"
+
+
+# =============================================
+# 12) Desempeño de Proveedores
+# =============================================
+
+class DesempenoProveedorProducto(models.Model):
+    """
+    Lead time real y tasa de cumplimiento por (proveedor, producto) sobre las
+    órdenes de la ventana móvil ``DESEMPENO_VENTANA_DIAS``. Lo mantiene
+    ``core.services.desempeno``; el planificador y las fichas de proveedor
+    sólo leen esta tabla.
+    """
+    proveedor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="desempeno_productos")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="desempeno_proveedores")
+    ordenes = models.IntegerField(default=0)
+    recepciones = models.IntegerField(default=0)              # órdenes con al menos una recepción
+    lead_time_promedio = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)  # días
+    lead_time_p50 = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    lead_time_p90 = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    cantidad_pedida = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    cantidad_recibida = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    tasa_cumplimiento = models.DecimalField(max_digits=6, decimal_places=4, null=True, blank=True)  # 0..1
+    ultima_recepcion = models.DateTimeField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "desempeno_proveedor_producto"
+        constraints = [
+            models.UniqueConstraint(fields=["proveedor", "producto"], name="uq_desempeno_proveedor_producto")
+        ]
+        indexes = [
+            models.Index(
+                fields=["producto"],
+                include=["proveedor", "lead_time_p90", "tasa_cumplimiento"],
+                name="idx_desempeno_producto",
+            ),
+        ]
+
+
+# =============================================
+# 13) Indicadores de Bodega (tablero)
+# =============================================
+
+class IndicadorBodega(models.Model):
+    """
+    Fotografía de KPIs por bodega y período (hora o día), consolidada por
+    ``core.services.indicadores``. El tablero lee la última hora y la fila del
+    día desde aquí; nunca agrega stock, alertas ni movimientos en línea.
+    """
+    class Granularidad(models.TextChoices):
+        HORA = "HORA", "Hora"
+        DIA = "DIA", "Día"
+
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="indicadores")
+    granularidad = models.CharField(max_length=4, choices=Granularidad.choices)
+    periodo = models.DateTimeField()                               # inicio de la hora / del día (hora local)
+    # fotografía al cierre (o al último cálculo) del período
+    valor_stock = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    unidades_stock = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    alertas_info = models.IntegerField(default=0)
+    alertas_warn = models.IntegerField(default=0)
+    alertas_critical = models.IntegerField(default=0)
+    recepciones_pendientes = models.IntegerField(default=0)
+    transferencias_entrantes = models.IntegerField(default=0)      # IN_TRANSIT hacia la bodega
+    transferencias_salientes = models.IntegerField(default=0)      # IN_TRANSIT desde la bodega
+    lineas_contadas = models.IntegerField(default=0)               # recuentos de la ventana INDICADORES_VENTANA_RECUENTO_DIAS
+    lineas_exactas = models.IntegerField(default=0)
+    # actividad dentro del período
+    movimientos = models.IntegerField(default=0)
+    movimientos_entrada = models.IntegerField(default=0)
+    movimientos_salida = models.IntegerField(default=0)
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "indicadores_bodega"
+        constraints = [
+            models.UniqueConstraint(fields=["bodega", "granularidad", "periodo"], name="uq_indicador_bodega_periodo")
+        ]
+        indexes = [
+            models.Index(fields=["granularidad", "-periodo"], name="idx_indicador_periodo"),
+        ]
+
+    @property
+    def exactitud_recuento(self):
+        if not self.lineas_contadas:
+            return None
+        return self.lineas_exactas / self.lineas_contadas
+
+
+# =============================================
+# 14) Trabajos en segundo plano
+# =============================================
+
+class Trabajo(models.Model):
+    """
+    Cola de trabajos en la propia base (``core.services.trabajos``). Los
+    workers (``manage.py procesar_trabajos``) reclaman filas PENDING con
+    ``FOR UPDATE SKIP LOCKED``; los reintentos reprograman ``disponible_en``.
+    """
+    class Estado(models.TextChoices):
+        PENDING = "PENDING", "Pendiente"
+        RUNNING = "RUNNING", "En curso"
+        DONE = "DONE", "Terminado"
+        FAILED = "FAILED", "Fallido"
+
+    tipo = models.CharField(max_length=80)                                # clave del registro de tareas
+    parametros = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    clave_idempotencia = models.CharField(max_length=200, null=True, blank=True)
+    estado = models.CharField(max_length=10, choices=Estado.choices, default=Estado.PENDING)
+    prioridad = models.SmallIntegerField(default=0)                       # mayor = antes
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=5)
+    disponible_en = models.DateTimeField(default=timezone.now)            # backoff de reintentos
+    bloqueado_por = models.CharField(max_length=120, blank=True)          # host:pid del worker
+    latido_en = models.DateTimeField(null=True, blank=True)
+    progreso_actual = models.IntegerField(default=0)
+    progreso_total = models.IntegerField(null=True, blank=True)
+    mensaje = models.CharField(max_length=255, blank=True)
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "trabajos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tipo", "clave_idempotencia"],
+                condition=models.Q(clave_idempotencia__isnull=False),
+                name="uq_trabajo_tipo_clave",
+            ),
+        ]
+        indexes = [
+            # el reclamo recorre sólo los pendientes, en orden de prioridad
+            models.Index(
+                models.F("prioridad").desc(), "disponible_en", "id",
+                condition=models.Q(estado="PENDING"), name="idx_trabajo_pendiente",
+            ),
+            models.Index(fields=["latido_en"], condition=models.Q(estado="RUNNING"), name="idx_trabajo_en_curso"),
+        ]
+
+    @property
+    def porcentaje(self):
+        if not self.progreso_total:
+            return None
+        return round(100 * self.progreso_actual / self.progreso_total, 1)
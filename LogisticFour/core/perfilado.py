@@ -0,0 +1,219 @@
+"""
+Perfilado opcional de operaciones largas (posteos, cargas, exportaciones,
+archivado).
+
+Una *corrida* (``corrida(nombre)``) agrupa *etapas* con nombre. Cada etapa
+(``etapa("bloquear_stock")``, como ``with`` o decorador) acumula llamadas,
+tiempo de pared, tiempo de CPU del proceso, consultas SQL (``execute_wrapper``
+instalado una vez por corrida) y las filas que el código informe con
+``filas(n)``. Las etapas anidadas se nombran por ruta (``postear/costeo``) y
+sus tiempos y consultas se incluyen en las de la etapa padre.
+
+Fuera de una corrida ``etapa`` y ``filas`` no hacen nada: el código de
+servicios queda instrumentado sin costo en producción. Las corridas viven en
+un ``ContextVar``, por lo que los hilos que lanza una operación no se miden.
+
+Con ``cprofile=True`` la corrida se perfila con ``cProfile`` con probabilidad
+``PERFILADO_MUESTREO``. Al terminar se guardan en ``PERFILADO_DIR``
+``<id>.json`` (etapas) y, si hubo muestreo, ``<id>.prof`` (para ``pstats`` o
+snakeviz); ``comparar`` contrasta dos corridas guardadas
+(``manage.py comparar_perfiles``).
+
+``core.management.base.ComandoPerfilable`` agrega ``--profile`` a los
+comandos de gestión.
+"""
+import functools
+import json
+import os
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+_corrida_actual = ContextVar("corrida_perfilado", default=None)
+
+
+def directorio_base():
+    return Path(getattr(settings, "PERFILADO_DIR", Path(settings.BASE_DIR) / "perfiles"))
+
+
+@dataclass
+class Etapa:
+    nombre: str
+    llamadas: int = 0
+    pared_s: float = 0.0
+    cpu_s: float = 0.0
+    consultas: int = 0
+    filas: int = 0
+
+    @property
+    def filas_por_s(self):
+        return self.filas / self.pared_s if self.pared_s else 0.0
+
+
+class Corrida:
+    def __init__(self, nombre, *, cprofile=False, muestreo=None):
+        self.nombre = nombre
+        self.id = f"{nombre}-{timezone.now():%Y%m%d%H%M%S}-{os.urandom(3).hex()}"
+        self.etapas = {}            # ruta -> Etapa, en orden de primera entrada
+        self.activas = []           # (Etapa, inicio pared, inicio cpu)
+        self.perfil = None
+        self.ruta_json = self.ruta_prof = None
+        if muestreo is None:
+            muestreo = getattr(settings, "PERFILADO_MUESTREO", 1.0)
+        if cprofile:
+            # import diferido: este módulo se carga en cada comando de gestión
+            import cProfile
+            import random
+            if random.random() < muestreo:
+                self.perfil = cProfile.Profile()
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: la consulta cuenta para todas las etapas abiertas
+        for registro, _, _ in self.activas:
+            registro.consultas += 1
+        return execute(sql, params, many, context)
+
+    def entrar(self, nombre):
+        ruta = f"{self.activas[-1][0].nombre}/{nombre}" if self.activas else nombre
+        registro = self.etapas.get(ruta)
+        if registro is None:
+            registro = self.etapas[ruta] = Etapa(ruta)
+        registro.llamadas += 1
+        self.activas.append((registro, time.perf_counter(), time.process_time()))
+
+    def salir(self):
+        registro, pared, cpu = self.activas.pop()
+        registro.pared_s += time.perf_counter() - pared
+        registro.cpu_s += time.process_time() - cpu
+
+    def como_dict(self):
+        return {
+            "id": self.id,
+            "nombre": self.nombre,
+            "pid": os.getpid(),
+            "cprofile": self.ruta_prof and str(self.ruta_prof),
+            "etapas": [dict(asdict(e), filas_por_s=round(e.filas_por_s, 1)) for e in self.etapas.values()],
+        }
+
+    def guardar(self, directorio=None):
+        directorio = Path(directorio or directorio_base())
+        directorio.mkdir(parents=True, exist_ok=True)
+        if self.perfil is not None:
+            self.ruta_prof = directorio / f"{self.id}.prof"
+            self.perfil.dump_stats(self.ruta_prof)
+        self.ruta_json = directorio / f"{self.id}.json"
+        self.ruta_json.write_text(json.dumps(self.como_dict(), indent=2), encoding="utf-8")
+
+    def resumen(self):
+        """Tabla de texto con una fila por etapa."""
+        lineas = [f"{'etapa':<40} {'llamadas':>8} {'pared s':>9} {'cpu s':>9} {'consultas':>9} {'filas':>10} {'filas/s':>10}"]
+        for e in self.etapas.values():
+            sangria = "  " * e.nombre.count("/")
+            lineas.append(
+                f"{(sangria + e.nombre.rsplit('/', 1)[-1])[:40]:<40} {e.llamadas:>8} {e.pared_s:>9.3f} {e.cpu_s:>9.3f} "
+                f"{e.consultas:>9} {e.filas:>10} {e.filas_por_s:>10,.0f}"
+            )
+        return "\n".join(lineas)
+
+
+class corrida:
+    """
+    ``with corrida("importacion", cprofile=True) as c: ...``; al salir guarda
+    el resultado (``guardar=False`` para no escribir archivos).
+    """
+
+    def __init__(self, nombre, *, cprofile=False, muestreo=None, guardar=True, directorio=None):
+        self.corrida = Corrida(nombre, cprofile=cprofile, muestreo=muestreo)
+        self.guardar = guardar
+        self.directorio = directorio
+        self._pila = ExitStack()
+
+    def __enter__(self):
+        self._token = _corrida_actual.set(self.corrida)
+        for alias in settings.DATABASES:
+            self._pila.enter_context(connections[alias].execute_wrapper(self.corrida))
+        self.corrida.entrar(self.corrida.nombre)
+        if self.corrida.perfil is not None:
+            self.corrida.perfil.enable()
+        return self.corrida
+
+    def __exit__(self, *exc):
+        if self.corrida.perfil is not None:
+            self.corrida.perfil.disable()
+        while self.corrida.activas:
+            self.corrida.salir()
+        self._pila.close()
+        _corrida_actual.reset(self._token)
+        if self.guardar:
+            self.corrida.guardar(self.directorio)
+        return False
+
+
+class etapa:
+    """
+    Etapa con nombre de la corrida en curso; sirve como ``with`` y como
+    decorador. No guarda estado propio, así que una instancia de decorador es
+    segura con recursión y entre hilos.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        actual = _corrida_actual.get()
+        if actual is not None:
+            actual.entrar(self.nombre)
+        return self
+
+    def __exit__(self, *exc):
+        actual = _corrida_actual.get()
+        if actual is not None and actual.activas:
+            actual.salir()
+        return False
+
+    def __call__(self, funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with self:
+                return funcion(*args, **kwargs)
+        return envoltura
+
+
+def filas(cantidad):
+    """Suma ``cantidad`` filas procesadas a la etapa abierta más interna."""
+    actual = _corrida_actual.get()
+    if actual is not None and actual.activas:
+        actual.activas[-1][0].filas += cantidad
+
+
+def activa():
+    return _corrida_actual.get()
+
+
+# -------------------- Comparación --------------------
+def cargar(id_o_ruta, directorio=None):
+    ruta = Path(id_o_ruta)
+    if not ruta.suffix:
+        ruta = Path(directorio or directorio_base()) / f"{id_o_ruta}.json"
+    return json.loads(ruta.read_text(encoding="utf-8"))
+
+
+def comparar(actual, anterior):
+    """``{etapa: {metrica: variación %}}`` para las etapas presentes en ambas corridas."""
+    previas = {e["nombre"]: e for e in anterior["etapas"]}
+    deltas = {}
+    for datos in actual["etapas"]:
+        previo = previas.get(datos["nombre"])
+        if not previo:
+            continue
+        deltas[datos["nombre"]] = {
+            metrica: round(100.0 * (datos[metrica] - previo[metrica]) / previo[metrica], 1) if previo[metrica] else None
+            for metrica in ("pared_s", "cpu_s", "consultas", "filas_por_s")
+        }
+    return deltas
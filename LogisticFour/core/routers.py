@@ -0,0 +1,165 @@
+"""
+Ruteo de lecturas a réplicas.
+
+Por defecto todo va a ``default``. El código de reportes y listados opta por
+réplica con ``en_replica()`` / ``@usar_replica``, o fija el alias de un
+queryset o cursor con ``alias_replica(modelo)``; aun así la lectura vuelve a la
+primaria cuando:
+
+* hay una transacción abierta en ``default`` (lecturas que forman parte de una
+  escritura),
+* el queryset es de escritura (``select_for_update`` usa ``db_for_write``),
+* el usuario escribió hace menos de ``DB_REPLICA_PEGADO_SEGUNDOS``
+  (read-your-writes; ``ReplicaStickinessMiddleware`` lo propaga entre
+  peticiones con una cookie).
+"""
+import functools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+COOKIE_PEGADO = "bodega_primario_hasta"
+
+_leer_de_replica = ContextVar("leer_de_replica", default=False)
+_primario_hasta = ContextVar("primario_hasta", default=0.0)
+_hubo_escritura = ContextVar("hubo_escritura", default=False)
+
+
+def alias_replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def segundos_pegado():
+    return getattr(settings, "DB_REPLICA_PEGADO_SEGUNDOS", 5)
+
+
+@contextmanager
+def en_replica():
+    token = _leer_de_replica.set(True)
+    try:
+        yield
+    finally:
+        _leer_de_replica.reset(token)
+
+
+@contextmanager
+def en_primario():
+    token = _leer_de_replica.set(False)
+    try:
+        yield
+    finally:
+        _leer_de_replica.reset(token)
+
+
+def usar_replica(view):
+    """Decorador para vistas de sólo lectura (reportes, listados, exportaciones)."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def envoltura_async(*args, **kwargs):
+            with en_replica():
+                return await view(*args, **kwargs)
+        return envoltura_async
+
+    @functools.wraps(view)
+    def envoltura(*args, **kwargs):
+        with en_replica():
+            return view(*args, **kwargs)
+    return envoltura
+
+
+def alias_replica(model):
+    """
+    Alias para una lectura de ``model`` que puede ir a réplica, con las mismas
+    reglas que ``en_replica()``. Sirve para querysets que se evalúan fuera de la
+    función que los arma (``.using(...)``) y para cursores crudos
+    (``connections[...]``).
+    """
+    with en_replica():
+        return router.db_for_read(model)
+
+
+def marcar_escritura():
+    _hubo_escritura.set(True)
+    _primario_hasta.set(time.time() + segundos_pegado())
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _leer_de_replica.get():
+            return None
+        replicas = alias_replicas()
+        if not replicas:
+            return None
+        if time.time() < _primario_hasta.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        marcar_escritura()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # todas las réplicas contienen los mismos datos que la primaria
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db != DEFAULT_DB_ALIAS:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Mantiene en la primaria las lecturas de un cliente que acaba de escribir.
+    Soporta sync y async: bajo ASGI las vistas async (eventos en vivo) no se
+    adaptan a un hilo por culpa de este middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _entrar(self, request):
+        try:
+            hasta = float(request.COOKIES.get(COOKIE_PEGADO, 0))
+        except ValueError:
+            hasta = 0.0
+        return _primario_hasta.set(hasta), _hubo_escritura.set(False)
+
+    def _salir(self, response):
+        if _hubo_escritura.get() and alias_replicas():
+            response.set_cookie(
+                COOKIE_PEGADO, f"{_primario_hasta.get():.3f}",
+                max_age=segundos_pegado(), httponly=True, samesite="Lax",
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token_hasta, token_escritura = self._entrar(request)
+        try:
+            return self._salir(self.get_response(request))
+        finally:
+            _primario_hasta.reset(token_hasta)
+            _hubo_escritura.reset(token_escritura)
+
+    async def __acall__(self, request):
+        token_hasta, token_escritura = self._entrar(request)
+        try:
+            # sync_to_async devuelve al llamador los ContextVar que cambie el ORM en su hilo
+            return self._salir(await self.get_response(request))
+        finally:
+            _primario_hasta.reset(token_hasta)
+            _hubo_escritura.reset(token_escritura)
@@ -0,0 +1,260 @@
+"""
+Archivo histórico de BitacoraAuditoria y Notificacion.
+
+Las filas más antiguas que un corte se exportan a archivos mensuales
+(``<dir>/<tabla>/<AAAA-MM>/part-<ejecucion>.jsonl.gz`` o ``.parquet`` si pyarrow
+está instalado) y luego se borran en lotes cortos. Cada mes lleva un
+``index.json`` con las claves de entidad presentes y el archivo que las contiene,
+de modo que el historial de una entidad sólo lee los meses que la incluyen.
+"""
+import gzip
+import json
+import os
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from core import perfilado
+from core.models import BitacoraAuditoria, Notificacion
+
+
+@dataclass(frozen=True)
+class Archivable:
+    modelo: type
+    campos: tuple
+    campos_clave: tuple          # campos que forman la clave de entidad del índice
+    filtro: dict                 # restricción extra sobre las filas archivables
+
+    @property
+    def tabla(self):
+        return self.modelo._meta.db_table
+
+    def clave(self, fila):
+        return ":".join(str(fila[c]) for c in self.campos_clave)
+
+
+ARCHIVABLES = {
+    "bitacora": Archivable(
+        modelo=BitacoraAuditoria,
+        campos=("id", "creado_en", "usuario_id", "accion", "tabla", "entidad_id", "detalle"),
+        campos_clave=("tabla", "entidad_id"),
+        filtro={},
+    ),
+    # sólo se archivan notificaciones leídas: las no leídas siguen vivas
+    "notificaciones": Archivable(
+        modelo=Notificacion,
+        campos=("id", "creado_en", "usuario_id", "titulo", "cuerpo", "leida"),
+        campos_clave=("usuario_id",),
+        filtro={"leida": True},
+    ),
+}
+
+
+def directorio_base():
+    return Path(getattr(settings, "ARCHIVO_HISTORICO_DIR", settings.BASE_DIR / "archivo"))
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _esquema_parquet(pa, archivable):
+    tipos = {
+        "BigAutoField": pa.int64(),
+        "BigIntegerField": pa.int64(),
+        "ForeignKey": pa.int64(),
+        "BooleanField": pa.bool_(),
+    }
+    columnas = []
+    for campo in archivable.campos:
+        tipo = archivable.modelo._meta.get_field(campo).get_internal_type()
+        # fechas y JSON viajan serializados como texto
+        columnas.append((campo, tipos.get(tipo, pa.string())))
+    return pa.schema(columnas)
+
+
+def _serializar(fila):
+    return json.loads(json.dumps(fila, cls=DjangoJSONEncoder))
+
+
+# -------------------- Escritura --------------------
+class _EscritorMes:
+    def __init__(self, carpeta, nombre, formato):
+        carpeta.mkdir(parents=True, exist_ok=True)
+        self.formato = formato
+        self.ruta = carpeta / f"{nombre}.{'parquet' if formato == 'parquet' else 'jsonl.gz'}"
+        self.claves = set()
+        self.filas = 0
+        if formato == "parquet":
+            self._writer = None
+        else:
+            self._archivo = gzip.open(self.ruta, "wt", encoding="utf-8")
+
+    def escribir(self, filas, archivable):
+        for fila in filas:
+            self.claves.add(archivable.clave(fila))
+        self.filas += len(filas)
+        if self.formato == "parquet":
+            self._escribir_grupo_parquet(filas, archivable)
+        else:
+            for fila in filas:
+                self._archivo.write(json.dumps(fila, ensure_ascii=False))
+                self._archivo.write("\n")
+
+    def _escribir_grupo_parquet(self, filas, archivable):
+        pa = _pyarrow()
+        # detalle es JSON arbitrario: se guarda como texto
+        filas = [{k: (json.dumps(v) if k == "detalle" else v) for k, v in f.items()} for f in filas]
+        esquema = _esquema_parquet(pa, archivable)
+        if self._writer is None:
+            self._writer = pa.parquet.ParquetWriter(str(self.ruta), esquema, compression="zstd")
+        self._writer.write_table(pa.Table.from_pylist(filas, schema=esquema))
+
+    def cerrar(self):
+        if self.formato == "parquet":
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._archivo.close()
+        with open(self.ruta, "rb") as f:
+            os.fsync(f.fileno())
+
+
+def _actualizar_indice(carpeta, parte, claves):
+    ruta = carpeta / "index.json"
+    indice = json.loads(ruta.read_text()) if ruta.exists() else {"claves": {}}
+    for clave in claves:
+        partes = indice["claves"].setdefault(clave, [])
+        if parte not in partes:
+            partes.append(parte)
+    tmp = ruta.with_suffix(".tmp")
+    tmp.write_text(json.dumps(indice, separators=(",", ":")))
+    os.replace(tmp, ruta)
+
+
+def archivar(nombre, corte, *, formato="jsonl", lote=5000, destino=None):
+    """
+    Exporta las filas de ``ARCHIVABLES[nombre]`` creadas antes de ``corte`` y
+    luego las borra en lotes de ``lote`` filas, cada uno en su propia
+    transacción. Devuelve ``(exportadas, borradas)``.
+
+    El borrado sólo empieza cuando todos los archivos están cerrados y
+    sincronizados en disco, y sólo alcanza a los ids efectivamente exportados:
+    una fila que pasa a ser archivable durante la exportación (p. ej. una
+    notificación marcada como leída) queda para la próxima ejecución. Si el
+    proceso se interrumpe antes, una nueva ejecución vuelve a exportar esas
+    filas y la lectura las deduplica por id.
+    """
+    if formato == "parquet" and _pyarrow() is None:
+        raise RuntimeError("El formato parquet requiere pyarrow instalado.")
+
+    archivable = ARCHIVABLES[nombre]
+    base = Path(destino or directorio_base()) / archivable.tabla
+    ejecucion = "part-" + datetime.now().strftime("%Y%m%d%H%M%S")
+
+    qs = archivable.modelo.objects.filter(creado_en__lt=corte, **archivable.filtro)
+    escritores = {}
+    ultimo_id = 0
+    exportadas = 0
+    exportados = array("q")      # ids escritos, 8 bytes por fila
+
+    # Fase 1: exportar por keyset sobre la PK
+    with perfilado.etapa(f"exportar_{nombre}"):
+        while True:
+            filas = list(qs.filter(pk__gt=ultimo_id).order_by("pk").values(*archivable.campos)[:lote])
+            if not filas:
+                break
+            ultimo_id = filas[-1]["id"]
+            exportados.extend(fila["id"] for fila in filas)
+            por_mes = {}
+            for fila in filas:
+                fila = _serializar(fila)
+                por_mes.setdefault(fila["creado_en"][:7], []).append(fila)
+            for mes, filas_mes in por_mes.items():
+                if mes not in escritores:
+                    escritores[mes] = _EscritorMes(base / mes, ejecucion, formato)
+                escritores[mes].escribir(filas_mes, archivable)
+            exportadas += len(filas)
+
+        for mes, escritor in escritores.items():
+            escritor.cerrar()
+            _actualizar_indice(base / mes, escritor.ruta.name, escritor.claves)
+        perfilado.filas(exportadas)
+
+    # Fase 2: borrar en lotes cortos sólo lo exportado
+    borradas = 0
+    with perfilado.etapa(f"borrar_{nombre}"):
+        for desde in range(0, len(exportados), lote):
+            ids = exportados[desde:desde + lote].tolist()
+            # se repite el filtro: lo que dejó de ser archivable (p. ej. vuelve a no leída) se conserva
+            with transaction.atomic():
+                borradas += qs.filter(pk__in=ids).delete()[0]
+        perfilado.filas(borradas)
+
+    return exportadas, borradas
+
+
+# -------------------- Lectura --------------------
+def _leer_parte(ruta):
+    if ruta.suffix == ".parquet":
+        pa = _pyarrow()
+        if pa is None:
+            raise RuntimeError(f"Se necesita pyarrow para leer {ruta}.")
+        for fila in pa.parquet.read_table(str(ruta)).to_pylist():
+            if isinstance(fila.get("detalle"), str):
+                fila["detalle"] = json.loads(fila["detalle"])
+            yield fila
+    else:
+        with gzip.open(ruta, "rt", encoding="utf-8") as f:
+            for linea in f:
+                yield json.loads(linea)
+
+
+def _filas_archivadas(archivable, clave, destino=None):
+    base = Path(destino or directorio_base()) / archivable.tabla
+    if not base.exists():
+        return
+    for carpeta in sorted(p for p in base.iterdir() if p.is_dir()):
+        ruta_indice = carpeta / "index.json"
+        if not ruta_indice.exists():
+            continue
+        partes = json.loads(ruta_indice.read_text())["claves"].get(clave, [])
+        for parte in partes:
+            for fila in _leer_parte(carpeta / parte):
+                if archivable.clave(fila) == clave:
+                    yield fila
+
+
+def historial(nombre, destino=None, **filtro):
+    """
+    Devuelve las filas vivas y archivadas que cumplen ``filtro`` (los campos de
+    la clave del archivable), ordenadas por ``creado_en``. Cada fila lleva
+    ``archivada`` para distinguir su origen.
+    """
+    archivable = ARCHIVABLES[nombre]
+    clave = archivable.clave(filtro)
+
+    filas = {}
+    for fila in _filas_archivadas(archivable, clave, destino):
+        fila["creado_en"] = datetime.fromisoformat(fila["creado_en"].replace("Z", "+00:00"))
+        fila["archivada"] = True
+        filas[fila["id"]] = fila
+    for fila in archivable.modelo.objects.filter(**filtro).values(*archivable.campos):
+        fila["archivada"] = False
+        filas[fila["id"]] = fila
+    return sorted(filas.values(), key=lambda f: (f["creado_en"], f["id"]))
+
+
+def historial_entidad(tabla, entidad_id, destino=None):
+    """Historial completo de auditoría de una entidad (vivo + archivo)."""
+    return historial("bitacora", destino=destino, tabla=tabla, entidad_id=entidad_id)
@@ -0,0 +1,182 @@
+"""
+Registro de Bitácora de Auditoría con escrituras diferidas.
+
+Las entradas se acumulan en memoria por transacción y se insertan con un único
+``bulk_create`` cuando la transacción confirma (``transaction.on_commit``). Si
+la transacción se revierte, las entradas se descartan junto con ella.
+
+Fuera de un bloque atómico las entradas se entregan a un hilo escritor con cola
+acotada (``AUDITORIA_MODO = "hilo"``) o se insertan de inmediato
+(``AUDITORIA_MODO = "directo"``, valor por defecto).
+"""
+import atexit
+import logging
+import queue
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core.models import BitacoraAuditoria
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+# -------------------- Buffer por transacción --------------------
+def _buffer_transaccion(using):
+    """
+    Devuelve la lista de entradas asociada al savepoint actual de ``using``.
+
+    Cada lista tiene su callback ``on_commit``, que la inserta y la quita del
+    registro. Si la transacción o el savepoint se revierten, Django descarta el
+    callback y con él las entradas; el registro sólo guarda una referencia débil
+    al callback, así que una lista cuyo callback ya no existe se reemplaza en
+    lugar de seguir llenándose. Las listas de savepoints que ya no están en la
+    pila (``savepoint_ids``) se olvidan: o se revirtieron o se liberaron, y en
+    ese caso su callback sigue pendiente en la transacción externa.
+    """
+    actuales = tuple(connections[using].savepoint_ids)
+    buffers = _local.__dict__.setdefault("buffers", {})
+    for clave in [c for c in buffers if c[0] == using and c[1] != actuales[:len(c[1])]]:
+        del buffers[clave]
+
+    clave = (using, actuales)
+    actual = buffers.get(clave)
+    if actual is not None:
+        entradas, callback_vivo = actual
+        if callback_vivo() is not None:
+            return entradas
+
+    entradas = []
+
+    def callback():
+        if buffers.get(clave, (None,))[0] is entradas:
+            del buffers[clave]
+        _insertar(entradas, using)
+
+    buffers[clave] = (entradas, weakref.ref(callback))
+    transaction.on_commit(callback, using=using)
+    return entradas
+
+
+def _insertar(entradas, using=DEFAULT_DB_ALIAS):
+    if not entradas:
+        return
+    BitacoraAuditoria.objects.using(using).bulk_create(
+        entradas, batch_size=_config("AUDITORIA_LOTE", 500)
+    )
+
+
+# -------------------- Hilo escritor --------------------
+class EscritorAuditoria(threading.Thread):
+    """
+    Hilo de fondo que vacía la cola en lotes. La cola es acotada: cuando está
+    llena, ``encolar`` bloquea hasta ``timeout`` (contrapresión) y, si sigue
+    llena, el llamador escribe de forma síncrona.
+    """
+
+    def __init__(self, maxsize=10000, lote=500, using=DEFAULT_DB_ALIAS):
+        super().__init__(name="escritor-auditoria", daemon=True)
+        self.cola = queue.Queue(maxsize=maxsize)
+        self.lote = lote
+        self.using = using
+
+    def encolar(self, entrada, timeout=1.0):
+        try:
+            self.cola.put(entrada, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def run(self):
+        while True:
+            entradas = [self.cola.get()]
+            while len(entradas) < self.lote:
+                try:
+                    entradas.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                _insertar(entradas, self.using)
+            except Exception:
+                logger.exception("No se pudieron escribir %s entradas de auditoría", len(entradas))
+            finally:
+                for _ in entradas:
+                    self.cola.task_done()
+                connections[self.using].close_if_unusable_or_obsolete()
+
+    def vaciar(self):
+        self.cola.join()
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def _obtener_escritor():
+    global _escritor
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                escritor = EscritorAuditoria(
+                    maxsize=_config("AUDITORIA_COLA_MAX", 10000),
+                    lote=_config("AUDITORIA_LOTE", 500),
+                )
+                escritor.start()
+                atexit.register(escritor.vaciar)
+                _escritor = escritor
+    return _escritor
+
+
+# -------------------- API pública --------------------
+def registrar(accion, *, tabla="", entidad_id=None, detalle=None, usuario=None, using=DEFAULT_DB_ALIAS):
+    """
+    Registra una entrada de auditoría sin escribirla en el momento.
+
+    Dentro de ``transaction.atomic`` la entrada se inserta al confirmar;
+    fuera de él se delega según ``AUDITORIA_MODO``.
+    """
+    entrada = BitacoraAuditoria(
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        accion=accion,
+        tabla=tabla,
+        entidad_id=entidad_id,
+        detalle=detalle,
+    )
+
+    if connections[using].in_atomic_block:
+        _buffer_transaccion(using).append(entrada)
+        return entrada
+
+    if _config("AUDITORIA_MODO", "directo") == "hilo" and using == DEFAULT_DB_ALIAS:
+        if _obtener_escritor().encolar(entrada, timeout=_config("AUDITORIA_TIMEOUT_COLA", 1.0)):
+            return entrada
+        logger.warning("Cola de auditoría llena; escribiendo de forma síncrona")
+
+    _insertar([entrada], using)
+    return entrada
+
+
+def registrar_instancia(accion, instancia, *, detalle=None, usuario=None):
+    """Atajo para auditar un modelo usando su ``db_table`` y ``pk``."""
+    return registrar(
+        accion,
+        tabla=instancia._meta.db_table,
+        entidad_id=instancia.pk,
+        detalle=detalle,
+        usuario=usuario,
+        using=instancia._state.db or DEFAULT_DB_ALIAS,
+    )
+
+
+def vaciar():
+    """Espera a que el hilo escritor (si existe) termine de escribir su cola."""
+    if _escritor is not None:
+        _escritor.vaciar()
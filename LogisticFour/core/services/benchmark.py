@@ -0,0 +1,198 @@
+"""
+Benchmarks de las operaciones clave de inventario sobre los datos existentes
+(típicamente los de ``manage.py generar_datos_sinteticos``).
+
+Cada operación se ejecuta ``iteraciones`` veces tras un calentamiento, con
+parámetros tomados al azar de una muestra de la base (``TABLESAMPLE``), y se
+registra por iteración la latencia y la cantidad de consultas. Las operaciones
+que escriben corren dentro de una transacción que se revierte salvo
+``confirmar=True``: el conjunto de datos no cambia entre corridas.
+
+El resultado es un dict serializable a JSON (latencias p50/p99/media en ms,
+operaciones por segundo, consultas media/máxima por operación y tamaño de las
+tablas principales) y ``comparar`` lo contrasta con una corrida anterior.
+"""
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Bodega, Stock
+from core.services import busqueda, inventario, vencimientos
+
+TABLAS = ("productos", "ubicaciones", "lotes_producto", "series_producto", "stock", "movimientos_stock", "alertas")
+TAMANO_MUESTRA = 500
+# el BEGIN/COMMIT/ROLLBACK y los savepoints del propio arnés no cuentan como consultas
+_CONTROL_TRANSACCION = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def percentil(valores, p):
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1]
+
+
+@dataclass
+class Muestra:
+    stock: list = field(default_factory=list)       # (producto, ubicacion, bodega, lote, serie, libre)
+    bodegas: list = field(default_factory=list)
+    terminos: list = field(default_factory=list)
+
+
+def _filas_aproximadas(tabla):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = %s", [tabla])
+        fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+
+def tomar_muestra(rnd, tamano=TAMANO_MUESTRA):
+    """Parámetros realistas para las operaciones, sin recorrer tablas completas."""
+    filas = _filas_aproximadas("stock")
+    porcentaje = min(100.0, max(0.01, 100.0 * tamano * 4 / filas)) if filas else 100.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT s.producto_id, s.ubicacion_id, u.bodega_id, s.lote_id, s.serie_id,
+                   s.cantidad_disponible - s.cantidad_reservada, p.nombre
+            FROM stock s TABLESAMPLE SYSTEM ({porcentaje:.4f})
+            JOIN ubicaciones u ON u.id = s.ubicacion_id
+            JOIN productos p ON p.id = s.producto_id
+            WHERE s.cantidad_disponible > s.cantidad_reservada
+            LIMIT %s
+            """,
+            [tamano],
+        )
+        filas_muestra = cursor.fetchall()
+    if not filas_muestra:
+        # tablas chicas o recién cargadas sin ANALYZE: la muestra por bloques puede venir vacía
+        filas_muestra = list(
+            Stock.objects.filter(cantidad_disponible__gt=F("cantidad_reservada"))
+            .values_list("producto_id", "ubicacion_id", "ubicacion__bodega_id", "lote_id", "serie_id",
+                         F("cantidad_disponible") - F("cantidad_reservada"), "producto__nombre")
+            .order_by("?")[:tamano]
+        )
+    terminos = sorted({palabra for f in filas_muestra for palabra in f[6].split() if len(palabra) > 3})
+    return Muestra(
+        stock=[f[:6] for f in filas_muestra],
+        bodegas=list(Bodega.objects.values_list("id", flat=True)),
+        terminos=terminos or ["a"],
+    )
+
+
+# -------------------- Operaciones --------------------
+def _posteo(muestra, rnd):
+    lineas = [
+        inventario.LineaMovimiento(
+            producto_id=p, cantidad=1 if serie else rnd.randint(1, 10), ubicacion_hasta_id=u, lote_id=lote, serie_id=serie,
+        )
+        for p, u, _, lote, serie, _ in rnd.sample(muestra.stock, min(5, len(muestra.stock)))
+    ]
+    inventario.postear("IN", lineas, tabla_referencia="benchmark")
+
+
+def _reserva(muestra, rnd):
+    p, u, _, lote, serie, libre = rnd.choice(muestra.stock)
+    inventario.reservar(p, u, min(libre, 1), lote_id=lote, serie_id=serie, tabla_referencia="benchmark")
+
+
+def _listado(muestra, rnd):
+    bodega_id = rnd.choice(muestra.stock)[2]
+    list(
+        Stock.objects.filter(ubicacion__bodega_id=bodega_id, cantidad_disponible__gt=0)
+        .select_related("producto", "ubicacion", "lote")
+        .order_by("-actualizado_en", "-id")[:50]
+    )
+
+
+def _busqueda(muestra, rnd):
+    busqueda.buscar(rnd.choice(muestra.terminos)[:5])
+
+
+def _kardex(muestra, rnd):
+    p, _, bodega_id, _, _, _ = rnd.choice(muestra.stock)
+    inventario.kardex(p, bodega_id=bodega_id, limite=200)
+
+
+def _alertas(muestra, rnd):
+    vencimientos.generar_alertas(bodega_ids=[rnd.choice(muestra.bodegas)])
+
+
+# nombre -> (función, escribe)
+OPERACIONES = {
+    "posteo": (_posteo, True),
+    "reserva": (_reserva, True),
+    "listado": (_listado, False),
+    "busqueda": (_busqueda, False),
+    "kardex": (_kardex, False),
+    "alertas": (_alertas, True),
+}
+
+
+def medir(nombre, muestra, rnd, *, iteraciones=100, calentamiento=5, confirmar=False):
+    funcion, escribe = OPERACIONES[nombre]
+    tiempos, consultas = [], []
+    for i in range(calentamiento + iteraciones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                funcion(muestra, rnd)
+                if escribe and not confirmar:
+                    transaction.set_rollback(True)
+            transcurrido = time.perf_counter() - inicio
+        if i >= calentamiento:
+            tiempos.append(transcurrido * 1000)
+            consultas.append(sum(1 for q in capturadas.captured_queries if not q["sql"].startswith(_CONTROL_TRANSACCION)))
+    total_s = sum(tiempos) / 1000
+    return {
+        "iteraciones": iteraciones,
+        "p50_ms": round(percentil(tiempos, 50), 3),
+        "p99_ms": round(percentil(tiempos, 99), 3),
+        "media_ms": round(statistics.fmean(tiempos), 3) if tiempos else 0.0,
+        "ops_por_s": round(iteraciones / total_s, 1) if total_s else 0.0,
+        "consultas_media": round(statistics.fmean(consultas), 2) if consultas else 0.0,
+        "consultas_max": max(consultas, default=0),
+    }
+
+
+def ejecutar(operaciones=None, *, iteraciones=100, calentamiento=5, confirmar=False, semilla=1, informar=None):
+    rnd = random.Random(semilla)
+    muestra = tomar_muestra(rnd)
+    if not muestra.stock:
+        raise ValueError("No hay stock disponible para medir; genere datos con generar_datos_sinteticos.")
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW server_version")
+        version = cursor.fetchone()[0]
+    resultado = {
+        "generado_en": timezone.now().isoformat(),
+        "base": {"motor": connection.vendor, "version": version},
+        "tablas": {t: _filas_aproximadas(t) for t in TABLAS},
+        "parametros": {"iteraciones": iteraciones, "calentamiento": calentamiento, "confirmar": confirmar, "semilla": semilla},
+        "operaciones": {},
+    }
+    for nombre in operaciones or OPERACIONES:
+        resultado["operaciones"][nombre] = medir(
+            nombre, muestra, rnd, iteraciones=iteraciones, calentamiento=calentamiento, confirmar=confirmar
+        )
+        if informar:
+            informar(nombre, resultado["operaciones"][nombre])
+    return resultado
+
+
+def comparar(actual, anterior):
+    """``{operacion: {metrica: variación %}}`` para las operaciones presentes en ambas corridas."""
+    deltas = {}
+    for nombre, datos in actual["operaciones"].items():
+        previo = anterior.get("operaciones", {}).get(nombre)
+        if not previo:
+            continue
+        deltas[nombre] = {
+            metrica: round(100.0 * (datos[metrica] - previo[metrica]) / previo[metrica], 1) if previo[metrica] else None
+            for metrica in ("p50_ms", "p99_ms", "ops_por_s", "consultas_media")
+        }
+    return deltas
@@ -0,0 +1,199 @@
+"""
+Búsqueda de productos sobre ``DocumentoBusquedaProducto``.
+
+El documento se arma en SQL (una sentencia por lote) con pesos:
+
+* A: sku y SKUs de proveedor (configuración ``simple``, sin stemming)
+* B: nombre (``spanish``)
+* C: marca
+* D: ruta de categoría ("Herramientas > Eléctricas > Taladros") y atributos
+  de texto (``AtributoProducto.valor_texto``)
+
+``buscar`` combina full-text con prefijos (``tal:*``) y coincidencia parcial
+por trigramas sobre ``texto`` (``ILIKE`` servido por el índice GIN
+``gin_trgm_ops``), así que "X-12" encuentra "ABX-1234". Ambas condiciones usan
+índice y el ranking se calcula sólo sobre hasta ``MAX_CANDIDATOS`` filas; el
+producto cuyo sku coincide exactamente (índice ``idx_producto_sku_lower``) se
+suma aparte, así que el tope nunca lo deja fuera, y los inactivos se descartan
+antes del tope.
+
+Los cambios en productos, marcas, categorías, SKUs de proveedor y atributos se agendan
+desde core.signals y se aplican al confirmar la transacción.
+"""
+import re
+import threading
+
+from django.db import connection, transaction
+
+CONFIG_TEXTO = "spanish"
+LIMITE_POR_DEFECTO = 20
+# consultas muy amplias ("tornillo") sólo rankean este máximo de coincidencias
+MAX_CANDIDATOS = 2000
+
+_SQL_REFRESCAR = """
+WITH RECURSIVE rutas AS (
+    SELECT id, nombre::text AS ruta, 1 AS nivel
+    FROM categorias_productos WHERE padre_id IS NULL
+    UNION ALL
+    SELECT c.id, r.ruta || ' > ' || c.nombre, r.nivel + 1
+    FROM categorias_productos c JOIN rutas r ON c.padre_id = r.id
+    WHERE r.nivel < 20
+),
+fuente AS (
+    SELECT p.id, p.sku, p.nombre,
+           COALESCE(m.nombre, '') AS marca,
+           COALESCE(r.ruta, '') AS ruta,
+           COALESCE(pp.skus, '') AS skus_proveedor,
+           COALESCE(pa.valores, '') AS atributos
+    FROM productos p
+    LEFT JOIN marcas m ON m.id = p.marca_id
+    LEFT JOIN rutas r ON r.id = p.categoria_id
+    LEFT JOIN LATERAL (
+        SELECT string_agg(sku_proveedor, ' ') AS skus
+        FROM productos_usuarios_proveedor
+        WHERE producto_id = p.id AND sku_proveedor <> ''
+    ) pp ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT string_agg(valor_texto, ' ') AS valores
+        FROM atributos_producto
+        WHERE producto_id = p.id AND valor_texto <> ''
+    ) pa ON TRUE
+    WHERE {filtro}
+)
+INSERT INTO documentos_busqueda_producto AS d (producto_id, texto, documento, actualizado_en)
+SELECT id,
+       lower(concat_ws(' ', sku, skus_proveedor, nombre, marca, ruta, atributos)),
+       setweight(to_tsvector('simple', sku || ' ' || skus_proveedor), 'A')
+       || setweight(to_tsvector('{config}', nombre), 'B')
+       || setweight(to_tsvector('simple', marca), 'C')
+       || setweight(to_tsvector('{config}', ruta || ' ' || atributos), 'D'),
+       NOW()
+FROM fuente
+ON CONFLICT (producto_id) DO UPDATE SET
+    texto = EXCLUDED.texto,
+    documento = EXCLUDED.documento,
+    actualizado_en = EXCLUDED.actualizado_en
+WHERE d.texto IS DISTINCT FROM EXCLUDED.texto
+"""
+
+_SQL_BUSCAR = """
+WITH q AS (SELECT {consulta} AS consulta),
+candidatos AS (
+    SELECT d.producto_id, d.documento, d.texto
+    FROM productos p
+    JOIN documentos_busqueda_producto d ON d.producto_id = p.id
+    WHERE lower(p.sku) = %(exacto)s {filtro}
+    UNION ALL
+    (
+        SELECT d.producto_id, d.documento, d.texto
+        FROM documentos_busqueda_producto d
+        JOIN productos p ON p.id = d.producto_id
+        CROSS JOIN q
+        WHERE (d.documento @@ q.consulta OR d.texto ILIKE %(parcial)s)
+          AND lower(p.sku) <> %(exacto)s {filtro}
+        LIMIT %(candidatos)s
+    )
+)
+SELECT p.id, p.sku, p.nombre, m.nombre AS marca, p.activo,
+       (CASE WHEN lower(p.sku) = %(exacto)s THEN 10 ELSE 0 END)
+       + ts_rank_cd(c.documento, q.consulta)
+       + similarity(c.texto, %(exacto)s) AS rango
+FROM candidatos c
+CROSS JOIN q
+JOIN productos p ON p.id = c.producto_id
+LEFT JOIN marcas m ON m.id = p.marca_id
+ORDER BY rango DESC, p.sku
+LIMIT %(limite)s
+"""
+
+
+def refrescar(producto_ids=None, *, marca_ids=None, categoria_ids=None):
+    """
+    Regenera los documentos de los productos indicados (o de los productos de
+    esas marcas/categorías, incluidas subcategorías). Sin argumentos, todos.
+    Devuelve la cantidad de documentos escritos.
+    """
+    condiciones, params = [], []
+    if producto_ids is not None:
+        condiciones.append("p.id = ANY(%s)")
+        params.append(list(producto_ids))
+    if marca_ids is not None:
+        condiciones.append("p.marca_id = ANY(%s)")
+        params.append(list(marca_ids))
+    if categoria_ids is not None:
+        condiciones.append(
+            "p.categoria_id IN (WITH RECURSIVE sub AS ("
+            " SELECT id FROM categorias_productos WHERE id = ANY(%s)"
+            " UNION SELECT c.id FROM categorias_productos c JOIN sub ON c.padre_id = sub.id"
+            ") SELECT id FROM sub)"
+        )
+        params.append(list(categoria_ids))
+    filtro = " OR ".join(condiciones) if condiciones else "TRUE"
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_REFRESCAR.format(filtro=filtro, config=CONFIG_TEXTO), params)
+        return cursor.rowcount
+
+
+def reindexar(lote=10000):
+    """Regenera todo el catálogo por rangos de id, una transacción por rango."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), -1) FROM productos")
+        minimo, maximo = cursor.fetchone()
+    total = 0
+    for inicio in range(minimo, maximo + 1, lote):
+        with transaction.atomic():
+            total += refrescar(range(inicio, inicio + lote))
+    return total
+
+
+def _tokens(consulta):
+    return [t for t in re.split(r"[^\w]+", consulta.lower()) if t]
+
+
+def buscar(consulta, limite=LIMITE_POR_DEFECTO, *, solo_activos=True):
+    """
+    Productos que calzan con ``consulta``, del más al menos relevante, como
+    diccionarios ``{id, sku, nombre, marca, activo, rango}``.
+    """
+    consulta = (consulta or "").strip()
+    tokens = _tokens(consulta)
+    if not tokens:
+        return []
+    # cada término por prefijo, con y sin stemming (el sku va en "simple")
+    partes, params = [], {}
+    for i, token in enumerate(tokens):
+        partes.append(f"(to_tsquery('simple', %(t{i})s) || to_tsquery('{CONFIG_TEXTO}', %(t{i})s))")
+        params[f"t{i}"] = f"{token}:*"
+    params.update({
+        "exacto": consulta.lower(),
+        "parcial": "%" + consulta.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",
+        "limite": limite,
+        "candidatos": MAX_CANDIDATOS,
+    })
+    filtro = "AND p.activo" if solo_activos else ""
+    sql = _SQL_BUSCAR.format(consulta=" && ".join(partes), filtro=filtro)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columnas = [c[0] for c in cursor.description]
+        return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+# -------------------- Refresco incremental --------------------
+_pendientes = threading.local()
+
+
+def _vaciar_pendientes():
+    productos = getattr(_pendientes, "productos", set())
+    marcas = getattr(_pendientes, "marcas", set())
+    categorias = getattr(_pendientes, "categorias", set())
+    _pendientes.productos, _pendientes.marcas, _pendientes.categorias = set(), set(), set()
+    if productos or marcas or categorias:
+        refrescar(productos or None, marca_ids=marcas or None, categoria_ids=categorias or None)
+
+
+def programar(*, producto_id=None, marca_id=None, categoria_id=None):
+    """Agenda el refresco al confirmar; todos los cambios de la transacción van en una sentencia."""
+    for clave, valor in (("productos", producto_id), ("marcas", marca_id), ("categorias", categoria_id)):
+        if valor is not None:
+            _pendientes.__dict__.setdefault(clave, set()).add(valor)
+    transaction.on_commit(_vaciar_pendientes)
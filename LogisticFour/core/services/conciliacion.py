@@ -0,0 +1,169 @@
+"""
+Match de tres vías (pedido / recibido / facturado) por orden de compra.
+
+``conciliar`` agrega líneas de OC, recepciones posteadas y facturas no anuladas
+en una sola sentencia (CTEs + ``INSERT ... ON CONFLICT``) y persiste el estado
+en ``ConciliacionOrdenCompra``; las listas de partidas abiertas son lecturas
+sobre el índice ``(estado, proveedor)``. Sirve igual para un año de órdenes
+(``manage.py conciliar_compras``) que para una sola orden al llegar una
+recepción o factura (ver ``programar`` y core.signals).
+
+Lo recibido se valoriza al precio neto promedio de la OC para ese producto y,
+como lo pedido, se lleva a monto con impuesto. Estados, con tolerancia
+``CONCILIACION_TOLERANCIA_PCT`` (porcentaje sobre lo pedido):
+
+* DIFERENCIA: se facturó más de lo recibido o se recibió más de lo pedido.
+* PENDIENTE_RECEPCION: falta recibir mercadería.
+* PENDIENTE_FACTURA: falta facturar lo recibido.
+* OK: pedido, recibido y facturado coinciden.
+"""
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.models import ConciliacionOrdenCompra
+
+_SQL = """
+WITH ordenes AS (
+    SELECT o.id, o.proveedor_id, COALESCE(t.porcentaje, 0) AS tasa
+    FROM ordenes_compra o
+    LEFT JOIN tasas_impuesto t ON t.id = o.tasa_impuesto_id
+    WHERE o.estado <> 'CANCELED' {filtro}
+),
+pedido AS (
+    SELECT l.orden_compra_id AS orden_id, l.producto_id,
+           SUM(l.cantidad_pedida) AS cantidad,
+           SUM(l.cantidad_pedida * l.precio * (1 - l.descuento_pct / 100)) AS monto
+    FROM lineas_orden_compra l
+    JOIN ordenes o ON o.id = l.orden_compra_id
+    GROUP BY l.orden_compra_id, l.producto_id
+),
+recibido AS (
+    SELECT r.orden_compra_id AS orden_id, lr.producto_id, SUM(lr.cantidad_recibida) AS cantidad
+    FROM recepciones_mercaderia r
+    JOIN ordenes o ON o.id = r.orden_compra_id
+    JOIN lineas_recepcion_mercaderia lr ON lr.recepcion_id = r.id
+    WHERE r.estado = 'POSTED'
+    GROUP BY r.orden_compra_id, lr.producto_id
+),
+facturado AS (
+    SELECT f.orden_compra_id AS orden_id, SUM(f.monto_total) AS monto
+    FROM facturas_proveedor f
+    JOIN ordenes o ON o.id = f.orden_compra_id
+    WHERE f.estado <> 'CANCELED'
+    GROUP BY f.orden_compra_id
+),
+por_producto AS (
+    SELECT COALESCE(p.orden_id, r.orden_id) AS orden_id,
+           COALESCE(p.cantidad, 0) AS cantidad_pedida,
+           COALESCE(p.monto, 0) AS monto_pedido,
+           COALESCE(r.cantidad, 0) AS cantidad_recibida,
+           -- recibido sin línea de OC: sin precio, cuenta sólo en cantidad
+           COALESCE(r.cantidad * p.monto / NULLIF(p.cantidad, 0), 0) AS monto_recibido
+    FROM pedido p
+    FULL JOIN recibido r ON r.orden_id = p.orden_id AND r.producto_id = p.producto_id
+),
+totales AS (
+    SELECT o.id, o.proveedor_id,
+           COALESCE(SUM(pp.cantidad_pedida), 0) AS cantidad_pedida,
+           COALESCE(SUM(pp.cantidad_recibida), 0) AS cantidad_recibida,
+           ROUND(COALESCE(SUM(pp.monto_pedido), 0) * (1 + o.tasa / 100), 4) AS monto_pedido,
+           ROUND(COALESCE(SUM(pp.monto_recibido), 0) * (1 + o.tasa / 100), 4) AS monto_recibido,
+           COALESCE(MAX(fa.monto), 0) AS monto_facturado
+    FROM ordenes o
+    LEFT JOIN por_producto pp ON pp.orden_id = o.id
+    LEFT JOIN facturado fa ON fa.orden_id = o.id
+    GROUP BY o.id, o.proveedor_id, o.tasa
+)
+INSERT INTO conciliaciones_orden_compra AS c (
+    orden_compra_id, proveedor_id, cantidad_pedida, cantidad_recibida,
+    monto_pedido, monto_recibido, monto_facturado, diferencia, estado, actualizado_en
+)
+SELECT id, proveedor_id, cantidad_pedida, cantidad_recibida,
+       monto_pedido, monto_recibido, monto_facturado, monto_facturado - monto_recibido,
+       CASE
+           WHEN monto_facturado > monto_recibido + monto_pedido * %(tol)s
+             OR cantidad_recibida > cantidad_pedida * (1 + %(tol)s) THEN 'DIFERENCIA'
+           WHEN cantidad_recibida < cantidad_pedida * (1 - %(tol)s) THEN 'PENDIENTE_RECEPCION'
+           WHEN monto_facturado < monto_recibido - monto_pedido * %(tol)s THEN 'PENDIENTE_FACTURA'
+           ELSE 'OK'
+       END,
+       NOW()
+FROM totales
+ON CONFLICT (orden_compra_id) DO UPDATE SET
+    proveedor_id = EXCLUDED.proveedor_id,
+    cantidad_pedida = EXCLUDED.cantidad_pedida,
+    cantidad_recibida = EXCLUDED.cantidad_recibida,
+    monto_pedido = EXCLUDED.monto_pedido,
+    monto_recibido = EXCLUDED.monto_recibido,
+    monto_facturado = EXCLUDED.monto_facturado,
+    diferencia = EXCLUDED.diferencia,
+    estado = EXCLUDED.estado,
+    actualizado_en = EXCLUDED.actualizado_en
+WHERE (c.proveedor_id, c.cantidad_pedida, c.cantidad_recibida, c.monto_pedido,
+       c.monto_recibido, c.monto_facturado, c.estado)
+      IS DISTINCT FROM
+      (EXCLUDED.proveedor_id, EXCLUDED.cantidad_pedida, EXCLUDED.cantidad_recibida, EXCLUDED.monto_pedido,
+       EXCLUDED.monto_recibido, EXCLUDED.monto_facturado, EXCLUDED.estado)
+"""
+
+
+def tolerancia():
+    return Decimal(str(getattr(settings, "CONCILIACION_TOLERANCIA_PCT", 2))) / 100
+
+
+@transaction.atomic
+def conciliar(orden_ids=None, *, desde=None):
+    """
+    Concilia ``orden_ids`` (o todas, o las creadas desde ``desde``) y devuelve
+    la cantidad de conciliaciones insertadas o modificadas. Las órdenes
+    anuladas pierden su conciliación.
+    """
+    filtro, params = "", {"tol": tolerancia()}
+    if orden_ids is not None:
+        orden_ids = list(orden_ids)
+        if not orden_ids:
+            return 0
+        filtro += " AND o.id = ANY(%(ids)s)"
+        params["ids"] = orden_ids
+    if desde is not None:
+        filtro += " AND o.creado_en >= %(desde)s"
+        params["desde"] = desde
+
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL.format(filtro=filtro), params)
+        cambios = cursor.rowcount
+    anuladas = ConciliacionOrdenCompra.objects.filter(orden_compra__estado="CANCELED")
+    if orden_ids is not None:
+        anuladas = anuladas.filter(orden_compra_id__in=orden_ids)
+    anuladas.delete()
+    return cambios
+
+
+def partidas_abiertas(proveedor=None, estados=None):
+    """Conciliaciones que no están OK, opcionalmente de un proveedor."""
+    estados = estados or [e for e in ConciliacionOrdenCompra.Estado.values if e != "OK"]
+    qs = ConciliacionOrdenCompra.objects.filter(estado__in=estados)
+    if proveedor is not None:
+        qs = qs.filter(proveedor=proveedor)
+    return qs.select_related("orden_compra", "proveedor")
+
+
+# -------------------- Reconciliación incremental --------------------
+_pendientes = threading.local()
+
+
+def _vaciar_pendientes():
+    ids = getattr(_pendientes, "ordenes", set())
+    _pendientes.ordenes = set()
+    conciliar(ids)
+
+
+def programar(orden_id):
+    """Agenda la reconciliación de ``orden_id`` para el commit (una sentencia por transacción)."""
+    if orden_id is None:
+        return
+    _pendientes.__dict__.setdefault("ordenes", set()).add(orden_id)
+    transaction.on_commit(_vaciar_pendientes)
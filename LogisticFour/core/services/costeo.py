@@ -0,0 +1,155 @@
+"""
+Costeo incremental de inventario: promedio ponderado móvil o FIFO.
+
+Se ejecuta dentro de la transacción de ``inventario.postear``. Cada entrada
+suma cantidad y valor a ``ValorizacionInventario`` (y abre una ``CapaCosto`` en
+FIFO); cada salida descuenta al costo promedio vigente o consumiendo las capas
+más antiguas. Las transferencias entre bodegas sacan el costo de origen y lo
+llevan tal cual a destino; dentro de la misma bodega no cambian el valor.
+
+``COSTEO_METODO`` ("PROMEDIO" o "FIFO") es global: cambiarlo con stock
+existente deja capas FIFO incompletas.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+
+from core.models import CapaCosto, ValorizacionInventario
+
+CERO = Decimal("0")
+PRECISION = Decimal("0.000001")
+
+
+def metodo():
+    return getattr(settings, "COSTEO_METODO", "PROMEDIO").upper()
+
+
+_SQL_BLOQUEAR_VALORIZACIONES = """
+SELECT v.* FROM valorizacion_inventario v
+JOIN unnest(%s::bigint[], %s::bigint[]) AS k(producto_id, bodega_id)
+  ON v.producto_id = k.producto_id AND v.bodega_id = k.bodega_id
+ORDER BY v.id
+FOR UPDATE OF v
+"""
+
+
+def _bloquear_valorizaciones(pares):
+    ValorizacionInventario.objects.bulk_create(
+        [ValorizacionInventario(producto_id=p, bodega_id=b) for p, b in pares],
+        ignore_conflicts=True,
+    )
+    # sólo los pares exactos: no bloquea productos × bodegas de otros posteos
+    filas = ValorizacionInventario.objects.raw(_SQL_BLOQUEAR_VALORIZACIONES, [list(c) for c in zip(*pares)])
+    return {(v.producto_id, v.bodega_id): v for v in filas}
+
+
+def _consumir_capas(producto_id, bodega_id, cantidad, capas_tocadas):
+    """Consume FIFO y devuelve el costo total de ``cantidad``."""
+    restante = cantidad
+    costo = CERO
+    capas = (
+        CapaCosto.objects.select_for_update()
+        .filter(producto_id=producto_id, bodega_id=bodega_id, cantidad_restante__gt=0)
+        .order_by("fecha", "id")
+    )
+    for capa in capas.iterator(chunk_size=100):
+        if restante <= 0:
+            break
+        # la capa puede haberse consumido antes en este mismo posteo
+        capa = capas_tocadas.get(capa.pk, capa)
+        tomado = min(capa.cantidad_restante, restante)
+        if tomado <= 0:
+            continue
+        capa.cantidad_restante -= tomado
+        capas_tocadas[capa.pk] = capa
+        costo += tomado * capa.costo_unitario
+        restante -= tomado
+    return costo, restante
+
+
+def aplicar(tipo, movimientos, bodega_de_ubicacion):
+    """
+    Actualiza valorización (y capas FIFO) para ``movimientos`` ya creados.
+    Devuelve los movimientos cuyo ``costo_unitario`` se asignó aquí.
+    """
+    salidas, entradas = [], []
+    for mov in movimientos:
+        origen = bodega_de_ubicacion.get(mov.ubicacion_desde_id)
+        destino = bodega_de_ubicacion.get(mov.ubicacion_hasta_id)
+        if tipo.direccion == 0 and origen == destino:
+            continue
+        if tipo.direccion <= 0:
+            salidas.append((mov, origen))
+        if tipo.direccion >= 0:
+            entradas.append((mov, destino))
+
+    pares = {(m.producto_id, b) for m, b in salidas + entradas}
+    if not pares:
+        return []
+    valorizaciones = _bloquear_valorizaciones(pares)
+    fifo = metodo() == "FIFO"
+    capas_tocadas = {}
+    capas_nuevas = []
+    costeados = []
+
+    # salidas primero: en una transferencia fijan el costo que llega a destino
+    for mov, bodega_id in salidas:
+        val = valorizaciones[(mov.producto_id, bodega_id)]
+        cantidad = Decimal(mov.cantidad)
+        if fifo:
+            costo, sin_capa = _consumir_capas(mov.producto_id, bodega_id, cantidad, capas_tocadas)
+            # stock sin capas (p.ej. cargado antes del costeo): al promedio
+            costo += sin_capa * val.costo_promedio
+        else:
+            costo = cantidad * val.costo_promedio
+        val.cantidad -= cantidad
+        val.valor_total = val.valor_total - costo if val.cantidad > 0 else CERO
+        mov.costo_unitario = (costo / cantidad).quantize(PRECISION)
+        costeados.append(mov)
+
+    for mov, bodega_id in entradas:
+        val = valorizaciones[(mov.producto_id, bodega_id)]
+        cantidad = Decimal(mov.cantidad)
+        costo_unitario = mov.costo_unitario
+        if costo_unitario is None:
+            # entradas sin costo (ajustes, devoluciones): al promedio vigente
+            costo_unitario = val.costo_promedio
+            mov.costo_unitario = costo_unitario
+            costeados.append(mov)
+        val.cantidad += cantidad
+        val.valor_total += cantidad * costo_unitario
+        if fifo:
+            capas_nuevas.append(CapaCosto(
+                producto_id=mov.producto_id,
+                bodega_id=bodega_id,
+                movimiento=mov,
+                fecha=mov.ocurrido_en,
+                cantidad_inicial=cantidad,
+                cantidad_restante=cantidad,
+                costo_unitario=costo_unitario,
+            ))
+
+    for val in valorizaciones.values():
+        val.valor_total = val.valor_total.quantize(PRECISION)
+        val.costo_promedio = (val.valor_total / val.cantidad).quantize(PRECISION) if val.cantidad > 0 else val.costo_promedio
+    ValorizacionInventario.objects.bulk_update(
+        [valorizaciones[p] for p in pares], ["cantidad", "valor_total", "costo_promedio"], batch_size=1000
+    )
+    if capas_tocadas:
+        CapaCosto.objects.bulk_update(capas_tocadas.values(), ["cantidad_restante"], batch_size=1000)
+    if capas_nuevas:
+        CapaCosto.objects.bulk_create(capas_nuevas, batch_size=1000)
+    return costeados
+
+
+# -------------------- Lecturas --------------------
+def valorizacion_bodega(bodega_id):
+    """Valor total del inventario de una bodega (index-only scan)."""
+    total = ValorizacionInventario.objects.filter(bodega_id=bodega_id).aggregate(v=Sum("valor_total"))["v"]
+    return total or CERO
+
+
+def valorizacion_por_bodega():
+    filas = ValorizacionInventario.objects.values("bodega_id").annotate(v=Sum("valor_total")).order_by()
+    return {fila["bodega_id"]: fila["v"] or CERO for fila in filas}
@@ -0,0 +1,157 @@
+"""
+Desempeño real de proveedores por producto: lead time y tasa de cumplimiento.
+
+Sobre las órdenes (no anuladas) creadas en los últimos ``DESEMPENO_VENTANA_DIAS``:
+
+* lead time: días entre ``OrdenCompra.creado_en`` y la primera recepción
+  posteada del producto; promedio y percentiles 50/90 con ``percentile_cont``.
+* cumplimiento: ``SUM(LEAST(recibido, pedido)) / SUM(pedido)``; lo recibido de
+  más no compensa faltantes de otras órdenes.
+
+``recalcular`` es una sola sentencia (CTEs + ``INSERT ... ON CONFLICT``) que
+sirve para todo el catálogo o para un proveedor y algunos productos; esto
+último se agenda desde core.signals al postear una recepción.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.models import DesempenoProveedorProducto, LineaRecepcionMercaderia
+
+_SQL = """
+WITH lineas AS (
+    SELECT o.id AS orden_id, o.proveedor_id, o.creado_en, l.producto_id, SUM(l.cantidad_pedida) AS pedida
+    FROM ordenes_compra o
+    JOIN lineas_orden_compra l ON l.orden_compra_id = o.id
+    WHERE o.estado <> 'CANCELED' AND o.creado_en >= %(desde)s {filtro}
+    GROUP BY o.id, o.proveedor_id, o.creado_en, l.producto_id
+),
+recibido AS (
+    SELECT r.orden_compra_id AS orden_id, lr.producto_id,
+           SUM(lr.cantidad_recibida) AS recibida,
+           MIN(r.recibido_en) AS primera,
+           MAX(r.recibido_en) AS ultima
+    FROM recepciones_mercaderia r
+    JOIN lineas_recepcion_mercaderia lr ON lr.recepcion_id = r.id
+    WHERE r.estado = 'POSTED' AND r.orden_compra_id IN (SELECT orden_id FROM lineas)
+    GROUP BY r.orden_compra_id, lr.producto_id
+),
+base AS (
+    SELECT li.proveedor_id, li.producto_id, li.pedida,
+           COALESCE(re.recibida, 0) AS recibida,
+           EXTRACT(EPOCH FROM (re.primera - li.creado_en)) / 86400.0 AS lead,
+           re.ultima
+    FROM lineas li
+    LEFT JOIN recibido re ON re.orden_id = li.orden_id AND re.producto_id = li.producto_id
+)
+INSERT INTO desempeno_proveedor_producto AS d (
+    proveedor_id, producto_id, ordenes, recepciones,
+    lead_time_promedio, lead_time_p50, lead_time_p90,
+    cantidad_pedida, cantidad_recibida, tasa_cumplimiento, ultima_recepcion, actualizado_en
+)
+SELECT proveedor_id, producto_id, COUNT(*), COUNT(lead),
+       ROUND(AVG(lead)::numeric, 2),
+       ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY lead))::numeric, 2),
+       ROUND((percentile_cont(0.9) WITHIN GROUP (ORDER BY lead))::numeric, 2),
+       SUM(pedida), SUM(recibida),
+       ROUND(SUM(LEAST(recibida, pedida)) / NULLIF(SUM(pedida), 0), 4),
+       MAX(ultima), NOW()
+FROM base
+GROUP BY proveedor_id, producto_id
+ON CONFLICT (proveedor_id, producto_id) DO UPDATE SET
+    ordenes = EXCLUDED.ordenes,
+    recepciones = EXCLUDED.recepciones,
+    lead_time_promedio = EXCLUDED.lead_time_promedio,
+    lead_time_p50 = EXCLUDED.lead_time_p50,
+    lead_time_p90 = EXCLUDED.lead_time_p90,
+    cantidad_pedida = EXCLUDED.cantidad_pedida,
+    cantidad_recibida = EXCLUDED.cantidad_recibida,
+    tasa_cumplimiento = EXCLUDED.tasa_cumplimiento,
+    ultima_recepcion = EXCLUDED.ultima_recepcion,
+    actualizado_en = EXCLUDED.actualizado_en
+"""
+
+_SQL_TIEMPOS_ENTREGA = """
+UPDATE productos_usuarios_proveedor pp
+SET tiempo_entrega_dias = CEIL(d.lead_time_p90)::integer
+FROM desempeno_proveedor_producto d
+WHERE d.proveedor_id = pp.proveedor_id AND d.producto_id = pp.producto_id
+  AND d.lead_time_p90 IS NOT NULL AND d.recepciones >= %s
+  AND pp.tiempo_entrega_dias IS DISTINCT FROM CEIL(d.lead_time_p90)::integer
+"""
+
+
+def ventana():
+    return timedelta(days=getattr(settings, "DESEMPENO_VENTANA_DIAS", 365))
+
+
+@transaction.atomic
+def recalcular(proveedor_id=None, producto_ids=None):
+    """
+    Recalcula el desempeño (todo, un proveedor o un proveedor y productos).
+    En el recálculo completo se borran los pares sin órdenes en la ventana.
+    Devuelve la cantidad de filas escritas.
+    """
+    with connection.cursor() as cursor:
+        # el mismo reloj que escribe actualizado_en = NOW(): el inicio de la
+        # transacción (también si hay una externa) y sin desfase con la aplicación
+        cursor.execute("SELECT NOW()")
+        inicio = cursor.fetchone()[0]
+    filtro, params = "", {"desde": inicio - ventana()}
+    if proveedor_id is not None:
+        filtro += " AND o.proveedor_id = %(proveedor)s"
+        params["proveedor"] = proveedor_id
+    if producto_ids is not None:
+        filtro += " AND l.producto_id = ANY(%(productos)s)"
+        params["productos"] = list(producto_ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL.format(filtro=filtro), params)
+        escritas = cursor.rowcount
+
+    obsoletas = DesempenoProveedorProducto.objects.filter(actualizado_en__lt=inicio)
+    if proveedor_id is not None:
+        obsoletas = obsoletas.filter(proveedor_id=proveedor_id)
+    if producto_ids is not None:
+        obsoletas = obsoletas.filter(producto_id__in=producto_ids)
+    obsoletas.delete()
+    return escritas
+
+
+def sincronizar_tiempos_entrega(minimo_recepciones=3):
+    """Lleva ``ProductoUsuarioProveedor.tiempo_entrega_dias`` al p90 observado (redondeado hacia arriba)."""
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_TIEMPOS_ENTREGA, [minimo_recepciones])
+        return cursor.rowcount
+
+
+# -------------------- Actualización incremental --------------------
+_pendientes = threading.local()
+
+
+def _vaciar_pendientes():
+    recepciones = getattr(_pendientes, "recepciones", set())
+    _pendientes.recepciones = set()
+    if not recepciones:
+        return
+    por_proveedor = {}
+    filas = (
+        LineaRecepcionMercaderia.objects
+        .filter(recepcion_id__in=recepciones, recepcion__orden_compra__isnull=False)
+        .values_list("recepcion__orden_compra__proveedor_id", "producto_id")
+        .distinct()
+    )
+    for proveedor_id, producto_id in filas:
+        por_proveedor.setdefault(proveedor_id, set()).add(producto_id)
+    for proveedor_id, productos in por_proveedor.items():
+        recalcular(proveedor_id, productos)
+
+
+def programar_recepcion(recepcion):
+    """Agenda para el commit el recálculo de los productos de una recepción posteada."""
+    if recepcion.estado != "POSTED" or recepcion.orden_compra_id is None:
+        return
+    _pendientes.__dict__.setdefault("recepciones", set()).add(recepcion.pk)
+    transaction.on_commit(_vaciar_pendientes)
@@ -0,0 +1,467 @@
+"""
+Resolución de códigos escaneados (producto, lote, serie, ubicación).
+
+Cada proceso mantiene un índice en memoria:
+
+* productos por SKU y por SKU de proveedor (también sirve para GTIN)
+* lotes y series por (producto, código) y por código solo
+* ubicaciones por bodega y código
+
+``resolver`` no toca la base para códigos conocidos. Un código desconocido se
+busca en la base una vez y se agrega al índice; si tampoco está en la base se
+recuerda como desconocido (hasta ``MAX_DESCONOCIDOS`` códigos, por
+``ESCANEO_TTL`` segundos) para que repetirlo no vuelva a consultar. Las altas, cambios y bajas
+hechas en este proceso llegan por core.signals al confirmar. Para acotar la
+desactualización frente a cambios hechos por otros procesos el índice se
+reconstruye completo cada ``ESCANEO_TTL`` segundos (en segundo plano: mientras
+tanto se sigue usando el anterior).
+
+Las lecturas no toman lock; toda modificación del índice (señales, respaldo en
+base, desconocidos) se hace bajo ``Indice.lock`` y los conjuntos se copian
+antes de recorrerlos, de modo que un alta concurrente no rompe una resolución.
+
+Los códigos GS1 (GS1-128 / DataMatrix, con FNC1 como ``\\x1d`` o en formato
+legible ``(01)...(17)...``) se descomponen en GTIN (01), lote (10),
+vencimiento (17) y serie (21).
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.models import LoteProducto, Producto, ProductoUsuarioProveedor, SerieProducto, Ubicacion
+
+logger = logging.getLogger(__name__)
+
+GS = "\x1d"
+# AIs de largo fijo (sin contar el AI); el resto es variable hasta FNC1
+AI_FIJOS = {"00": 18, "01": 14, "02": 14, "11": 6, "12": 6, "13": 6, "15": 6, "16": 6, "17": 6, "20": 2}
+AI_VARIABLES = {"10", "21", "22", "240", "241", "250", "251"}
+_PREFIJOS_SIMBOLOGIA = ("]C1", "]e0", "]d2", "]Q3", "]J1")
+_GS1_LEGIBLE = re.compile(r"\((\d{2,4})\)([^(]+)")
+# códigos no encontrados en la base que se recuerdan por índice
+MAX_DESCONOCIDOS = 10000
+
+
+def _normalizar(codigo):
+    return codigo.strip().upper()
+
+
+# -------------------- GS1 --------------------
+def _fecha_gs1(valor):
+    """YYMMDD; día 00 = último día del mes (regla GS1)."""
+    try:
+        anio, mes, dia = 2000 + int(valor[:2]), int(valor[2:4]), int(valor[4:6])
+        if dia == 0:
+            siguiente = date(anio + mes // 12, mes % 12 + 1, 1)
+            return date.fromordinal(siguiente.toordinal() - 1)
+        return date(anio, mes, dia)
+    except ValueError:
+        return None
+
+
+def parsear_gs1(codigo):
+    """
+    Devuelve ``{ai: valor}`` si ``codigo`` es un código GS1 con AIs, o ``None``.
+    Acepta el prefijo de simbología (``]C1``, ``]d2``...), FNC1 como ``\\x1d`` y
+    la forma legible con paréntesis.
+    """
+    codigo = codigo.strip()
+    if codigo.startswith("("):
+        partes = _GS1_LEGIBLE.findall(codigo)
+        return {ai: valor.strip() for ai, valor in partes} or None
+
+    es_gs1 = codigo.startswith(_PREFIJOS_SIMBOLOGIA) or GS in codigo
+    for prefijo in _PREFIJOS_SIMBOLOGIA:
+        if codigo.startswith(prefijo):
+            codigo = codigo[len(prefijo):]
+            break
+    if not es_gs1 and not (codigo[:2] == "01" and len(codigo) > 16 and codigo[:16].isdigit()):
+        return None
+
+    datos, i = {}, 0
+    while i < len(codigo):
+        if codigo[i] == GS:
+            i += 1
+            continue
+        ai = next((codigo[i:i + n] for n in (2, 3) if codigo[i:i + n] in AI_FIJOS or codigo[i:i + n] in AI_VARIABLES), None)
+        if ai is None:
+            return datos or None
+        i += len(ai)
+        if ai in AI_FIJOS:
+            datos[ai] = codigo[i:i + AI_FIJOS[ai]]
+            i += AI_FIJOS[ai]
+        else:
+            fin = codigo.find(GS, i)
+            fin = len(codigo) if fin < 0 else fin
+            datos[ai] = codigo[i:fin]
+            i = fin
+    return datos or None
+
+
+# -------------------- Índice --------------------
+@dataclass
+class Indice:
+    productos: dict = field(default_factory=dict)          # código -> producto_id
+    sku_de: dict = field(default_factory=dict)             # producto_id -> sku (para renombres)
+    lotes: dict = field(default_factory=dict)              # (producto_id, código) -> (lote_id, vencimiento)
+    lotes_por_codigo: dict = field(default_factory=dict)   # código -> {(producto_id, lote_id)}
+    lote_de: dict = field(default_factory=dict)            # lote_id -> (producto_id, código)
+    series: dict = field(default_factory=dict)             # (producto_id, número) -> (serie_id, lote_id)
+    series_por_numero: dict = field(default_factory=dict)  # número -> {(producto_id, serie_id)}
+    serie_de: dict = field(default_factory=dict)           # serie_id -> (producto_id, número)
+    ubicaciones: dict = field(default_factory=dict)        # bodega_id -> {código: ubicacion_id}
+    ubicacion_de: dict = field(default_factory=dict)       # ubicacion_id -> (bodega_id, código)
+    desconocidos: dict = field(default_factory=dict)       # (código, bodega_id) -> instante de la búsqueda
+    construido_en: float = 0.0
+    lock: threading.RLock = field(default_factory=threading.RLock, repr=False, compare=False)
+
+    def agregar_lote(self, lote_id, producto_id, codigo, vencimiento):
+        codigo = _normalizar(codigo)
+        with self.lock:
+            self.lotes[(producto_id, codigo)] = (lote_id, vencimiento)
+            self.lotes_por_codigo.setdefault(codigo, set()).add((producto_id, lote_id))
+            self.lote_de[lote_id] = (producto_id, codigo)
+
+    def quitar_lote(self, lote_id):
+        with self.lock:
+            clave = self.lote_de.pop(lote_id, None)
+            if clave:
+                self.lotes.pop(clave, None)
+                self.lotes_por_codigo.get(clave[1], set()).discard((clave[0], lote_id))
+
+    def agregar_serie(self, serie_id, producto_id, numero, lote_id):
+        numero = _normalizar(numero)
+        with self.lock:
+            self.quitar_serie(serie_id)
+            self.series[(producto_id, numero)] = (serie_id, lote_id)
+            self.series_por_numero.setdefault(numero, set()).add((producto_id, serie_id))
+            self.serie_de[serie_id] = (producto_id, numero)
+
+    def quitar_serie(self, serie_id):
+        with self.lock:
+            clave = self.serie_de.pop(serie_id, None)
+            if clave:
+                if self.series.get(clave, (None, None))[0] == serie_id:
+                    del self.series[clave]
+                self.series_por_numero.get(clave[1], set()).discard((clave[0], serie_id))
+
+    def agregar_ubicacion(self, ubicacion_id, bodega_id, codigo):
+        codigo = _normalizar(codigo)
+        with self.lock:
+            self.quitar_ubicacion(ubicacion_id)
+            self.ubicaciones.setdefault(bodega_id, {})[codigo] = ubicacion_id
+            self.ubicacion_de[ubicacion_id] = (bodega_id, codigo)
+
+    def quitar_ubicacion(self, ubicacion_id):
+        with self.lock:
+            clave = self.ubicacion_de.pop(ubicacion_id, None)
+            if clave and self.ubicaciones.get(clave[0], {}).get(clave[1]) == ubicacion_id:
+                del self.ubicaciones[clave[0]][clave[1]]
+
+    def agregar_producto(self, codigo, producto_id, sku=None):
+        with self.lock:
+            self.productos[codigo] = producto_id
+            if sku is not None:
+                self.sku_de[producto_id] = sku
+
+    def es_desconocido(self, clave, bodega_id, ttl):
+        instante = self.desconocidos.get((clave, bodega_id))
+        return instante is not None and time.monotonic() - instante <= ttl
+
+    def recordar_desconocido(self, clave, bodega_id):
+        with self.lock:
+            if len(self.desconocidos) >= MAX_DESCONOCIDOS:
+                # el más antiguo primero (los dict conservan el orden de inserción)
+                self.desconocidos.pop(next(iter(self.desconocidos), None), None)
+            self.desconocidos[(clave, bodega_id)] = time.monotonic()
+
+
+def construir():
+    indice = Indice()
+    # los SKU de proveedor primero: si chocan, gana el SKU propio
+    for producto_id, sku_proveedor in ProductoUsuarioProveedor.objects.exclude(sku_proveedor="").values_list(
+        "producto_id", "sku_proveedor"
+    ).iterator(chunk_size=5000):
+        indice.productos[_normalizar(sku_proveedor)] = producto_id
+    for producto_id, sku in Producto.objects.values_list("id", "sku").iterator(chunk_size=5000):
+        indice.productos[_normalizar(sku)] = producto_id
+        indice.sku_de[producto_id] = sku
+    for lote_id, producto_id, codigo, vencimiento in LoteProducto.objects.values_list(
+        "id", "producto_id", "codigo_lote", "fecha_vencimiento"
+    ).iterator(chunk_size=5000):
+        indice.agregar_lote(lote_id, producto_id, codigo, vencimiento)
+    for serie_id, producto_id, numero, lote_id in SerieProducto.objects.values_list(
+        "id", "producto_id", "numero_serie", "lote_id"
+    ).iterator(chunk_size=5000):
+        indice.agregar_serie(serie_id, producto_id, numero, lote_id)
+    for ubicacion_id, bodega_id, codigo in Ubicacion.objects.values_list("id", "bodega_id", "codigo").iterator(
+        chunk_size=5000
+    ):
+        indice.agregar_ubicacion(ubicacion_id, bodega_id, codigo)
+    indice.construido_en = time.monotonic()
+    return indice
+
+
+_indice = None
+_lock = threading.Lock()
+_reconstruyendo = False
+
+
+def _reconstruir_en_segundo_plano():
+    global _indice, _reconstruyendo
+    try:
+        _indice = construir()
+    except Exception:
+        logger.exception("No se pudo reconstruir el índice de escaneo")
+    finally:
+        _reconstruyendo = False
+        connection.close()
+
+
+def indice():
+    """Índice vigente; lo construye en el primer uso y lo renueva al vencer el TTL."""
+    global _indice, _reconstruyendo
+    if _indice is None:
+        with _lock:
+            if _indice is None:
+                _indice = construir()
+        return _indice
+    ttl = getattr(settings, "ESCANEO_TTL", 300)
+    if ttl and time.monotonic() - _indice.construido_en > ttl and not _reconstruyendo:
+        with _lock:
+            if not _reconstruyendo:
+                _reconstruyendo = True
+                threading.Thread(target=_reconstruir_en_segundo_plano, name="indice-escaneo", daemon=True).start()
+    return _indice
+
+
+def calentar():
+    """Construye el índice ahora (al arrancar el proceso) en lugar de en el primer escaneo."""
+    global _indice
+    _indice = construir()
+    return _indice
+
+
+def _precalentar():
+    try:
+        calentar()
+    except Exception:
+        logger.exception("No se pudo precalentar el índice de escaneo")
+    finally:
+        connection.close()
+
+
+def precalentar_en_segundo_plano():
+    threading.Thread(target=_precalentar, name="indice-escaneo", daemon=True).start()
+
+
+# -------------------- Respaldo en base (códigos desconocidos) --------------------
+def _buscar_en_base(idx, codigo, bodega_id):
+    ubicacion = (
+        Ubicacion.objects.filter(bodega_id=bodega_id, codigo__iexact=codigo).values_list("id", flat=True).first()
+        if bodega_id else None
+    )
+    if ubicacion:
+        idx.agregar_ubicacion(ubicacion, bodega_id, codigo)
+        return
+    producto = Producto.objects.filter(sku__iexact=codigo).values_list("id", "sku").first()
+    if producto:
+        idx.agregar_producto(codigo, producto[0], producto[1])
+        return
+    producto_id = (
+        ProductoUsuarioProveedor.objects.filter(sku_proveedor__iexact=codigo).values_list("producto_id", flat=True).first()
+    )
+    if producto_id:
+        idx.agregar_producto(codigo, producto_id)
+        return
+    series = list(SerieProducto.objects.filter(numero_serie__iexact=codigo).values_list("id", "producto_id", "lote_id"))
+    for serie_id, producto_id, lote_id in series:
+        idx.agregar_serie(serie_id, producto_id, codigo, lote_id)
+    if series:
+        return
+    for lote_id, producto_id, vencimiento in LoteProducto.objects.filter(codigo_lote__iexact=codigo).values_list(
+        "id", "producto_id", "fecha_vencimiento"
+    ):
+        idx.agregar_lote(lote_id, producto_id, codigo, vencimiento)
+
+
+# -------------------- Resolución --------------------
+def _resultado(codigo, **datos):
+    base = {
+        "codigo": codigo, "tipo": None, "producto_id": None, "lote_id": None,
+        "serie_id": None, "ubicacion_id": None, "vencimiento": None, "ambiguo": False,
+    }
+    base.update(datos)
+    return base
+
+
+def _producto_por_gtin(idx, gtin):
+    # GTIN-14 con ceros a la izquierda: probar también la forma GTIN-13/12/8
+    for candidato in (gtin, gtin.lstrip("0")):
+        producto_id = idx.productos.get(candidato)
+        if producto_id is not None:
+            return producto_id
+    return None
+
+
+def _resolver_gs1(idx, codigo, ais):
+    producto_id = _producto_por_gtin(idx, ais["01"]) if "01" in ais else None
+    vencimiento = _fecha_gs1(ais["17"]) if "17" in ais else None
+    datos = {"tipo": "producto" if producto_id else None, "producto_id": producto_id,
+             "vencimiento": vencimiento, "gs1": ais}
+    if "21" in ais:
+        numero = _normalizar(ais["21"])
+        if producto_id is not None:
+            serie = idx.series.get((producto_id, numero))
+            if serie:
+                datos.update(tipo="serie", serie_id=serie[0], lote_id=serie[1])
+        else:
+            datos.update(_serie_por_numero(idx, numero) or {})
+    if "10" in ais and datos["producto_id"]:
+        lote = idx.lotes.get((datos["producto_id"], _normalizar(ais["10"])))
+        if lote:
+            datos.update(lote_id=lote[0], vencimiento=vencimiento or lote[1])
+            if datos["tipo"] == "producto":
+                datos["tipo"] = "lote"
+    return _resultado(codigo, **datos)
+
+
+def _serie_por_numero(idx, numero):
+    # copia: un alta o baja concurrente no debe cambiar el conjunto mientras se recorre
+    series = set(idx.series_por_numero.get(numero, ()))
+    if not series:
+        return None
+    producto_id, serie_id = min(series)
+    return {
+        "tipo": "serie", "producto_id": producto_id, "serie_id": serie_id,
+        "lote_id": idx.series.get((producto_id, numero), (None, None))[1], "ambiguo": len(series) > 1,
+    }
+
+
+def _resolver_en_indice(idx, codigo, bodega_id):
+    clave = _normalizar(codigo)
+    if bodega_id is not None:
+        ubicacion_id = idx.ubicaciones.get(bodega_id, {}).get(clave)
+        if ubicacion_id:
+            return _resultado(codigo, tipo="ubicacion", ubicacion_id=ubicacion_id)
+    producto_id = idx.productos.get(clave)
+    if producto_id is not None:
+        return _resultado(codigo, tipo="producto", producto_id=producto_id)
+    serie = _serie_por_numero(idx, clave)
+    if serie:
+        return _resultado(codigo, **serie)
+    lotes = set(idx.lotes_por_codigo.get(clave, ()))
+    if lotes:
+        producto_id, lote_id = min(lotes)
+        return _resultado(
+            codigo, tipo="lote", producto_id=producto_id, lote_id=lote_id,
+            vencimiento=idx.lotes.get((producto_id, clave), (None, None))[1], ambiguo=len(lotes) > 1,
+        )
+    return None
+
+
+def resolver(codigo, bodega_id=None):
+    """
+    Interpreta un código escaneado. Orden para códigos simples: ubicación de
+    ``bodega_id``, SKU / SKU de proveedor, número de serie, código de lote.
+    ``tipo`` queda en ``None`` si no se reconoce; ``ambiguo`` indica que el
+    número de serie o de lote corresponde a más de un producto.
+    """
+    idx = indice()
+    ais = parsear_gs1(codigo)
+    if ais:
+        return _resolver_gs1(idx, codigo, ais)
+    resultado = _resolver_en_indice(idx, codigo, bodega_id)
+    if resultado is not None:
+        return resultado
+    clave = _normalizar(codigo)
+    ttl = getattr(settings, "ESCANEO_TTL", 300)
+    if idx.es_desconocido(clave, bodega_id, ttl):
+        return _resultado(codigo)
+    _buscar_en_base(idx, clave, bodega_id)
+    resultado = _resolver_en_indice(idx, codigo, bodega_id)
+    if resultado is None:
+        # sin TTL el índice no se renueva: no se recuerdan los desconocidos
+        if ttl:
+            idx.recordar_desconocido(clave, bodega_id)
+        resultado = _resultado(codigo)
+    return resultado
+
+
+def resolver_varios(codigos, bodega_id=None):
+    return [resolver(codigo, bodega_id) for codigo in codigos]
+
+
+# -------------------- Mantenimiento incremental (core.signals) --------------------
+def _al_confirmar(funcion):
+    def aplicar():
+        idx = _indice
+        if idx is not None:
+            with idx.lock:
+                funcion(idx)
+    transaction.on_commit(aplicar)
+
+
+def producto_guardado(producto_id, sku):
+    def aplicar(idx):
+        anterior = idx.sku_de.get(producto_id)
+        if anterior and _normalizar(anterior) != _normalizar(sku) and idx.productos.get(_normalizar(anterior)) == producto_id:
+            del idx.productos[_normalizar(anterior)]
+        idx.productos[_normalizar(sku)] = producto_id
+        idx.sku_de[producto_id] = sku
+    _al_confirmar(aplicar)
+
+
+def producto_borrado(producto_id):
+    def aplicar(idx):
+        sku = idx.sku_de.pop(producto_id, None)
+        if sku and idx.productos.get(_normalizar(sku)) == producto_id:
+            del idx.productos[_normalizar(sku)]
+        # los SKU de proveedor se borran en cascada y llegan por sku_proveedor_borrado
+    _al_confirmar(aplicar)
+
+
+def sku_proveedor_guardado(producto_id, sku_proveedor):
+    # un SKU de proveedor reemplazado queda apuntando al mismo producto hasta el próximo TTL
+    if sku_proveedor:
+        _al_confirmar(lambda idx: idx.productos.setdefault(_normalizar(sku_proveedor), producto_id))
+
+
+def sku_proveedor_borrado(producto_id, sku_proveedor):
+    def aplicar(idx):
+        if sku_proveedor and idx.productos.get(_normalizar(sku_proveedor)) == producto_id:
+            del idx.productos[_normalizar(sku_proveedor)]
+    _al_confirmar(aplicar)
+
+
+def lote_guardado(lote_id, producto_id, codigo, vencimiento):
+    def aplicar(idx):
+        idx.quitar_lote(lote_id)
+        idx.agregar_lote(lote_id, producto_id, codigo, vencimiento)
+    _al_confirmar(aplicar)
+
+
+def lote_borrado(lote_id):
+    _al_confirmar(lambda idx: idx.quitar_lote(lote_id))
+
+
+def serie_guardada(serie_id, producto_id, numero, lote_id):
+    _al_confirmar(lambda idx: idx.agregar_serie(serie_id, producto_id, numero, lote_id))
+
+
+def serie_borrada(serie_id):
+    _al_confirmar(lambda idx: idx.quitar_serie(serie_id))
+
+
+def ubicacion_guardada(ubicacion_id, bodega_id, codigo):
+    _al_confirmar(lambda idx: idx.agregar_ubicacion(ubicacion_id, bodega_id, codigo))
+
+
+def ubicacion_borrada(ubicacion_id):
+    _al_confirmar(lambda idx: idx.quitar_ubicacion(ubicacion_id))
@@ -0,0 +1,226 @@
+"""
+Pub/sub de eventos en vivo (alertas y notificaciones) para los tableros.
+
+Cada proceso ASGI mantiene un ``Broker`` en memoria: las conexiones abiertas son
+colas asyncio en el mismo event loop, sin un hilo por cliente. Con
+``EVENTOS_BACKEND = "postgres"`` las publicaciones viajan por
+``pg_notify``/``LISTEN`` para llegar a todos los procesos; un único hilo por
+proceso escucha el canal y reparte al broker local. ``"local"`` (por defecto)
+sirve para desarrollo y tests con un solo proceso.
+
+Los eventos llevan un ``id`` creciente en el orden en que se entregan y el
+broker guarda los últimos ``EVENTOS_HISTORIAL`` para reenviarlos cuando un
+cliente se reconecta con ``Last-Event-ID``. Con ``"postgres"`` el id sale de la
+secuencia ``eventos_id_seq`` (migración 0019) en la misma transacción que el
+``pg_notify`` y bajo un advisory lock, de modo que los procesos no intercalan
+ids entre sí; con ``"local"`` lo asigna el broker al despachar.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CANAL_POSTGRES = "bodega_eventos"
+# clave del advisory lock que ordena las publicaciones entre procesos
+LOCK_PUBLICACION = 0x6576656E746F73
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+class Suscripcion:
+    def __init__(self, broker, maxsize):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=maxsize)
+
+    def _entregar(self, evento):
+        # cliente lento: se descarta el evento más antiguo
+        if self.cola.full():
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+    async def siguiente(self, timeout=None):
+        return await asyncio.wait_for(self.cola.get(), timeout)
+
+    def pendientes(self):
+        eventos = []
+        while not self.cola.empty():
+            eventos.append(self.cola.get_nowait())
+        return eventos
+
+    def cerrar(self):
+        self.broker._desuscribir(self)
+
+
+class Broker:
+    def __init__(self, historial=500):
+        self._suscripciones = set()
+        self._historial = collections.deque(maxlen=historial)
+        self._lock = threading.Lock()
+        # backend local: tras reiniciar el proceso los ids siguen por encima de
+        # los que un cliente pudo ver antes
+        self._ids = itertools.count(time.time_ns())
+
+    def suscribir(self, maxsize=100):
+        """Debe llamarse desde código async (usa el event loop en curso)."""
+        suscripcion = Suscripcion(self, maxsize)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def _desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def despachar(self, evento):
+        """
+        Entrega ``evento`` a las suscripciones de este proceso (thread-safe). Si
+        no trae ``id`` (backend local) se numera aquí, bajo el mismo lock que el
+        historial, para que el orden de los ids sea el de entrega.
+        """
+        with self._lock:
+            if "id" not in evento:
+                evento["id"] = next(self._ids)
+            self._historial.append(evento)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # el loop del cliente ya cerró
+                self._desuscribir(suscripcion)
+
+    def desde(self, ultimo_id):
+        with self._lock:
+            return [e for e in self._historial if e["id"] > ultimo_id]
+
+    @property
+    def conectados(self):
+        return len(self._suscripciones)
+
+
+broker = Broker(historial=_config("EVENTOS_HISTORIAL", 500))
+
+
+# -------------------- Backend PostgreSQL (LISTEN/NOTIFY) --------------------
+_oyente = None
+_oyente_lock = threading.Lock()
+
+
+def _leer_avisos(raw, timeout):
+    """Avisos de ``LISTEN`` recibidos en la conexión ``raw`` (psycopg2 o 3)."""
+    if hasattr(raw, "poll"):  # psycopg2
+        if select.select([raw], [], [], timeout) == ([], [], []):
+            return []
+        raw.poll()
+        avisos = list(raw.notifies)
+        raw.notifies.clear()
+        return avisos
+    return list(raw.notifies(timeout=timeout))  # psycopg 3
+
+
+def _escuchar_postgres():
+    db = connections.create_connection("default")
+    while True:
+        try:
+            db.ensure_connection()
+            db.set_autocommit(True)
+            raw = db.connection
+            with raw.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL_POSTGRES}")
+            while True:
+                for aviso in _leer_avisos(raw, 30):
+                    broker.despachar(json.loads(aviso.payload))
+        except Exception:
+            logger.exception("Se perdió la conexión LISTEN %s; reintentando", CANAL_POSTGRES)
+            db.close()
+            time.sleep(2)
+
+
+def _iniciar_oyente():
+    global _oyente
+    if _config("EVENTOS_BACKEND", "local") != "postgres" or _oyente is not None:
+        return
+    with _oyente_lock:
+        if _oyente is None:
+            _oyente = threading.Thread(target=_escuchar_postgres, name="oyente-eventos", daemon=True)
+            _oyente.start()
+
+
+def suscribir(maxsize=100):
+    _iniciar_oyente()
+    return broker.suscribir(maxsize=maxsize)
+
+
+# -------------------- Publicación --------------------
+# El lock se libera al confirmar, después de encolar los NOTIFY: dos procesos no
+# pueden tomar ids intercalados y entregarlos en otro orden.
+_SQL_NOTIFICAR = """
+SELECT pg_notify(%s, (e.evento || jsonb_build_object('id', nextval('eventos_id_seq')))::text)
+FROM unnest(%s::jsonb[]) WITH ORDINALITY AS e(evento, n)
+ORDER BY e.n
+"""
+
+
+def _enviar(eventos):
+    if _config("EVENTOS_BACKEND", "local") == "postgres":
+        with transaction.atomic(using="default"), connections["default"].cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_PUBLICACION])
+            cursor.execute(_SQL_NOTIFICAR, [CANAL_POSTGRES, [json.dumps(e, cls=DjangoJSONEncoder) for e in eventos]])
+    else:
+        for evento in eventos:
+            broker.despachar(json.loads(json.dumps(evento, cls=DjangoJSONEncoder)))
+
+
+def publicar(tipo, **datos):
+    """Publica un evento cuando la transacción en curso confirme."""
+    publicar_varios([dict(datos, tipo=tipo)])
+
+
+def publicar_varios(eventos):
+    """Publica ``eventos`` al confirmar; el ``id`` se asigna al enviarlos."""
+    if not eventos:
+        return
+    eventos = [dict(evento) for evento in eventos]
+    transaction.on_commit(lambda: _enviar(eventos))
+
+
+def evento_alerta(alerta):
+    return {
+        "tipo": "alerta",
+        "alerta_id": alerta.pk,
+        "severidad": alerta.severidad,
+        "mensaje": alerta.mensaje,
+        "producto_id": alerta.producto_id,
+        "ubicacion_id": alerta.ubicacion_id,
+        "creado_en": alerta.creado_en,
+    }
+
+
+def evento_notificacion(notificacion):
+    return {
+        "tipo": "notificacion",
+        "notificacion_id": notificacion.pk,
+        "usuario_id": notificacion.usuario_id,
+        "titulo": notificacion.titulo,
+        "creado_en": notificacion.creado_en,
+    }
+
+
+def visible_para(evento, usuario_id, rol):
+    """Las notificaciones son personales; las alertas no se muestran a proveedores."""
+    if evento["tipo"] == "notificacion":
+        return evento["usuario_id"] == usuario_id
+    return rol != "PROVEEDOR"
@@ -0,0 +1,267 @@
+"""
+KPIs del tablero por bodega, precalculados en ``IndicadorBodega``.
+
+* ``consolidar_hora``: una sentencia (CTEs + ``INSERT ... ON CONFLICT``) que,
+  para cada bodega, toma la fotografía actual (valor de stock desde
+  ``ValorizacionInventario``, alertas abiertas por severidad, recepciones
+  abiertas, transferencias en tránsito, exactitud de recuentos) y cuenta los
+  movimientos de la hora (índice BRIN ``brin_mov_stock_fecha``). Al recalcular
+  una hora ya cerrada sólo se actualizan los contadores de movimientos.
+* ``consolidar_dia``: agrega las filas horarias del día; no vuelve a leer
+  ``movimientos_stock``.
+* ``tablero``: lo que muestra ``core.views.dashboard``: la fotografía de la
+  última hora y los movimientos del día desde la fila DIA de hoy. Cada bodega
+  se cachea ``INDICADORES_CACHE_SEGUNDOS``; un fallo de caché cuesta dos
+  lecturas indexadas sobre ``indicadores_bodega``, sin importar el volumen de
+  datos.
+
+``manage.py consolidar_indicadores`` se agenda cada pocos minutos.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Bodega, IndicadorBodega
+from core.routers import en_replica
+
+HORA = IndicadorBodega.Granularidad.HORA
+DIA = IndicadorBodega.Granularidad.DIA
+
+_FOTOGRAFIA = [
+    "valor_stock", "unidades_stock", "alertas_info", "alertas_warn", "alertas_critical",
+    "recepciones_pendientes", "transferencias_entrantes", "transferencias_salientes",
+    "lineas_contadas", "lineas_exactas",
+]
+_ACTIVIDAD = ["movimientos", "movimientos_entrada", "movimientos_salida"]
+
+_SQL_HORA = """
+WITH bodegas_sel AS (
+    SELECT id FROM bodegas {filtro}
+),
+valor AS (
+    SELECT v.bodega_id, SUM(v.valor_total) AS valor, SUM(v.cantidad) AS unidades
+    FROM valorizacion_inventario v
+    WHERE v.bodega_id IN (SELECT id FROM bodegas_sel)
+    GROUP BY v.bodega_id
+),
+alertas_abiertas AS (
+    SELECT u.bodega_id,
+           COUNT(*) FILTER (WHERE a.severidad = 'INFO') AS info,
+           COUNT(*) FILTER (WHERE a.severidad = 'WARN') AS warn,
+           COUNT(*) FILTER (WHERE a.severidad = 'CRITICAL') AS critical
+    FROM alertas a
+    JOIN ubicaciones u ON u.id = a.ubicacion_id
+    WHERE a.reconocida_en IS NULL
+    GROUP BY u.bodega_id
+),
+recepciones AS (
+    SELECT bodega_id, COUNT(*) AS pendientes
+    FROM recepciones_mercaderia
+    WHERE estado = 'OPEN'
+    GROUP BY bodega_id
+),
+entrantes AS (
+    SELECT bodega_destino_id AS bodega_id, COUNT(*) AS n
+    FROM transferencias WHERE estado = 'IN_TRANSIT' GROUP BY bodega_destino_id
+),
+salientes AS (
+    SELECT bodega_origen_id AS bodega_id, COUNT(*) AS n
+    FROM transferencias WHERE estado = 'IN_TRANSIT' GROUP BY bodega_origen_id
+),
+recuentos AS (
+    SELECT r.bodega_id,
+           COUNT(*) AS contadas,
+           COUNT(*) FILTER (WHERE l.cantidad_contada = l.cantidad_sistema) AS exactas
+    FROM recuentos_inventario r
+    JOIN lineas_recuento_inventario l ON l.recuento_id = r.id
+    WHERE r.creado_en >= %(desde_recuento)s AND r.creado_en < %(fin)s
+      AND l.cantidad_contada IS NOT NULL
+    GROUP BY r.bodega_id
+),
+movs AS (
+    SELECT u.bodega_id,
+           COUNT(DISTINCT m.id) AS total,
+           COUNT(DISTINCT m.id) FILTER (WHERE m.ubicacion_hasta_id = u.id) AS entradas,
+           COUNT(DISTINCT m.id) FILTER (WHERE m.ubicacion_desde_id = u.id) AS salidas
+    FROM movimientos_stock m
+    JOIN ubicaciones u ON u.id IN (m.ubicacion_desde_id, m.ubicacion_hasta_id)
+    WHERE m.ocurrido_en >= %(inicio)s AND m.ocurrido_en < %(fin)s
+    GROUP BY u.bodega_id
+)
+INSERT INTO indicadores_bodega AS d (
+    bodega_id, granularidad, periodo,
+    valor_stock, unidades_stock, alertas_info, alertas_warn, alertas_critical,
+    recepciones_pendientes, transferencias_entrantes, transferencias_salientes,
+    lineas_contadas, lineas_exactas,
+    movimientos, movimientos_entrada, movimientos_salida, calculado_en
+)
+SELECT b.id, 'HORA', %(inicio)s,
+       COALESCE(va.valor, 0), COALESCE(va.unidades, 0),
+       COALESCE(al.info, 0), COALESCE(al.warn, 0), COALESCE(al.critical, 0),
+       COALESCE(re.pendientes, 0), COALESCE(en.n, 0), COALESCE(sa.n, 0),
+       COALESCE(rc.contadas, 0), COALESCE(rc.exactas, 0),
+       COALESCE(mv.total, 0), COALESCE(mv.entradas, 0), COALESCE(mv.salidas, 0), NOW()
+FROM bodegas_sel b
+LEFT JOIN valor va ON va.bodega_id = b.id
+LEFT JOIN alertas_abiertas al ON al.bodega_id = b.id
+LEFT JOIN recepciones re ON re.bodega_id = b.id
+LEFT JOIN entrantes en ON en.bodega_id = b.id
+LEFT JOIN salientes sa ON sa.bodega_id = b.id
+LEFT JOIN recuentos rc ON rc.bodega_id = b.id
+LEFT JOIN movs mv ON mv.bodega_id = b.id
+ON CONFLICT (bodega_id, granularidad, periodo) DO UPDATE SET
+    {actualizar},
+    calculado_en = EXCLUDED.calculado_en
+"""
+
+_SQL_DIA = """
+INSERT INTO indicadores_bodega AS d (
+    bodega_id, granularidad, periodo,
+    {fotografia},
+    movimientos, movimientos_entrada, movimientos_salida, calculado_en
+)
+SELECT h.bodega_id, 'DIA', %(inicio)s,
+       {ultima_hora},
+       SUM(h.movimientos), SUM(h.movimientos_entrada), SUM(h.movimientos_salida), NOW()
+FROM indicadores_bodega h
+WHERE h.granularidad = 'HORA' AND h.periodo >= %(inicio)s AND h.periodo < %(fin)s {filtro}
+GROUP BY h.bodega_id
+ON CONFLICT (bodega_id, granularidad, periodo) DO UPDATE SET
+    {actualizar},
+    calculado_en = EXCLUDED.calculado_en
+"""
+
+
+def segundos_cache():
+    return getattr(settings, "INDICADORES_CACHE_SEGUNDOS", 60)
+
+
+def inicio_hora(momento=None):
+    momento = timezone.localtime(momento or timezone.now())
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+
+def inicio_dia(fecha=None):
+    fecha = fecha or timezone.localdate()
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _asignaciones(columnas):
+    return ",\n    ".join(f"{c} = EXCLUDED.{c}" for c in columnas)
+
+
+# -------------------- Consolidación --------------------
+def consolidar_hora(momento=None, bodega_ids=None):
+    """Consolida la hora que contiene ``momento`` (por defecto, la actual)."""
+    inicio = inicio_hora(momento)
+    fin = inicio + timedelta(hours=1)
+    vigente = timezone.now() < fin
+    dias_recuento = getattr(settings, "INDICADORES_VENTANA_RECUENTO_DIAS", 30)
+    params = {"inicio": inicio, "fin": fin, "desde_recuento": fin - timedelta(days=dias_recuento)}
+    filtro = ""
+    if bodega_ids:
+        filtro = "WHERE id = ANY(%(bodegas)s)"
+        params["bodegas"] = list(bodega_ids)
+    # una hora cerrada conserva la fotografía que se tomó mientras estaba vigente
+    actualizar = _asignaciones(_FOTOGRAFIA + _ACTIVIDAD if vigente else _ACTIVIDAD)
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_HORA.format(filtro=filtro, actualizar=actualizar), params)
+        filas = cursor.rowcount
+    invalidar(bodega_ids)
+    return filas
+
+
+def consolidar_dia(fecha=None, bodega_ids=None):
+    """Agrega las horas de ``fecha``; la fotografía es la de la última hora consolidada."""
+    inicio = inicio_dia(fecha)
+    params = {"inicio": inicio, "fin": inicio_dia(inicio.date() + timedelta(days=1))}
+    filtro = ""
+    if bodega_ids:
+        filtro = "AND h.bodega_id = ANY(%(bodegas)s)"
+        params["bodegas"] = list(bodega_ids)
+    sql = _SQL_DIA.format(
+        fotografia=", ".join(_FOTOGRAFIA),
+        ultima_hora=",\n       ".join(f"(ARRAY_AGG(h.{c} ORDER BY h.periodo DESC))[1]" for c in _FOTOGRAFIA),
+        filtro=filtro,
+        actualizar=_asignaciones(_FOTOGRAFIA + _ACTIVIDAD),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        filas = cursor.rowcount
+    invalidar(bodega_ids)
+    return filas
+
+
+# -------------------- Lectura (tablero) --------------------
+def _clave(bodega_id):
+    return f"indicadores:bodega:{bodega_id}"
+
+
+def _calcular(bodega_ids):
+    """
+    Última hora consolidada y fila diaria de hoy (movimientos acumulados) para
+    ``bodega_ids``: dos consultas.
+    """
+    ultimas = (
+        IndicadorBodega.objects.filter(bodega_id__in=bodega_ids, granularidad=HORA)
+        .order_by("bodega_id", "-periodo")
+        .distinct("bodega_id")
+        .values("bodega_id", "periodo", "calculado_en", *_FOTOGRAFIA)
+    )
+    hoy = (
+        IndicadorBodega.objects.filter(bodega_id__in=bodega_ids, granularidad=DIA, periodo=inicio_dia())
+        .values("bodega_id", **{f"{c}_hoy": F(c) for c in _ACTIVIDAD})
+    )
+    resultado = {b: {"bodega_id": b} for b in bodega_ids}
+    for fila in ultimas:
+        resultado[fila["bodega_id"]].update(fila)
+    for fila in hoy:
+        resultado[fila["bodega_id"]].update(fila)
+    for datos in resultado.values():
+        contadas = datos.get("lineas_contadas")
+        datos["exactitud_recuento"] = datos.get("lineas_exactas", 0) / contadas if contadas else None
+    return resultado
+
+
+def indicadores(bodega_ids):
+    """``{bodega_id: dict}`` con caché por bodega de TTL corto."""
+    claves = {b: _clave(b) for b in bodega_ids}
+    en_cache = cache.get_many(list(claves.values()))
+    resultado = {b: en_cache[k] for b, k in claves.items() if k in en_cache}
+    faltantes = [b for b in bodega_ids if b not in resultado]
+    if faltantes:
+        calculados = _calcular(faltantes)
+        cache.set_many({claves[b]: d for b, d in calculados.items()}, segundos_cache())
+        resultado.update(calculados)
+    return resultado
+
+
+def tablero():
+    """
+    Filas por bodega (con nombre) y totales para ``core/dashboard.html``; lee de
+    réplica si la hay.
+    """
+    with en_replica():
+        bodegas = list(
+            Bodega.objects.order_by("sucursal__nombre", "nombre").values("id", "codigo", "nombre", "sucursal__nombre")
+        )
+        datos = indicadores([b["id"] for b in bodegas])
+    filas = [{**b, **datos[b["id"]]} for b in bodegas]
+    totales = {
+        c: sum(f.get(c) or 0 for f in filas)
+        for c in _FOTOGRAFIA + [f"{a}_hoy" for a in _ACTIVIDAD]
+    }
+    totales["exactitud_recuento"] = (
+        totales["lineas_exactas"] / totales["lineas_contadas"] if totales["lineas_contadas"] else None
+    )
+    return {"bodegas": filas, "totales": totales}
+
+
+def invalidar(bodega_ids=None):
+    if bodega_ids is None:
+        bodega_ids = Bodega.objects.values_list("id", flat=True)
+    cache.delete_many([_clave(b) for b in bodega_ids])
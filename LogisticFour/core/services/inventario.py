@@ -0,0 +1,367 @@
+"""
+Posteo de movimientos de stock.
+
+``postear`` es el único camino que modifica ``Stock``: bloquea las filas
+afectadas en orden de id, aplica los deltas, inserta los ``MovimientoStock`` en
+bloque y actualiza el costeo (core.services.costeo) dentro de la misma
+transacción; cada fase es una etapa de ``core.perfilado``. ``reservar`` /
+``liberar_reserva`` mueven ``cantidad_reservada`` con el mismo bloqueo;
+``kardex`` lee el historial de un producto con saldo acumulado (en réplica
+si la hay, ``core.routers``).
+``postear_recepcion`` y ``postear_ajuste`` postean documentos completos (el
+ajuste corre como trabajo en segundo plano, ``core.tareas``).
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When, Window
+from django.utils import timezone
+
+from core import perfilado
+from core.models import (
+    LineaOrdenCompra,
+    MovimientoStock,
+    Reserva,
+    Stock,
+    TipoMovimiento,
+    Ubicacion,
+)
+from core.routers import alias_replica
+from core.services import auditoria, costeo, trabajos
+
+
+@dataclass
+class LineaMovimiento:
+    producto_id: int
+    cantidad: Decimal
+    ubicacion_desde_id: int = None
+    ubicacion_hasta_id: int = None
+    lote_id: int = None
+    serie_id: int = None
+    unidad_id: int = None
+    costo_unitario: Decimal = None
+    notas: str = ""
+
+
+def _validar_linea(tipo, linea):
+    if linea.cantidad is None or Decimal(linea.cantidad) <= 0:
+        raise ValidationError("La cantidad del movimiento debe ser positiva.")
+    if tipo.direccion >= 0 and not linea.ubicacion_hasta_id:
+        raise ValidationError(f"El movimiento {tipo.codigo} requiere ubicación destino.")
+    if tipo.direccion <= 0 and not linea.ubicacion_desde_id:
+        raise ValidationError(f"El movimiento {tipo.codigo} requiere ubicación origen.")
+
+
+_SQL_BLOQUEAR_STOCK = """
+SELECT s.* FROM stock s
+JOIN unnest(%s::bigint[], %s::bigint[], %s::bigint[], %s::bigint[]) AS k(producto_id, ubicacion_id, lote_id, serie_id)
+  ON s.producto_id = k.producto_id AND s.ubicacion_id = k.ubicacion_id
+ AND s.lote_id IS NOT DISTINCT FROM k.lote_id AND s.serie_id IS NOT DISTINCT FROM k.serie_id
+ORDER BY s.id
+FOR UPDATE OF s
+"""
+
+
+def _bloquear_stock(claves):
+    """
+    Devuelve ``{clave: Stock}`` con las filas bloqueadas (FOR UPDATE), creando
+    las que faltan. Sólo se bloquean las claves exactas del posteo (no el
+    producto cartesiano productos × ubicaciones), así que dos posteos que no
+    comparten filas no se esperan. La creación se serializa con un advisory
+    lock por clave porque la unicidad no cubre lote/serie NULL.
+    """
+    columnas = [list(columna) for columna in zip(*claves)]
+
+    def leer():
+        filas = Stock.objects.raw(_SQL_BLOQUEAR_STOCK, columnas)
+        return {(s.producto_id, s.ubicacion_id, s.lote_id, s.serie_id): s for s in filas}
+
+    existentes = leer()
+    faltantes = sorted((c for c in claves if c not in existentes), key=str)
+    if faltantes:
+        with connection.cursor() as cursor:
+            for clave in faltantes:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ["stock:%s:%s:%s:%s" % clave])
+        existentes = leer()
+        nuevos = [
+            Stock(producto_id=p, ubicacion_id=u, lote_id=l, serie_id=s)
+            for (p, u, l, s) in faltantes
+            if (p, u, l, s) not in existentes
+        ]
+        Stock.objects.bulk_create(nuevos)
+        existentes = leer()
+    return existentes
+
+
+@perfilado.etapa("postear")
+@transaction.atomic
+def postear(tipo_codigo, lineas, *, usuario=None, tabla_referencia="", referencia_id=None):
+    """
+    Postea ``lineas`` (``LineaMovimiento``) como movimientos del tipo indicado.
+
+    Dirección +1 suma en destino, -1 resta en origen y 0 (transferencia) hace
+    ambas cosas. Lanza ``ValidationError`` si alguna ubicación queda con
+    disponible negativo; en ese caso no se aplica nada.
+    """
+    tipo = TipoMovimiento.objects.get(codigo=tipo_codigo)
+    if not lineas:
+        return []
+    perfilado.filas(len(lineas))
+    with perfilado.etapa("validar"):
+        for linea in lineas:
+            _validar_linea(tipo, linea)
+
+        deltas = defaultdict(Decimal)
+        for linea in lineas:
+            cantidad = Decimal(linea.cantidad)
+            if tipo.direccion <= 0:
+                deltas[(linea.producto_id, linea.ubicacion_desde_id, linea.lote_id, linea.serie_id)] -= cantidad
+            if tipo.direccion >= 0:
+                deltas[(linea.producto_id, linea.ubicacion_hasta_id, linea.lote_id, linea.serie_id)] += cantidad
+
+    with perfilado.etapa("bloquear_stock"):
+        stocks = _bloquear_stock(set(deltas))
+    with perfilado.etapa("aplicar_deltas"):
+        ahora = timezone.now()
+        for clave, delta in deltas.items():
+            stock = stocks[clave]
+            stock.cantidad_disponible += delta
+            # una salida sólo puede tomar stock libre: lo reservado ya tiene dueño (``reservar``)
+            libre = stock.cantidad_disponible - stock.cantidad_reservada
+            if delta < 0 and libre < 0:
+                raise ValidationError(
+                    f"Stock insuficiente para producto {clave[0]} en ubicación {clave[1]} "
+                    f"(faltan {-libre})."
+                )
+            stock.actualizado_en = ahora
+        Stock.objects.bulk_update(
+            [stocks[c] for c in deltas], ["cantidad_disponible", "actualizado_en"], batch_size=1000
+        )
+
+    with perfilado.etapa("insertar_movimientos"):
+        movimientos = MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                tipo_movimiento=tipo,
+                producto_id=linea.producto_id,
+                ubicacion_desde_id=linea.ubicacion_desde_id,
+                ubicacion_hasta_id=linea.ubicacion_hasta_id,
+                lote_id=linea.lote_id,
+                serie_id=linea.serie_id,
+                cantidad=linea.cantidad,
+                unidad_id=linea.unidad_id,
+                costo_unitario=linea.costo_unitario,
+                tabla_referencia=tabla_referencia,
+                referencia_id=referencia_id,
+                creado_por=usuario if usuario is not None and usuario.is_authenticated else None,
+                notas=linea.notas,
+            )
+            for linea in lineas
+        ], batch_size=1000)
+
+    if tipo.afecta_costo:
+        with perfilado.etapa("costeo"):
+            ubicaciones = {u for l in lineas for u in (l.ubicacion_desde_id, l.ubicacion_hasta_id) if u}
+            bodega_de = dict(Ubicacion.objects.filter(pk__in=ubicaciones).values_list("id", "bodega_id"))
+            costeados = costeo.aplicar(tipo, movimientos, bodega_de)
+            if costeados:
+                MovimientoStock.objects.bulk_update(costeados, ["costo_unitario"], batch_size=1000)
+
+    with perfilado.etapa("auditoria"):
+        auditoria.registrar(
+            "MOVIMIENTOS_POSTEADOS",
+            tabla=tabla_referencia or MovimientoStock._meta.db_table,
+            entidad_id=referencia_id,
+            detalle={"tipo": tipo.codigo, "lineas": len(movimientos)},
+            usuario=usuario,
+        )
+    return movimientos
+
+
+def _costo_linea_oc(linea_oc):
+    return linea_oc.precio * (1 - linea_oc.descuento_pct / Decimal(100))
+
+
+@transaction.atomic
+def postear_recepcion(recepcion, ubicacion, *, usuario=None):
+    """
+    Postea una ``RecepcionMercaderia`` abierta como entradas (IN) en
+    ``ubicacion``, valorizadas al precio neto de la línea de OC del producto.
+    """
+    recepcion = type(recepcion).objects.select_for_update().get(pk=recepcion.pk)
+    if recepcion.estado != "OPEN":
+        raise ValidationError(f"La recepción {recepcion.numero_recepcion} no está abierta.")
+    if ubicacion.bodega_id != recepcion.bodega_id:
+        raise ValidationError("La ubicación de recepción debe pertenecer a la bodega de la recepción.")
+
+    costos = {}
+    if recepcion.orden_compra_id:
+        for linea_oc in LineaOrdenCompra.objects.filter(orden_compra_id=recepcion.orden_compra_id):
+            costos.setdefault(linea_oc.producto_id, _costo_linea_oc(linea_oc))
+
+    lineas = [
+        LineaMovimiento(
+            producto_id=linea.producto_id,
+            cantidad=linea.cantidad_recibida,
+            ubicacion_hasta_id=ubicacion.pk,
+            lote_id=linea.lote_id,
+            serie_id=linea.serie_id,
+            unidad_id=linea.unidad_id,
+            costo_unitario=costos.get(linea.producto_id),
+        )
+        for linea in recepcion.lineas.all()
+    ]
+    movimientos = postear(
+        "IN", lineas, usuario=usuario,
+        tabla_referencia=recepcion._meta.db_table, referencia_id=recepcion.pk,
+    )
+    recepcion.estado = "POSTED"
+    recepcion.save(update_fields=["estado"])
+    return movimientos
+
+
+@transaction.atomic
+def postear_ajuste(ajuste, *, usuario=None, bloque=2000):
+    """
+    Postea un ``AjusteInventario`` abierto o aprobado: las líneas con delta
+    positivo como ADJUST_POS en su ubicación y las negativas como ADJUST_NEG.
+    Se postea en bloques de ``bloque`` líneas informando el avance
+    (``trabajos.progreso``), todo en una transacción. Un ajuste ya posteado no
+    se vuelve a aplicar. Devuelve ``{"ajuste_id", "movimientos"}``.
+    """
+    ajuste = type(ajuste).objects.select_for_update().get(pk=ajuste.pk)
+    if ajuste.estado == "POSTED":
+        movimientos = MovimientoStock.objects.filter(
+            tabla_referencia=ajuste._meta.db_table, referencia_id=ajuste.pk,
+        ).count()
+        return {"ajuste_id": ajuste.pk, "movimientos": movimientos}
+    if ajuste.estado not in ("OPEN", "APPROVED"):
+        raise ValidationError(f"El ajuste {ajuste.pk} está en estado {ajuste.estado} y no se puede postear.")
+
+    por_tipo = {"ADJUST_POS": [], "ADJUST_NEG": []}
+    for linea in ajuste.lineas.order_by("id"):
+        if not linea.cantidad_delta:
+            continue
+        positiva = linea.cantidad_delta > 0
+        por_tipo["ADJUST_POS" if positiva else "ADJUST_NEG"].append(LineaMovimiento(
+            producto_id=linea.producto_id,
+            cantidad=abs(linea.cantidad_delta),
+            ubicacion_hasta_id=linea.ubicacion_id if positiva else None,
+            ubicacion_desde_id=None if positiva else linea.ubicacion_id,
+            lote_id=linea.lote_id,
+            serie_id=linea.serie_id,
+        ))
+
+    total = sum(len(lineas) for lineas in por_tipo.values())
+    hechas = movimientos = 0
+    trabajos.progreso(0, total, f"Ajuste {ajuste.pk}: {total} líneas")
+    for tipo_codigo, lineas in por_tipo.items():
+        for desde in range(0, len(lineas), bloque):
+            parte = lineas[desde:desde + bloque]
+            movimientos += len(postear(
+                tipo_codigo, parte, usuario=usuario,
+                tabla_referencia=ajuste._meta.db_table, referencia_id=ajuste.pk,
+            ))
+            hechas += len(parte)
+            trabajos.progreso(hechas, total)
+    ajuste.estado = "POSTED"
+    ajuste.save(update_fields=["estado"])
+    return {"ajuste_id": ajuste.pk, "movimientos": movimientos}
+
+
+# -------------------- Reservas --------------------
+@perfilado.etapa("reservar")
+@transaction.atomic
+def reservar(producto_id, ubicacion_id, cantidad, *, lote_id=None, serie_id=None,
+             tabla_referencia="", referencia_id=None):
+    """
+    Reserva ``cantidad`` del stock libre (disponible - reservado) de la fila
+    indicada. Lanza ``ValidationError`` si no alcanza.
+    """
+    cantidad = Decimal(cantidad)
+    if cantidad <= 0:
+        raise ValidationError("La cantidad a reservar debe ser positiva.")
+    stock = (
+        Stock.objects.select_for_update()
+        .filter(producto_id=producto_id, ubicacion_id=ubicacion_id, lote_id=lote_id, serie_id=serie_id)
+        .first()
+    )
+    libre = stock.cantidad_disponible - stock.cantidad_reservada if stock else Decimal(0)
+    if libre < cantidad:
+        raise ValidationError(
+            f"Stock libre insuficiente para producto {producto_id} en ubicación {ubicacion_id} (libre {libre})."
+        )
+    Stock.objects.filter(pk=stock.pk).update(
+        cantidad_reservada=F("cantidad_reservada") + cantidad, actualizado_en=timezone.now()
+    )
+    return Reserva.objects.create(
+        producto_id=producto_id, ubicacion_id=ubicacion_id, lote_id=lote_id, serie_id=serie_id,
+        cantidad_reservada=cantidad, tabla_referencia=tabla_referencia, referencia_id=referencia_id,
+    )
+
+
+@transaction.atomic
+def liberar_reserva(reserva):
+    """Devuelve al stock libre lo reservado y elimina la reserva."""
+    stock = (
+        Stock.objects.select_for_update()
+        .filter(producto_id=reserva.producto_id, ubicacion_id=reserva.ubicacion_id,
+                lote_id=reserva.lote_id, serie_id=reserva.serie_id)
+        .first()
+    )
+    if stock is not None:
+        Stock.objects.filter(pk=stock.pk).update(
+            cantidad_reservada=F("cantidad_reservada") - reserva.cantidad_reservada, actualizado_en=timezone.now()
+        )
+    reserva.delete()
+
+
+# -------------------- Kardex --------------------
+def kardex(producto_id, *, bodega_id=None, desde=None, hasta=None, limite=500):
+    """
+    Movimientos del producto en orden cronológico con ``signo`` (+1 entra, -1
+    sale, 0 sin efecto) y ``saldo`` acumulado. Con ``bodega_id`` el signo se
+    mide respecto de la bodega (las transferencias internas no la cambian); sin
+    ella, por la dirección del tipo de movimiento. El saldo parte del acumulado
+    anterior a ``desde``. Recorre ``idx_mov_stock_prod_fecha``.
+    """
+    qs = MovimientoStock.objects.using(alias_replica(MovimientoStock)).filter(producto_id=producto_id)
+    if bodega_id is not None:
+        entra = Q(ubicacion_hasta__bodega_id=bodega_id)
+        sale = Q(ubicacion_desde__bodega_id=bodega_id)
+        qs = qs.filter(entra | sale)
+        signo = Case(
+            When(entra & sale, then=Value(0)),
+            When(entra, then=Value(1)),
+            When(sale, then=Value(-1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    else:
+        signo = F("tipo_movimiento__direccion")
+    qs = qs.annotate(signo=signo)
+
+    saldo_inicial = Decimal(0)
+    if desde is not None:
+        saldo_inicial = qs.filter(ocurrido_en__lt=desde).aggregate(
+            saldo=Sum(F("cantidad") * F("signo"))
+        )["saldo"] or Decimal(0)
+        qs = qs.filter(ocurrido_en__gte=desde)
+    if hasta is not None:
+        qs = qs.filter(ocurrido_en__lt=hasta)
+
+    filas = (
+        qs.annotate(acumulado=Window(Sum(F("cantidad") * F("signo")), order_by=[F("ocurrido_en").asc(), F("id").asc()]))
+        .order_by("ocurrido_en", "id")
+        .values(
+            "id", "ocurrido_en", "tipo_movimiento__codigo", "cantidad", "signo", "acumulado",
+            "ubicacion_desde_id", "ubicacion_hasta_id", "lote_id", "serie_id", "tabla_referencia", "referencia_id",
+        )[:limite]
+    )
+    resultado = []
+    for fila in filas:
+        fila["saldo"] = saldo_inicial + fila.pop("acumulado")
+        resultado.append(fila)
+    return resultado
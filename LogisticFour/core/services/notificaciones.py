@@ -0,0 +1,120 @@
+"""
+Envío masivo de notificaciones y contador de no leídas por usuario.
+
+Las notificaciones se crean con un solo ``bulk_create`` por envío y el contador
+``ContadorNotificaciones.no_leidas`` se ajusta con expresiones F, de modo que
+el indicador de la barra superior es una lectura por clave primaria en lugar
+de un ``COUNT(*)``. Un contador que no existía se crea con el conteo real de
+no leídas. ``resincronizar`` corrige cualquier deriva (p.ej. filas
+borradas a mano) y está pensado para correr periódicamente.
+"""
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from core.models import ContadorNotificaciones, Notificacion, UsuarioPerfil
+from core.services import eventos
+
+
+# un contador nuevo parte del conteo real (que ya incluye el cambio en curso)
+_SQL_CREAR_CONTADORES = """
+INSERT INTO contadores_notificaciones (usuario_id, no_leidas, actualizado_en)
+SELECT u.id,
+       (SELECT COUNT(*) FROM notificaciones n WHERE n.usuario_id = u.id AND NOT n.leida),
+       NOW()
+FROM unnest(%s::bigint[]) AS u(id)
+ON CONFLICT (usuario_id) DO NOTHING
+RETURNING usuario_id
+"""
+
+
+def _ajustar_contadores(usuario_ids, delta):
+    if not usuario_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_CREAR_CONTADORES, [list(usuario_ids)])
+        creados = {fila[0] for fila in cursor.fetchall()}
+    ContadorNotificaciones.objects.filter(usuario_id__in=set(usuario_ids) - creados).update(
+        no_leidas=Greatest(F("no_leidas") + delta, Value(0)),
+        actualizado_en=Now(),
+    )
+
+
+@transaction.atomic
+def notificar(usuario_ids, titulo, cuerpo="", *, lote=1000):
+    """Crea una notificación por usuario (ids repetidos se ignoran)."""
+    usuario_ids = sorted(set(usuario_ids))
+    notificaciones = Notificacion.objects.bulk_create(
+        [Notificacion(usuario_id=uid, titulo=titulo, cuerpo=cuerpo) for uid in usuario_ids],
+        batch_size=lote,
+    )
+    _ajustar_contadores(usuario_ids, 1)
+    eventos.publicar_varios([eventos.evento_notificacion(n) for n in notificaciones])
+    return notificaciones
+
+
+def notificar_roles(roles, titulo, cuerpo=""):
+    """Notifica a todos los usuarios activos con alguno de los ``roles`` de UsuarioPerfil."""
+    ids = UsuarioPerfil.objects.filter(rol__in=roles, usuario__is_active=True).values_list("usuario_id", flat=True)
+    return notificar(list(ids), titulo, cuerpo)
+
+
+def notificar_grupo(nombre_grupo, titulo, cuerpo=""):
+    """Notifica a los usuarios activos de un ``Group`` de Django."""
+    ids = User.objects.filter(groups__name=nombre_grupo, is_active=True).values_list("id", flat=True)
+    return notificar(list(ids), titulo, cuerpo)
+
+
+@transaction.atomic
+def marcar_leidas(usuario, notificacion_ids):
+    marcadas = Notificacion.objects.filter(usuario=usuario, pk__in=notificacion_ids, leida=False).update(leida=True)
+    if marcadas:
+        _ajustar_contadores([usuario.pk], -marcadas)
+    return marcadas
+
+
+@transaction.atomic
+def marcar_todas_leidas(usuario):
+    """Marca todo como leído con un único UPDATE y deja el contador en cero."""
+    marcadas = Notificacion.objects.filter(usuario=usuario, leida=False).update(leida=True)
+    ContadorNotificaciones.objects.update_or_create(usuario=usuario, defaults={"no_leidas": 0})
+    return marcadas
+
+
+def no_leidas(usuario):
+    """Cantidad de no leídas según el contador; lo inicializa si aún no existe."""
+    valor = ContadorNotificaciones.objects.filter(usuario=usuario).values_list("no_leidas", flat=True).first()
+    if valor is None:
+        valor = Notificacion.objects.filter(usuario=usuario, leida=False).count()
+        ContadorNotificaciones.objects.get_or_create(usuario=usuario, defaults={"no_leidas": valor})
+    return valor
+
+
+@transaction.atomic
+def resincronizar(usuario_ids=None):
+    """
+    Recalcula los contadores desde ``notificaciones`` en una sola sentencia
+    (más la creación de contadores faltantes). Devuelve filas actualizadas.
+    """
+    pendientes = Notificacion.objects.filter(leida=False)
+    if usuario_ids is not None:
+        pendientes = pendientes.filter(usuario_id__in=usuario_ids)
+    faltantes = pendientes.values_list("usuario_id", flat=True).distinct()
+    ContadorNotificaciones.objects.bulk_create(
+        [ContadorNotificaciones(usuario_id=uid) for uid in faltantes],
+        ignore_conflicts=True,
+    )
+
+    conteo = (
+        Notificacion.objects
+        .filter(usuario=OuterRef("usuario"), leida=False)
+        .order_by()
+        .values("usuario")
+        .annotate(n=Count("*"))
+        .values("n")
+    )
+    contadores = ContadorNotificaciones.objects.all()
+    if usuario_ids is not None:
+        contadores = contadores.filter(usuario_id__in=usuario_ids)
+    return contadores.update(no_leidas=Coalesce(Subquery(conteo), 0), actualizado_en=Now())
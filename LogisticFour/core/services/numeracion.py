@@ -0,0 +1,71 @@
+"""
+Numeración de documentos (OC, recepciones) con secuencias PostgreSQL.
+
+Cada combinación (tipo, bodega, año) tiene su propia secuencia
+``numeracion_<tipo>_<bodega>_<año>`` (año 0 si la serie no se reinicia), creada
+al primer uso. ``nextval`` no bloquea ni participa de la transacción, así que
+los creadores concurrentes no se serializan; a cambio, una transacción
+revertida deja un hueco en la numeración.
+
+``reservar_bloque`` entrega ``n`` números con un solo viaje a la base para
+importaciones masivas. Formato: ``<prefijo><año>-<correlativo>`` (el año sólo
+con reinicio anual); sin ``SerieDocumento`` el prefijo es ``<tipo>-<bodega_id>-``.
+"""
+from django.db import connection, transaction
+from django.db.utils import ProgrammingError
+from django.utils import timezone
+
+from core.models import SerieDocumento
+
+RELLENO_POR_DEFECTO = 6
+
+
+def _serie(tipo, bodega_id):
+    if tipo not in SerieDocumento.Tipo.values:
+        raise ValueError(f"Tipo de documento desconocido: {tipo!r}")
+    serie = SerieDocumento.objects.filter(tipo=tipo, bodega_id=bodega_id).first()
+    if serie is None:
+        serie = SerieDocumento(tipo=tipo, bodega_id=bodega_id, prefijo=f"{tipo}-{bodega_id}-",
+                               relleno=RELLENO_POR_DEFECTO, reinicio_anual=True)
+    return serie
+
+
+def _nombre_secuencia(tipo, bodega_id, anio):
+    # tipo validado contra las choices y bodega/año enteros: seguro para interpolar
+    return f"numeracion_{tipo.lower()}_{int(bodega_id)}_{int(anio)}"
+
+
+def _valores(secuencia, n):
+    sql = f"SELECT nextval('{secuencia}') FROM generate_series(1, %s)"
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [n])
+            return [fila[0] for fila in cursor.fetchall()]
+    except ProgrammingError:
+        pass
+    # primer uso: crear la secuencia; el advisory lock evita la carrera de dos
+    # CREATE concurrentes (IF NOT EXISTS no es atómico frente al catálogo)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [secuencia])
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {secuencia}")
+        cursor.execute(sql, [n])
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def formatear(serie, anio, valor):
+    anio_txt = f"{anio}-" if serie.reinicio_anual else ""
+    return f"{serie.prefijo}{anio_txt}{str(valor).zfill(serie.relleno)}"
+
+
+def reservar_bloque(tipo, bodega_id, n, *, fecha=None):
+    """Devuelve ``n`` números de documento nuevos, en orden creciente."""
+    if n <= 0:
+        return []
+    serie = _serie(tipo, bodega_id)
+    anio = (fecha or timezone.localdate()).year
+    secuencia = _nombre_secuencia(tipo, bodega_id, anio if serie.reinicio_anual else 0)
+    return [formatear(serie, anio, v) for v in sorted(_valores(secuencia, n))]
+
+
+def siguiente_numero(tipo, bodega_id, *, fecha=None):
+    return reservar_bloque(tipo, bodega_id, 1, fecha=fecha)[0]
@@ -0,0 +1,145 @@
+"""
+Datos del portal de proveedores.
+
+Todas las consultas reciben el usuario proveedor y filtran por él; ninguna
+acepta ids de otro proveedor. Los listados traen sus relaciones con
+``select_related`` y los conteos/sumas por documento como anotaciones, así que
+una página cuesta una consulta sin importar cuántas filas muestre. Las páginas
+piden ``tamano + 1`` filas para saber si hay más, sin ``COUNT(*)``.
+
+Los listados leen de réplica si la hay (``core.routers.alias_replica``). El
+resumen de la portada (conteos y montos abiertos) se guarda en caché por
+proveedor y se invalida desde core.signals cuando cambia alguno de sus
+documentos; se calcula en la primaria, porque una réplica atrasada dejaría en
+caché los valores de antes de la invalidación.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.models import (
+    DevolucionProveedor,
+    FacturaProveedor,
+    OrdenCompra,
+    ProductoUsuarioProveedor,
+    RecepcionMercaderia,
+)
+from core.routers import alias_replica, en_primario
+
+ESTADOS_OC_ABIERTA = ["APPROVED", "PARTIAL"]
+TAMANO_PAGINA = 50
+CERO = Value(0, output_field=DecimalField(max_digits=20, decimal_places=6))
+
+
+def _clave_resumen(proveedor_id):
+    return f"portal_proveedor:resumen:{proveedor_id}"
+
+
+# -------------------- Listados --------------------
+def ordenes(proveedor, estados=None):
+    qs = (
+        OrdenCompra.objects.using(alias_replica(OrdenCompra))
+        .filter(proveedor=proveedor)
+        .select_related("bodega", "tasa_impuesto", "conciliacion")
+        .annotate(n_lineas=Count("lineas", distinct=True))
+        .order_by("-creado_en", "-id")
+    )
+    if estados:
+        qs = qs.filter(estado__in=estados)
+    return qs
+
+
+def ordenes_abiertas(proveedor):
+    return ordenes(proveedor, ESTADOS_OC_ABIERTA)
+
+
+def recepciones(proveedor):
+    return (
+        RecepcionMercaderia.objects.using(alias_replica(RecepcionMercaderia))
+        .filter(orden_compra__proveedor=proveedor)
+        .select_related("orden_compra", "bodega")
+        .annotate(
+            n_lineas=Count("lineas"),
+            cantidad_total=Coalesce(Sum("lineas__cantidad_recibida"), CERO),
+        )
+        .order_by("-recibido_en", "-id")
+    )
+
+
+def facturas(proveedor):
+    return (
+        FacturaProveedor.objects.using(alias_replica(FacturaProveedor))
+        .filter(proveedor=proveedor)
+        .select_related("orden_compra", "tasa_impuesto")
+        .order_by("-fecha_factura", "-id")
+    )
+
+
+def devoluciones(proveedor):
+    return (
+        DevolucionProveedor.objects.using(alias_replica(DevolucionProveedor))
+        .filter(proveedor=proveedor)
+        .select_related("bodega")
+        .annotate(
+            n_lineas=Count("lineas"),
+            cantidad_total=Coalesce(Sum("lineas__cantidad"), CERO),
+        )
+        .order_by("-creado_en", "-id")
+    )
+
+
+def productos(proveedor):
+    return (
+        ProductoUsuarioProveedor.objects.using(alias_replica(ProductoUsuarioProveedor))
+        .filter(proveedor=proveedor)
+        .select_related("producto", "producto__unidad_base", "producto__marca")
+        .order_by("producto__sku")
+    )
+
+
+def pagina(qs, numero=1, tamano=TAMANO_PAGINA):
+    """Devuelve ``(filas, hay_mas)`` de la página ``numero`` (desde 1)."""
+    numero = max(int(numero or 1), 1)
+    inicio = (numero - 1) * tamano
+    filas = list(qs[inicio:inicio + tamano + 1])
+    return filas[:tamano], len(filas) > tamano
+
+
+# -------------------- Resumen (caché) --------------------
+def _calcular_resumen(proveedor):
+    oc = OrdenCompra.objects.filter(proveedor=proveedor).aggregate(
+        ordenes_abiertas=Count("id", filter=Q(estado__in=ESTADOS_OC_ABIERTA)),
+        monto_abierto=Coalesce(Sum("total", filter=Q(estado__in=ESTADOS_OC_ABIERTA)), CERO),
+        ordenes_total=Count("id"),
+    )
+    fa = FacturaProveedor.objects.filter(proveedor=proveedor).aggregate(
+        facturas_abiertas=Count("id", filter=Q(estado="OPEN")),
+        monto_por_cobrar=Coalesce(Sum("monto_total", filter=Q(estado="OPEN")), CERO),
+    )
+    dev = DevolucionProveedor.objects.filter(proveedor=proveedor).aggregate(
+        devoluciones_pendientes=Count("id", filter=Q(estado__in=["DRAFT", "SENT"])),
+    )
+    return {
+        **oc,
+        **fa,
+        **dev,
+        "recepciones_abiertas": RecepcionMercaderia.objects.filter(
+            orden_compra__proveedor=proveedor, estado="OPEN"
+        ).count(),
+        "productos": ProductoUsuarioProveedor.objects.filter(proveedor=proveedor).count(),
+    }
+
+
+def resumen(proveedor):
+    segundos = getattr(settings, "PORTAL_PROVEEDOR_CACHE_SEGUNDOS", 300)
+    def calcular():
+        with en_primario():
+            return _calcular_resumen(proveedor)
+
+    return cache.get_or_set(_clave_resumen(proveedor.pk), calcular, segundos)
+
+
+def invalidar(proveedor_id):
+    if proveedor_id is not None:
+        cache.delete(_clave_resumen(proveedor_id))
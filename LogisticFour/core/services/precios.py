@@ -0,0 +1,77 @@
+"""
+Resolución de precios vigentes.
+
+``precios_en_fecha`` resuelve el precio de miles de productos en una sola
+consulta ``DISTINCT ON (producto_id)`` apoyada en el índice
+(producto, vigente_desde DESC). Para "hoy" se usa la tabla caché
+``PrecioVigente``, que se refresca por producto al cambiar sus precios y
+completa una vez al día (los precios también entran y salen de vigencia solos).
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.models import PrecioProducto, PrecioVigente
+
+
+def _en_vigor(fecha):
+    return PrecioProducto.objects.filter(activo=True, vigente_desde__lte=fecha).filter(
+        Q(vigente_hasta__isnull=True) | Q(vigente_hasta__gte=fecha)
+    )
+
+
+def _vigentes(fecha, producto_ids=None, skus=None):
+    qs = _en_vigor(fecha)
+    if producto_ids is not None:
+        qs = qs.filter(producto_id__in=producto_ids)
+    if skus is not None:
+        qs = qs.filter(producto__sku__in=skus)
+    return qs.order_by("producto_id", "-vigente_desde").distinct("producto_id")
+
+
+def precios_en_fecha(producto_ids=None, fecha=None, *, skus=None):
+    """``{producto_id: PrecioProducto}`` con el precio en vigor en ``fecha`` (hoy por defecto)."""
+    fecha = fecha or timezone.localdate()
+    return {p.producto_id: p for p in _vigentes(fecha, producto_ids, skus)}
+
+
+def precios_actuales(producto_ids):
+    """``{producto_id: precio}`` leído de la caché ``PrecioVigente``."""
+    return dict(
+        PrecioVigente.objects.filter(producto_id__in=producto_ids).values_list("producto_id", "precio")
+    )
+
+
+@transaction.atomic
+def refrescar_vigentes(producto_ids=None):
+    """
+    Recalcula ``PrecioVigente`` para ``producto_ids`` (o todo el catálogo) con
+    un upsert en bloque y borra las filas de productos sin precio vigente.
+    """
+    hoy = timezone.localdate()
+    filas = [
+        PrecioVigente(
+            producto_id=p.producto_id,
+            precio_producto_id=p.pk,
+            precio=p.precio,
+            vigente_desde=p.vigente_desde,
+            vigente_hasta=p.vigente_hasta,
+            actualizado_en=timezone.now(),
+        )
+        for p in _vigentes(hoy, producto_ids).iterator(chunk_size=5000)
+    ]
+    # NOT EXISTS en la base: sin una lista NOT IN con todo el catálogo
+    sin_precio = PrecioVigente.objects.filter(
+        ~Exists(_en_vigor(hoy).filter(producto_id=OuterRef("producto_id")))
+    )
+    if producto_ids is not None:
+        sin_precio = sin_precio.filter(producto_id__in=producto_ids)
+    sin_precio.delete()
+    PrecioVigente.objects.bulk_create(
+        filas,
+        batch_size=5000,
+        update_conflicts=True,
+        unique_fields=["producto"],
+        update_fields=["precio_producto", "precio", "vigente_desde", "vigente_hasta", "actualizado_en"],
+    )
+    return len(filas)
@@ -0,0 +1,392 @@
+"""
+Generador de datos sintéticos para pruebas de carga y benchmarks.
+
+Arma un conjunto realista a la escala pedida: sucursales y bodegas, ubicaciones
+por rack/nivel/posición, productos con marca, categoría, precio, atributos,
+lotes (con vencimientos pasados y próximos) y series, y un historial de
+``MovimientoStock`` ordenado en el tiempo con popularidad sesgada (pocos
+productos concentran la mayoría de los movimientos). ``Stock`` y
+``ValorizacionInventario`` se derivan del historial con ``INSERT ... SELECT``.
+
+Las tablas grandes se cargan con ``COPY ... FROM STDIN`` en bloques (memoria
+constante); las chicas con ``bulk_create``. ``COPY`` no dispara señales: los
+documentos de búsqueda y los precios vigentes se regeneran al final en bloque.
+Cada ejecución usa un prefijo propio en SKU y códigos, y los ids nuevos se
+leen por rango (``id > último previo``), así que no debe correr en paralelo con
+otra carga sobre las mismas tablas.
+"""
+import csv
+import io
+import random
+from dataclasses import asdict, dataclass, replace
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.utils import timezone
+
+from core import perfilado
+from core.models import (
+    Bodega,
+    CategoriaProducto,
+    DefinicionAtributo,
+    Marca,
+    Producto,
+    Sucursal,
+    TasaImpuesto,
+    TipoMovimiento,
+    UnidadMedida,
+)
+from core.services import busqueda, precios
+
+BLOQUE_COPY = 50000
+
+
+@dataclass(frozen=True)
+class Escala:
+    sucursales: int
+    bodegas_por_sucursal: int
+    ubicaciones: int              # total, repartidas entre bodegas
+    productos: int
+    movimientos: int
+    marcas: int = 200
+    categorias: int = 60
+    pct_con_lote: float = 0.3     # productos con vencimiento: LOTES_POR_PRODUCTO lotes cada uno
+    pct_serializados: float = 0.05
+    series_por_producto: int = 10
+    dias_historial: int = 365
+
+
+ESCALAS = {
+    "mini": Escala(sucursales=2, bodegas_por_sucursal=2, ubicaciones=200, productos=2_000, movimientos=20_000),
+    "pequena": Escala(sucursales=3, bodegas_por_sucursal=3, ubicaciones=5_000, productos=50_000, movimientos=1_000_000),
+    "mediana": Escala(sucursales=5, bodegas_por_sucursal=4, ubicaciones=20_000, productos=200_000, movimientos=5_000_000),
+    "grande": Escala(sucursales=10, bodegas_por_sucursal=5, ubicaciones=50_000, productos=500_000, movimientos=20_000_000),
+}
+
+LOTES_POR_PRODUCTO = 3
+UBICACIONES_POR_PRODUCTO = 3
+
+_TIPOS = ["Tornillo", "Perno", "Tuerca", "Arandela", "Cable", "Tubo", "Codo", "Válvula", "Cinta", "Guante",
+          "Casco", "Taladro", "Broca", "Disco", "Pintura", "Adhesivo", "Sellador", "Filtro", "Rodamiento", "Correa"]
+_MATERIALES = ["acero", "acero inoxidable", "galvanizado", "bronce", "PVC", "cobre", "aluminio", "nylon",
+               "látex", "poliuretano", "carbono", "HDPE"]
+_MEDIDAS = ["1/4", "3/8", "1/2", "3/4", "1\"", "M6", "M8", "M10", "M12", "10 mm", "20 mm", "2.5 mm²", "4 mm²",
+            "1 L", "4 L", "talla M", "talla L"]
+_COLORES = ["Negro", "Blanco", "Gris", "Rojo", "Azul", "Amarillo", "Verde"]
+
+
+# -------------------- COPY --------------------
+def _ultimo_id(tabla):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}")
+        return cursor.fetchone()[0]
+
+
+def _ids_nuevos(tabla, desde_id, columnas="id"):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {columnas} FROM {tabla} WHERE id > %s ORDER BY id", [desde_id])
+        filas = cursor.fetchall()
+    return [f[0] for f in filas] if columnas == "id" else filas
+
+
+def copiar(tabla, columnas, filas, *, bloque=BLOQUE_COPY):
+    """``COPY tabla (columnas) FROM STDIN`` desde un iterable de tuplas, por bloques."""
+    sql = f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    total = 0
+
+    def vaciar(cursor):
+        buffer.seek(0)
+        if is_psycopg3:
+            with cursor.copy(sql) as copia:
+                copia.write(buffer.getvalue())
+        else:
+            cursor.copy_expert(sql, buffer)
+        buffer.seek(0)
+        buffer.truncate()
+
+    with connection.cursor() as cursor:
+        for fila in filas:
+            escritor.writerow(["\\N" if v is None else v for v in fila])
+            total += 1
+            if total % bloque == 0:
+                vaciar(cursor)
+        if buffer.tell():
+            vaciar(cursor)
+    return total
+
+
+# -------------------- Generación --------------------
+class Generador:
+    def __init__(self, escala, *, prefijo="SYN", semilla=1, informar=None):
+        self.escala = escala
+        self.prefijo = prefijo
+        self.rnd = random.Random(semilla)
+        self.informar = informar or (lambda mensaje: None)
+        self.ahora = timezone.now()
+        self.conteos = {}
+
+    def generar(self, *, indexar_busqueda=True):
+        if Producto.objects.filter(sku__startswith=f"{self.prefijo}-").exists():
+            raise ValueError(f"Ya existen productos con el prefijo {self.prefijo!r}; use otro prefijo.")
+        self.tipos = TipoMovimiento.objects.in_bulk(["IN", "OUT", "TRANSFER"], field_name="codigo")
+        if len(self.tipos) != 3:
+            raise ValueError("Faltan los tipos de movimiento IN / OUT / TRANSFER.")
+        self._catalogos()
+        self._organizacion()
+        self._ubicaciones()
+        self._productos()
+        self._precios_y_atributos()
+        self._lotes_y_series()
+        self._movimientos()
+        self._saldos()
+        if indexar_busqueda:
+            self._paso("documentos de búsqueda", lambda: sum(
+                busqueda.refrescar(self.productos[i:i + BLOQUE_COPY]) for i in range(0, len(self.productos), BLOQUE_COPY)
+            ))
+        with connection.cursor() as cursor:
+            for tabla in ("productos", "ubicaciones", "lotes_producto", "series_producto", "movimientos_stock", "stock"):
+                cursor.execute(f"ANALYZE {tabla}")
+        return self.conteos
+
+    def _paso(self, nombre, funcion):
+        inicio = timezone.now()
+        with perfilado.etapa(nombre):
+            filas = funcion()
+            perfilado.filas(filas)
+        self.conteos[nombre] = filas
+        self.informar(f"{nombre}: {filas} filas en {(timezone.now() - inicio).total_seconds():.1f} s")
+        return filas
+
+    def _catalogos(self):
+        self.unidad, _ = UnidadMedida.objects.get_or_create(codigo="EA", defaults={"descripcion": "Unidad"})
+        self.tasa, _ = TasaImpuesto.objects.get_or_create(nombre="IVA", defaults={"porcentaje": Decimal("19.000")})
+        p, e = self.prefijo, self.escala
+        self.marcas = [m.pk for m in Marca.objects.bulk_create(
+            [Marca(nombre=f"{p} Marca {i:04d}") for i in range(e.marcas)]
+        )]
+        raices = CategoriaProducto.objects.bulk_create(
+            [CategoriaProducto(nombre=f"{p} {t}", codigo=f"{p}-{i:02d}") for i, t in enumerate(_TIPOS)]
+        )
+        hojas = CategoriaProducto.objects.bulk_create([
+            CategoriaProducto(padre=self.rnd.choice(raices), nombre=f"{p} Subcategoría {i:03d}", codigo=f"{p}-S{i:03d}")
+            for i in range(max(e.categorias - len(raices), 0))
+        ])
+        self.categorias = [c.pk for c in raices + hojas]
+        self.atributos = {}
+        for codigo, nombre, tipo in (("COLOR", "Color", "TEXT"), ("PESO_KG", "Peso (kg)", "NUMBER"), ("CERTIFICADO", "Certificado", "BOOLEAN")):
+            self.atributos[codigo] = DefinicionAtributo.objects.get_or_create(
+                codigo=codigo, defaults={"nombre": nombre, "tipo_dato": tipo}
+            )[0].pk
+        self.conteos["marcas"] = len(self.marcas)
+        self.conteos["categorias"] = len(self.categorias)
+
+    def _organizacion(self):
+        p, e = self.prefijo, self.escala
+        sucursales = Sucursal.objects.bulk_create(
+            [Sucursal(codigo=f"{p}-S{i:02d}", nombre=f"{p} Sucursal {i:02d}") for i in range(e.sucursales)]
+        )
+        self.bodegas = [b.pk for b in Bodega.objects.bulk_create([
+            Bodega(sucursal=s, codigo=f"B{j:02d}", nombre=f"{p} Bodega {s.codigo[-2:]}-{j:02d}")
+            for s in sucursales for j in range(e.bodegas_por_sucursal)
+        ])]
+        self.conteos["bodegas"] = len(self.bodegas)
+
+    def _ubicaciones(self):
+        por_bodega = -(-self.escala.ubicaciones // len(self.bodegas))
+        antes = _ultimo_id("ubicaciones")
+
+        def filas():
+            for bodega_id in self.bodegas:
+                for i in range(por_bodega):
+                    rack, resto = divmod(i, 60)
+                    nivel, posicion = divmod(resto, 12)
+                    # los racks altos se usan como almacenaje (no pickeable)
+                    yield (bodega_id, f"R{rack:03d}-N{nivel}-P{posicion:02d}", "", nivel < 3, True, self.ahora)
+
+        self._paso("ubicaciones", lambda: copiar(
+            "ubicaciones", ["bodega_id", "codigo", "nombre", "pickeable", "almacenable", "creado_en"], filas()
+        ))
+        self.ubicaciones = _ids_nuevos("ubicaciones", antes)
+
+    def _productos(self):
+        e, rnd = self.escala, self.rnd
+        antes = _ultimo_id("productos")
+
+        def filas():
+            for i in range(e.productos):
+                tipo = rnd.randrange(len(_TIPOS))
+                nombre = f"{_TIPOS[tipo]} {rnd.choice(_MATERIALES)} {rnd.choice(_MEDIDAS)}"
+                con_lote = rnd.random() < e.pct_con_lote
+                serializado = not con_lote and rnd.random() < e.pct_serializados
+                yield (
+                    f"{self.prefijo}-{i:07d}", nombre, rnd.choice(self.marcas), rnd.choice(self.categorias),
+                    self.unidad.pk, self.tasa.pk, rnd.random() > 0.03, serializado, con_lote,
+                    self.ahora - timedelta(days=rnd.randrange(e.dias_historial + 1)),
+                )
+
+        self._paso("productos", lambda: copiar(
+            "productos",
+            ["sku", "nombre", "marca_id", "categoria_id", "unidad_base_id", "tasa_impuesto_id", "activo",
+             "es_serializado", "tiene_vencimiento", "creado_en"],
+            filas(),
+        ))
+        filas_nuevas = _ids_nuevos("productos", antes, "id, es_serializado, tiene_vencimiento")
+        self.productos = [f[0] for f in filas_nuevas]
+        self.serializados = [f[0] for f in filas_nuevas if f[1]]
+        self.con_lote = [f[0] for f in filas_nuevas if f[2]]
+
+    def _precios_y_atributos(self):
+        rnd, hoy = self.rnd, timezone.localdate()
+        self.precio = {}
+
+        def precios_filas():
+            for producto_id in self.productos:
+                precio = Decimal(f"{rnd.lognormvariate(8, 1.2):.2f}")
+                self.precio[producto_id] = precio
+                yield (producto_id, precio, hoy - timedelta(days=rnd.randrange(1, 365)), True)
+
+        self._paso("precios", lambda: copiar(
+            "precios_producto", ["producto_id", "precio", "vigente_desde", "activo"], precios_filas()
+        ))
+        self._paso("precios vigentes", lambda: sum(
+            precios.refrescar_vigentes(self.productos[i:i + 20000]) for i in range(0, len(self.productos), 20000)
+        ))
+
+        def atributos_filas():
+            for producto_id in self.productos:
+                yield (producto_id, self.atributos["COLOR"], rnd.choice(_COLORES), None, None)
+                yield (producto_id, self.atributos["PESO_KG"], None, round(rnd.uniform(0.01, 40), 3), None)
+                if rnd.random() < 0.2:
+                    yield (producto_id, self.atributos["CERTIFICADO"], None, None, True)
+
+        self._paso("atributos", lambda: copiar(
+            "atributos_producto", ["producto_id", "atributo_id", "valor_texto", "valor_numero", "valor_booleano"],
+            atributos_filas(),
+        ))
+
+    def _lotes_y_series(self):
+        rnd, hoy = self.rnd, timezone.localdate()
+        antes = _ultimo_id("lotes_producto")
+
+        def lotes_filas():
+            for producto_id in self.con_lote:
+                for n in range(LOTES_POR_PRODUCTO):
+                    fabricado = hoy - timedelta(days=rnd.randrange(30, 720))
+                    # ~10 % vencidos y ~10 % por vencer: alimentan el barrido de alertas
+                    vence = hoy + timedelta(days=rnd.choice([-rnd.randrange(1, 90), rnd.randrange(1, 30)] + [rnd.randrange(60, 900)] * 8))
+                    yield (producto_id, f"{self.prefijo}L{producto_id}-{n}", vence, fabricado)
+
+        self._paso("lotes", lambda: copiar(
+            "lotes_producto", ["producto_id", "codigo_lote", "fecha_vencimiento", "fecha_fabricacion"], lotes_filas()
+        ))
+        self.lotes = {}
+        for lote_id, producto_id in _ids_nuevos("lotes_producto", antes, "id, producto_id"):
+            self.lotes.setdefault(producto_id, []).append(lote_id)
+
+        antes = _ultimo_id("series_producto")
+        k = self.escala.series_por_producto
+        self._paso("series", lambda: copiar(
+            "series_producto", ["producto_id", "numero_serie"],
+            ((p, f"{self.prefijo}SN{p}-{n:04d}") for p in self.serializados for n in range(k)),
+        ))
+        self.series = {}
+        for serie_id, producto_id in _ids_nuevos("series_producto", antes, "id, producto_id"):
+            self.series.setdefault(producto_id, []).append(serie_id)
+
+    def _movimientos(self):
+        e, rnd = self.escala, self.rnd
+        productos, ubicaciones = self.productos, self.ubicaciones
+        n_ubi = len(ubicaciones)
+        inicio = self.ahora - timedelta(days=e.dias_historial)
+        paso = timedelta(days=e.dias_historial) / max(e.movimientos, 1)
+        tipo_in, tipo_out, tipo_tr = (self.tipos[c].pk for c in ("IN", "OUT", "TRANSFER"))
+        # popularidad tipo Pareto: el ~20 % de los productos concentra ~80 % de los movimientos
+        pesos = [rnd.paretovariate(1.16) for _ in productos]
+        acumulados, total = [], 0.0
+        for w in pesos:
+            total += w
+            acumulados.append(total)
+
+        def casa(producto_id, k):
+            return ubicaciones[(producto_id * 7919 + k * 104729) % n_ubi]
+
+        def elegidos():
+            for desde in range(0, e.movimientos, BLOQUE_COPY):
+                yield from rnd.choices(productos, cum_weights=acumulados, k=min(BLOQUE_COPY, e.movimientos - desde))
+
+        def filas():
+            for i, producto_id in enumerate(elegidos()):
+                ocurrido = inicio + paso * i
+                r = rnd.random()
+                serie_id = lote_id = None
+                if producto_id in self.series:
+                    serie_id = rnd.choice(self.series[producto_id])
+                    cantidad = 1
+                else:
+                    lote_id = rnd.choice(self.lotes[producto_id]) if producto_id in self.lotes else None
+                    cantidad = rnd.randint(1, 50)
+                origen = casa(producto_id, rnd.randrange(UBICACIONES_POR_PRODUCTO))
+                if r < 0.55:
+                    fila = (tipo_in, None, origen, cantidad * 2, self.precio[producto_id] * Decimal("0.6"), "recepciones_mercaderia")
+                elif r < 0.9:
+                    fila = (tipo_out, origen, None, cantidad, None, "")
+                else:
+                    destino = casa(producto_id, rnd.randrange(UBICACIONES_POR_PRODUCTO))
+                    fila = (tipo_tr, origen, destino, cantidad, None, "transferencias")
+                tipo, desde, hasta, cantidad, costo, tabla = fila
+                yield (tipo, producto_id, desde, hasta, lote_id, serie_id, cantidad, costo, tabla, "", ocurrido)
+
+        self._paso("movimientos", lambda: copiar(
+            "movimientos_stock",
+            ["tipo_movimiento_id", "producto_id", "ubicacion_desde_id", "ubicacion_hasta_id", "lote_id", "serie_id",
+             "cantidad", "costo_unitario", "tabla_referencia", "notas", "ocurrido_en"],
+            filas(),
+        ))
+
+    def _saldos(self):
+        desde, hasta = self.productos[0], self.productos[-1]
+        sql_stock = """
+            INSERT INTO stock (producto_id, ubicacion_id, lote_id, serie_id, cantidad_disponible, cantidad_reservada, actualizado_en)
+            SELECT producto_id, ubicacion_id, lote_id, serie_id, SUM(delta), 0, NOW()
+            FROM (
+                SELECT producto_id, ubicacion_hasta_id AS ubicacion_id, lote_id, serie_id, cantidad AS delta
+                FROM movimientos_stock WHERE producto_id BETWEEN %(desde)s AND %(hasta)s AND ubicacion_hasta_id IS NOT NULL
+                UNION ALL
+                SELECT producto_id, ubicacion_desde_id, lote_id, serie_id, -cantidad
+                FROM movimientos_stock WHERE producto_id BETWEEN %(desde)s AND %(hasta)s AND ubicacion_desde_id IS NOT NULL
+            ) d
+            GROUP BY producto_id, ubicacion_id, lote_id, serie_id
+            HAVING SUM(delta) > 0
+        """
+        sql_valorizacion = """
+            INSERT INTO valorizacion_inventario (producto_id, bodega_id, cantidad, valor_total, costo_promedio, actualizado_en)
+            SELECT s.producto_id, u.bodega_id, SUM(s.cantidad_disponible),
+                   ROUND(SUM(s.cantidad_disponible) * MAX(pv.precio) * 0.6, 6), ROUND(MAX(pv.precio) * 0.6, 6), NOW()
+            FROM stock s
+            JOIN ubicaciones u ON u.id = s.ubicacion_id
+            JOIN precios_vigentes pv ON pv.producto_id = s.producto_id
+            WHERE s.producto_id BETWEEN %(desde)s AND %(hasta)s
+            GROUP BY s.producto_id, u.bodega_id
+            ON CONFLICT (producto_id, bodega_id) DO NOTHING
+        """
+
+        def ejecutar(sql):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, {"desde": desde, "hasta": hasta})
+                return cursor.rowcount
+
+        self._paso("stock", lambda: ejecutar(sql_stock))
+        self._paso("valorizacion", lambda: ejecutar(sql_valorizacion))
+
+
+def generar(escala="mini", *, prefijo="SYN", semilla=1, indexar_busqueda=True, informar=None, **ajustes):
+    """Genera un conjunto con la escala nombrada (``ESCALAS``) y ``ajustes`` puntuales."""
+    base = replace(ESCALAS[escala], **ajustes) if ajustes else ESCALAS[escala]
+    conteos = Generador(base, prefijo=prefijo, semilla=semilla, informar=informar).generar(
+        indexar_busqueda=indexar_busqueda
+    )
+    return {"escala": asdict(base), "filas": conteos}
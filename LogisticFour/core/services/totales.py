@@ -0,0 +1,119 @@
+"""
+Totales desnormalizados de OrdenCompra y FacturaProveedor.
+
+Ambos recálculos son un único ``UPDATE ... FROM (agregado)`` que sirve tanto
+para una orden (al cambiar sus líneas) como para todo el histórico
+(``manage.py recalcular_totales``). Sólo se reescriben filas cuyo valor cambia.
+Como el UPDATE no dispara señales, ``recalcular_ordenes`` invalida al
+confirmar el resumen en caché del portal de los proveedores afectados.
+
+Línea de OC: ``cantidad_pedida * precio * (1 - descuento_pct / 100)``.
+Impuesto: ``subtotal * tasa.porcentaje / 100``; todo redondeado a 4 decimales.
+"""
+import threading
+
+from django.db import connection, transaction
+
+from core.services import portal_proveedor
+
+_SQL_ORDENES = """
+UPDATE ordenes_compra oc
+SET subtotal = n.subtotal, monto_impuesto = n.impuesto, total = n.subtotal + n.impuesto
+FROM (
+    SELECT o.id,
+           COALESCE(a.subtotal, 0) AS subtotal,
+           ROUND(COALESCE(a.subtotal, 0) * COALESCE(t.porcentaje, 0) / 100, 4) AS impuesto
+    FROM ordenes_compra o
+    LEFT JOIN (
+        SELECT orden_compra_id,
+               ROUND(SUM(cantidad_pedida * precio * (1 - descuento_pct / 100)), 4) AS subtotal
+        FROM lineas_orden_compra
+        {filtro_lineas}
+        GROUP BY orden_compra_id
+    ) a ON a.orden_compra_id = o.id
+    LEFT JOIN tasas_impuesto t ON t.id = o.tasa_impuesto_id
+    {filtro_ordenes}
+) n
+WHERE oc.id = n.id
+  AND (oc.subtotal, oc.monto_impuesto, oc.total) IS DISTINCT FROM (n.subtotal, n.impuesto, n.subtotal + n.impuesto)
+RETURNING oc.proveedor_id
+"""
+
+_SQL_FACTURAS = """
+UPDATE facturas_proveedor f
+SET subtotal = n.subtotal, monto_impuesto = f.monto_total - n.subtotal
+FROM (
+    SELECT fp.id, ROUND(fp.monto_total / (1 + COALESCE(t.porcentaje, 0) / 100), 4) AS subtotal
+    FROM facturas_proveedor fp
+    LEFT JOIN tasas_impuesto t ON t.id = fp.tasa_impuesto_id
+    {filtro}
+) n
+WHERE f.id = n.id
+  AND (f.subtotal, f.monto_impuesto) IS DISTINCT FROM (n.subtotal, f.monto_total - n.subtotal)
+"""
+
+
+def recalcular_ordenes(orden_ids=None):
+    """Recalcula ``orden_ids`` (o todas las órdenes). Devuelve filas modificadas."""
+    if orden_ids is None:
+        sql, params = _SQL_ORDENES.format(filtro_lineas="", filtro_ordenes=""), []
+    else:
+        orden_ids = list(orden_ids)
+        if not orden_ids:
+            return 0
+        sql = _SQL_ORDENES.format(
+            filtro_lineas="WHERE orden_compra_id = ANY(%s)",
+            filtro_ordenes="WHERE o.id = ANY(%s)",
+        )
+        params = [orden_ids, orden_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        proveedores = {fila[0] for fila in cursor.fetchall()}
+        modificadas = cursor.rowcount
+
+    def invalidar():
+        for proveedor_id in proveedores:
+            portal_proveedor.invalidar(proveedor_id)
+
+    # el total abierto del portal sale de ordenes_compra.total
+    transaction.on_commit(invalidar)
+    return modificadas
+
+
+def recalcular_facturas(factura_ids=None):
+    if factura_ids is None:
+        sql, params = _SQL_FACTURAS.format(filtro=""), []
+    else:
+        factura_ids = list(factura_ids)
+        if not factura_ids:
+            return 0
+        sql, params = _SQL_FACTURAS.format(filtro="WHERE fp.id = ANY(%s)"), [factura_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+# -------------------- Recalculo diferido al confirmar --------------------
+_pendientes = threading.local()
+
+
+def _vaciar_pendientes():
+    ordenes = getattr(_pendientes, "ordenes", set())
+    facturas = getattr(_pendientes, "facturas", set())
+    _pendientes.ordenes, _pendientes.facturas = set(), set()
+    recalcular_ordenes(ordenes)
+    recalcular_facturas(facturas)
+
+
+def programar(orden_id=None, factura_id=None):
+    """
+    Agenda el recálculo para el commit. Varias líneas guardadas en la misma
+    transacción (p.ej. un formset) se resuelven con un solo UPDATE; si la
+    transacción se revierte, los ids quedan pendientes y se recalculan en el
+    próximo commit, lo que es inocuo porque el cálculo es idempotente.
+    """
+    if orden_id is not None:
+        _pendientes.__dict__.setdefault("ordenes", set()).add(orden_id)
+    if factura_id is not None:
+        _pendientes.__dict__.setdefault("facturas", set()).add(factura_id)
+    transaction.on_commit(_vaciar_pendientes)
@@ -0,0 +1,288 @@
+"""
+Trabajos en segundo plano con la cola en PostgreSQL (tabla ``trabajos``), sin
+broker externo.
+
+* ``encolar`` inserta el trabajo (dentro de la transacción del llamador: sólo
+  se ve al confirmar). Con ``clave`` es idempotente: la misma
+  ``(tipo, clave)`` devuelve el trabajo existente, salvo que haya fallado:
+  entonces se vuelve a encolar desde cero.
+* Los workers (``manage.py procesar_trabajos --procesos N``) llaman a
+  ``trabajar``: reclaman de a un trabajo con una sola sentencia ``UPDATE ...
+  WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING``, así que N
+  procesos nunca toman el mismo trabajo ni se esperan entre sí. El throughput
+  escala agregando procesos.
+* Una excepción reprograma el trabajo con backoff exponencial con jitter
+  (``TRABAJOS_BACKOFF_BASE`` .. ``TRABAJOS_BACKOFF_MAX``) hasta
+  ``max_intentos``; ``ValidationError`` y ``ErrorPermanente`` fallan sin
+  reintentar.
+* ``progreso(actual, total, mensaje)`` deja el avance en memoria; un hilo de
+  latido por proceso lo escribe cada ``TRABAJOS_LATIDO_SEGUNDOS`` con su propia
+  conexión (autocommit), de modo que se ve aunque la tarea corra dentro de una
+  transacción. Un trabajo RUNNING sin latido por ``TRABAJOS_TIMEOUT_SEGUNDOS``
+  (worker caído) vuelve a la cola.
+
+Las tareas se registran con ``@tarea("nombre")`` en ``core.tareas``; los
+parámetros deben ser serializables a JSON.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from core.models import Trabajo
+
+logger = logging.getLogger(__name__)
+
+REGISTRO = {}
+_trabajo_actual = ContextVar("trabajo_actual", default=None)
+
+_SQL_RECLAMAR = """
+UPDATE trabajos SET estado = 'RUNNING', intentos = intentos + 1, bloqueado_por = %(worker)s,
+       latido_en = NOW(), iniciado_en = COALESCE(iniciado_en, NOW())
+WHERE id = (
+    SELECT id FROM trabajos
+    WHERE estado = 'PENDING' AND disponible_en <= NOW() {filtro}
+    ORDER BY prioridad DESC, disponible_en, id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING *
+"""
+
+_SQL_VENCIDOS = """
+UPDATE trabajos SET
+    estado = CASE WHEN intentos >= max_intentos THEN 'FAILED' ELSE 'PENDING' END,
+    error = 'Worker ' || bloqueado_por || ' sin latido; se reprograma.',
+    terminado_en = CASE WHEN intentos >= max_intentos THEN NOW() END,
+    bloqueado_por = ''
+WHERE estado = 'RUNNING' AND latido_en < NOW() - make_interval(secs => %s)
+"""
+
+
+class ErrorPermanente(Exception):
+    """Error que no se arregla reintentando (datos inválidos, entidad inexistente...)."""
+
+
+def _config(nombre, defecto):
+    return getattr(settings, f"TRABAJOS_{nombre}", defecto)
+
+
+def tarea(nombre):
+    def registrar(funcion):
+        REGISTRO[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def _registro():
+    import core.tareas  # noqa: F401  (registra las tareas al importarse)
+    return REGISTRO
+
+
+# -------------------- Productor --------------------
+def encolar(tipo, parametros=None, *, clave=None, prioridad=0, usuario=None, max_intentos=None, disponible_en=None):
+    """
+    Devuelve ``(trabajo, creado)``; con ``clave`` no duplica un trabajo ya
+    encolado. Un trabajo FAILED con la misma clave vuelve a PENDING con los
+    intentos en cero (``creado`` es True: se ejecutará de nuevo).
+    """
+    if tipo not in _registro():
+        raise ValueError(f"Tarea desconocida: {tipo!r}")
+    valores = {
+        "parametros": parametros or {},
+        "prioridad": prioridad,
+        "max_intentos": max_intentos or _config("MAX_INTENTOS", 5),
+        "disponible_en": disponible_en or timezone.now(),
+        "creado_por": usuario if usuario is not None and usuario.is_authenticated else None,
+    }
+    if clave is None:
+        return Trabajo.objects.create(tipo=tipo, **valores), True
+    trabajo, creado = Trabajo.objects.get_or_create(tipo=tipo, clave_idempotencia=clave, defaults=valores)
+    if creado or trabajo.estado != Trabajo.Estado.FAILED:
+        return trabajo, creado
+    reencolado = Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.Estado.FAILED).update(
+        estado=Trabajo.Estado.PENDING, intentos=0, error="", resultado=None, mensaje="", progreso_actual=0,
+        progreso_total=None, iniciado_en=None, terminado_en=None, latido_en=None,
+        **{campo: valor for campo, valor in valores.items() if campo != "creado_por"},
+    )
+    trabajo.refresh_from_db()
+    return trabajo, bool(reencolado)
+
+
+def estado(trabajo):
+    """Lo que devuelve el endpoint de estado."""
+    return {
+        "id": trabajo.pk,
+        "tipo": trabajo.tipo,
+        "estado": trabajo.estado,
+        "intentos": trabajo.intentos,
+        "max_intentos": trabajo.max_intentos,
+        "progreso": {"actual": trabajo.progreso_actual, "total": trabajo.progreso_total, "porcentaje": trabajo.porcentaje},
+        "mensaje": trabajo.mensaje,
+        "resultado": trabajo.resultado,
+        "error": trabajo.error.splitlines()[-1] if trabajo.error else "",
+        "creado_en": trabajo.creado_en,
+        "iniciado_en": trabajo.iniciado_en,
+        "terminado_en": trabajo.terminado_en,
+        "disponible_en": trabajo.disponible_en,
+    }
+
+
+# -------------------- Progreso y latido --------------------
+def progreso(actual, total=None, mensaje=None):
+    """Informa el avance del trabajo en curso (no hace nada fuera de un worker)."""
+    trabajo = _trabajo_actual.get()
+    if trabajo is None:
+        return
+    trabajo.progreso_actual = actual
+    if total is not None:
+        trabajo.progreso_total = total
+    if mensaje is not None:
+        trabajo.mensaje = mensaje[:255]
+
+
+class _Latido(threading.Thread):
+    """Escribe latido y progreso del trabajo en curso del proceso."""
+
+    def __init__(self, worker):
+        super().__init__(name="latido-trabajos", daemon=True)
+        self.worker = worker
+        self.trabajo = None
+        self.detener = threading.Event()
+
+    def run(self):
+        try:
+            while not self.detener.wait(_config("LATIDO_SEGUNDOS", 10)):
+                trabajo = self.trabajo
+                if trabajo is None:
+                    continue
+                try:
+                    Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.Estado.RUNNING, bloqueado_por=self.worker).update(
+                        latido_en=timezone.now(), progreso_actual=trabajo.progreso_actual,
+                        progreso_total=trabajo.progreso_total, mensaje=trabajo.mensaje,
+                    )
+                except Exception:
+                    logger.exception("No se pudo registrar el latido del trabajo %s", trabajo.pk)
+                    connection.close()
+        finally:
+            connection.close()
+
+
+# -------------------- Worker --------------------
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reclamar(worker, tipos=None):
+    filtro, params = "", {"worker": worker}
+    if tipos:
+        filtro = "AND tipo = ANY(%(tipos)s)"
+        params["tipos"] = list(tipos)
+    trabajos = list(Trabajo.objects.raw(_SQL_RECLAMAR.format(filtro=filtro), params))
+    return trabajos[0] if trabajos else None
+
+
+def recuperar_vencidos():
+    """Devuelve a la cola (o da por fallidos) los trabajos de workers sin latido."""
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_VENCIDOS, [_config("TIMEOUT_SEGUNDOS", 300)])
+        return cursor.rowcount
+
+
+def espera_reintento(intentos):
+    base = _config("BACKOFF_BASE", 10)
+    segundos = min(base * 2 ** max(intentos - 1, 0), _config("BACKOFF_MAX", 3600))
+    return segundos * random.uniform(0.8, 1.2)
+
+
+def _terminar(trabajo, worker, **campos):
+    campos.update(
+        bloqueado_por="", progreso_actual=trabajo.progreso_actual, progreso_total=trabajo.progreso_total,
+        mensaje=trabajo.mensaje,
+    )
+    # si el trabajo se reprogramó por falta de latido, otro worker ya lo tiene: no se pisa
+    Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.Estado.RUNNING, bloqueado_por=worker).update(**campos)
+
+
+def ejecutar(trabajo, worker, latido=None):
+    funcion = _registro().get(trabajo.tipo)
+    token = _trabajo_actual.set(trabajo)
+    if latido is not None:
+        latido.trabajo = trabajo
+    inicio = time.perf_counter()
+    try:
+        if funcion is None:
+            raise ErrorPermanente(f"Tarea desconocida: {trabajo.tipo!r}")
+        resultado = funcion(**trabajo.parametros)
+    except Exception as exc:
+        detalle = traceback.format_exc()
+        permanente = isinstance(exc, (ErrorPermanente, ValidationError))
+        if permanente or trabajo.intentos >= trabajo.max_intentos:
+            logger.error("Trabajo %s (%s) fallido: %s", trabajo.pk, trabajo.tipo, exc)
+            _terminar(trabajo, worker, estado=Trabajo.Estado.FAILED, error=detalle, terminado_en=timezone.now())
+        else:
+            espera = espera_reintento(trabajo.intentos)
+            logger.warning("Trabajo %s (%s) falló (intento %s); se reintenta en %.0f s: %s",
+                           trabajo.pk, trabajo.tipo, trabajo.intentos, espera, exc)
+            _terminar(trabajo, worker, estado=Trabajo.Estado.PENDING, error=detalle,
+                      disponible_en=timezone.now() + timedelta(seconds=espera))
+        return False
+    else:
+        if trabajo.progreso_total is not None:
+            trabajo.progreso_actual = trabajo.progreso_total
+        _terminar(trabajo, worker, estado=Trabajo.Estado.DONE, resultado=resultado, error="", terminado_en=timezone.now())
+        logger.info("Trabajo %s (%s) terminado en %.1f s", trabajo.pk, trabajo.tipo, time.perf_counter() - inicio)
+        return True
+    finally:
+        if latido is not None:
+            latido.trabajo = None
+        _trabajo_actual.reset(token)
+        # una tarea que dejó la transacción abierta o la conexión rota no contagia al siguiente trabajo
+        if connection.in_atomic_block:
+            transaction.set_rollback(True)
+        close_old_connections()
+
+
+def trabajar(*, tipos=None, detener=None, max_trabajos=None, una_vez=False):
+    """
+    Bucle de un proceso worker. Devuelve la cantidad de trabajos ejecutados.
+    ``una_vez``: termina cuando la cola queda vacía; ``detener``: ``Event`` de
+    parada (se revisa entre trabajos).
+    """
+    detener = detener or threading.Event()
+    worker = identificador_worker()
+    latido = _Latido(worker)
+    latido.start()
+    espera_min, espera_max = 0.05, _config("ESPERA_MAX_SEGUNDOS", 2.0)
+    espera, ejecutados, ultima_revision = espera_min, 0, 0.0
+    try:
+        while not detener.is_set() and (max_trabajos is None or ejecutados < max_trabajos):
+            if time.monotonic() - ultima_revision > 60:
+                recuperar_vencidos()
+                ultima_revision = time.monotonic()
+            trabajo = reclamar(worker, tipos)
+            if trabajo is None:
+                if una_vez:
+                    break
+                # cola vacía: sondeo con espera creciente
+                detener.wait(espera)
+                espera = min(espera * 2, espera_max)
+                continue
+            espera = espera_min
+            ejecutar(trabajo, worker, latido)
+            ejecutados += 1
+    finally:
+        latido.detener.set()
+        latido.join(timeout=5)
+        connection.close()
+    return ejecutados
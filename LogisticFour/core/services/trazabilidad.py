@@ -0,0 +1,181 @@
+"""
+Trazabilidad de series y lotes para retiros (recalls).
+
+Cada fuente (movimientos de stock, recepciones, transferencias y devoluciones
+a proveedor) es una consulta indexada por serie o lote, ordenada por fecha y
+leída con ``iterator()`` (cursor del lado servidor cuando la conexión lo
+permite). ``heapq.merge`` las combina en una sola línea de tiempo sin
+materializarlas: un lote con 100k series se recorre con memoria constante.
+
+Cada evento es un dict con ``fecha``, ``fuente``, ``id`` y los datos del
+documento; ``resumen_lote`` responde "qué ubicaciones y documentos tocó".
+"""
+import heapq
+
+from django.db.models import F
+
+from core.models import (
+    LineaDevolucionProveedor,
+    LineaRecepcionMercaderia,
+    LineaTransferencia,
+    MovimientoStock,
+    SerieProducto,
+    Stock,
+)
+
+TAMANO_BLOQUE = 2000
+
+
+def _movimientos(**filtro):
+    qs = (
+        MovimientoStock.objects.filter(**filtro)
+        .order_by("ocurrido_en", "id")
+        .values(
+            "id", "producto_id", "lote_id", "serie_id", "cantidad",
+            "ubicacion_desde_id", "ubicacion_hasta_id", "tabla_referencia", "referencia_id",
+            fecha=F("ocurrido_en"), tipo=F("tipo_movimiento__codigo"),
+        )
+    )
+    for fila in qs.iterator(chunk_size=TAMANO_BLOQUE):
+        fila["fuente"] = "movimiento"
+        yield fila
+
+
+def _recepciones(**filtro):
+    qs = (
+        LineaRecepcionMercaderia.objects.filter(**filtro)
+        .order_by("recepcion__recibido_en", "id")
+        .values(
+            "id", "producto_id", "lote_id", "serie_id", "recepcion_id",
+            fecha=F("recepcion__recibido_en"),
+            cantidad=F("cantidad_recibida"),
+            documento=F("recepcion__numero_recepcion"),
+            estado=F("recepcion__estado"),
+            bodega_id=F("recepcion__bodega_id"),
+            orden_compra=F("recepcion__orden_compra__numero_orden"),
+            proveedor_id=F("recepcion__orden_compra__proveedor_id"),
+        )
+    )
+    for fila in qs.iterator(chunk_size=TAMANO_BLOQUE):
+        fila["fuente"] = "recepcion"
+        yield fila
+
+
+def _transferencias(**filtro):
+    qs = (
+        LineaTransferencia.objects.filter(**filtro)
+        .order_by("transferencia__creado_en", "id")
+        .values(
+            "id", "producto_id", "lote_id", "serie_id", "cantidad", "transferencia_id",
+            fecha=F("transferencia__creado_en"),
+            estado=F("transferencia__estado"),
+            bodega_origen_id=F("transferencia__bodega_origen_id"),
+            bodega_destino_id=F("transferencia__bodega_destino_id"),
+        )
+    )
+    for fila in qs.iterator(chunk_size=TAMANO_BLOQUE):
+        fila["fuente"] = "transferencia"
+        yield fila
+
+
+def _devoluciones(**filtro):
+    qs = (
+        LineaDevolucionProveedor.objects.filter(**filtro)
+        .order_by("devolucion__creado_en", "id")
+        .values(
+            "id", "producto_id", "lote_id", "serie_id", "cantidad", "devolucion_id",
+            fecha=F("devolucion__creado_en"),
+            estado=F("devolucion__estado"),
+            bodega_id=F("devolucion__bodega_id"),
+            proveedor_id=F("devolucion__proveedor_id"),
+        )
+    )
+    for fila in qs.iterator(chunk_size=TAMANO_BLOQUE):
+        fila["fuente"] = "devolucion"
+        yield fila
+
+
+def _fusionar(*fuentes):
+    return heapq.merge(*fuentes, key=lambda e: (e["fecha"], e["fuente"], e["id"]))
+
+
+# -------------------- Series --------------------
+def ubicacion_actual_serie(serie_id):
+    """Dónde está hoy la serie: filas de stock con cantidad (normalmente una)."""
+    return list(
+        Stock.objects.filter(serie_id=serie_id)
+        .filter(cantidad_disponible__gt=0)
+        .values("ubicacion_id", "ubicacion__codigo", "ubicacion__bodega_id", "lote_id", "cantidad_disponible")
+    )
+
+
+def linea_tiempo_serie(serie_id):
+    """Generador con todo lo ocurrido a la serie, en orden cronológico."""
+    return _fusionar(
+        _movimientos(serie_id=serie_id),
+        _recepciones(serie_id=serie_id),
+        _transferencias(serie_id=serie_id),
+        _devoluciones(serie_id=serie_id),
+    )
+
+
+# -------------------- Lotes --------------------
+def linea_tiempo_lote(lote_id, *, incluir_series=True):
+    """
+    Generador con los eventos del lote y, si ``incluir_series``, los de sus
+    series registradas sin lote en la línea (cada fila aparece una vez).
+    """
+    fuentes = [
+        _movimientos(lote_id=lote_id),
+        _recepciones(lote_id=lote_id),
+        _transferencias(lote_id=lote_id),
+        _devoluciones(lote_id=lote_id),
+    ]
+    if incluir_series:
+        por_serie = {"serie__lote_id": lote_id, "lote_id__isnull": True}
+        fuentes += [
+            _movimientos(**por_serie),
+            _recepciones(**por_serie),
+            _transferencias(**por_serie),
+            _devoluciones(**por_serie),
+        ]
+    return _fusionar(*fuentes)
+
+
+def resumen_lote(lote_id):
+    """Ubicaciones, documentos y proveedores tocados por el lote (o sus series)."""
+    series = SerieProducto.objects.filter(lote_id=lote_id).values("id")
+    movimientos = MovimientoStock.objects.filter(lote_id=lote_id) | MovimientoStock.objects.filter(serie__in=series)
+    ubicaciones = set(movimientos.values_list("ubicacion_desde_id", flat=True).distinct())
+    ubicaciones |= set(movimientos.values_list("ubicacion_hasta_id", flat=True).distinct())
+    ubicaciones.discard(None)
+
+    recepciones = (
+        LineaRecepcionMercaderia.objects.filter(lote_id=lote_id)
+        | LineaRecepcionMercaderia.objects.filter(serie__in=series)
+    ).values_list("recepcion_id", "recepcion__orden_compra_id", "recepcion__orden_compra__proveedor_id").distinct()
+    devoluciones = (
+        LineaDevolucionProveedor.objects.filter(lote_id=lote_id)
+        | LineaDevolucionProveedor.objects.filter(serie__in=series)
+    ).values_list("devolucion_id", "devolucion__proveedor_id").distinct()
+    transferencias = (
+        LineaTransferencia.objects.filter(lote_id=lote_id) | LineaTransferencia.objects.filter(serie__in=series)
+    ).values_list("transferencia_id", flat=True).distinct()
+
+    recepciones, devoluciones = list(recepciones), list(devoluciones)
+    return {
+        "lote_id": lote_id,
+        "series": SerieProducto.objects.filter(lote_id=lote_id).count(),
+        "ubicaciones": sorted(ubicaciones),
+        "stock_actual": list(
+            Stock.objects.filter(lote_id=lote_id, cantidad_disponible__gt=0)
+            .values("ubicacion_id", "ubicacion__bodega_id")
+            .order_by("ubicacion_id")
+            .distinct()
+        ),
+        "recepciones": sorted({r[0] for r in recepciones}),
+        "ordenes_compra": sorted({r[1] for r in recepciones if r[1]}),
+        "transferencias": sorted(transferencias),
+        "devoluciones": sorted({d[0] for d in devoluciones}),
+        "proveedores": sorted({r[2] for r in recepciones if r[2]} | {d[1] for d in devoluciones}),
+    }
@@ -0,0 +1,59 @@
+"""
+Validación en bloque del rol PROVEEDOR.
+
+Los ``clean()`` de OrdenCompra, FacturaProveedor, DevolucionProveedor,
+ProductoUsuarioProveedor y Adjunto validan el proveedor de a uno y
+``bulk_create`` no llama a ``clean()``. ``validar_proveedores`` resuelve todos
+los proveedores de un conjunto de instancias con una sola consulta a
+``usuarios_perfil`` y marca las válidas, de modo que un ``full_clean()``
+posterior no vuelve a consultar; ``crear_en_bloque`` es la entrada para cargas
+masivas. La base de datos aplica la misma regla con triggers: al escribir un
+proveedor_id (migración 0011) y al quitarle el rol a un usuario con registros
+como proveedor (migración 0017), así que los caminos que no validan tampoco
+pueden dejar filas inconsistentes.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core.models import UsuarioPerfil
+
+
+def proveedores_validos(usuario_ids):
+    """Subconjunto de ``usuario_ids`` con rol PROVEEDOR (una consulta)."""
+    usuario_ids = {uid for uid in usuario_ids if uid is not None}
+    if not usuario_ids:
+        return set()
+    return set(
+        UsuarioPerfil.objects.filter(usuario_id__in=usuario_ids, rol=UsuarioPerfil.Rol.PROVEEDOR)
+        .values_list("usuario_id", flat=True)
+    )
+
+
+def validar_proveedores(instancias, campo="proveedor", *, opcional=False):
+    """
+    Marca como validadas las instancias cuyo ``<campo>`` es proveedor y lanza
+    ``ValidationError`` con el índice de cada instancia inválida. Con
+    ``opcional=True`` un proveedor vacío es válido (caso Adjunto).
+    """
+    instancias = list(instancias)
+    atributo = f"{campo}_id"
+    validos = proveedores_validos(getattr(i, atributo) for i in instancias)
+    errores = {}
+    for indice, instancia in enumerate(instancias):
+        usuario_id = getattr(instancia, atributo)
+        if usuario_id is None and opcional:
+            continue
+        if usuario_id in validos:
+            instancia._proveedor_validado = usuario_id
+        else:
+            errores[f"{indice}.{campo}"] = [f"El usuario {usuario_id} no tiene rol PROVEEDOR."]
+    if errores:
+        raise ValidationError(errores)
+    return instancias
+
+
+@transaction.atomic
+def crear_en_bloque(modelo, instancias, *, campo="proveedor", opcional=False, lote=1000):
+    """``bulk_create`` precedido de la validación de proveedores en bloque."""
+    instancias = validar_proveedores(instancias, campo, opcional=opcional)
+    return modelo.objects.bulk_create(instancias, batch_size=lote)
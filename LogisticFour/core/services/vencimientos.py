@@ -0,0 +1,240 @@
+"""
+Control de vencimientos de lotes.
+
+* ``stock_por_vencer`` / ``resumen_por_bodega``: stock con lotes que vencen en
+  los próximos N días, en una consulta (índice parcial ``idx_lote_vencimiento``).
+  N es ``configuracion["dias"]`` de la regla EXPIRY_SOON (migración 0013).
+* ``generar_alertas``: un único ``INSERT ... SELECT`` crea una ``Alerta`` por
+  producto, ubicación y regla: lotes vencidos (EXPIRED, CRITICAL) o por vencer
+  (EXPIRY_SOON, WARN), salvo que ya exista una abierta para la misma
+  combinación. Cada regla aporta sus ``dias``: el horizonte de aviso y los días
+  de gracia tras el vencimiento. Los eventos en vivo se publican en bloque.
+* ``mover_a_cuarentena``: transfiere el stock libre (disponible - reservado)
+  vencido de cada bodega a su ubicación de cuarentena (no pickeable) con
+  ``inventario.postear``, en lotes de filas con una transacción por lote. Lo
+  reservado queda donde está hasta que se despache o se libere la reserva.
+
+Las lecturas van a réplica si la hay (``core.routers.alias_replica``); el
+bloqueo y el movimiento de cada lote de cuarentena vuelven a leer en la
+primaria, así que el atraso de la réplica sólo posterga filas a la próxima
+pasada.
+
+Pensado para correr cada noche con ``manage.py revisar_vencimientos``.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+
+from core.models import ReglaAlerta, Stock, Ubicacion
+from core.routers import alias_replica
+from core.services import eventos, inventario
+
+logger = logging.getLogger(__name__)
+
+REGLA_POR_VENCER = "EXPIRY_SOON"
+REGLA_VENCIDO = "EXPIRED"
+
+_SQL_ALERTAS = """
+WITH candidatos AS (
+    SELECT s.producto_id, s.ubicacion_id,
+           CASE WHEN l.fecha_vencimiento < %(vencido_antes_de)s THEN %(regla_vencido)s ELSE %(regla_por_vencer)s END AS regla_id,
+           MIN(l.fecha_vencimiento) AS vence,
+           COUNT(DISTINCT l.id) AS lotes,
+           SUM(s.cantidad_disponible) AS cantidad
+    FROM lotes_producto l
+    JOIN stock s ON s.lote_id = l.id
+    JOIN ubicaciones u ON u.id = s.ubicacion_id
+    WHERE l.fecha_vencimiento IS NOT NULL
+      AND l.fecha_vencimiento <= %(limite)s
+      AND s.cantidad_disponible > 0
+      AND u.pickeable
+      {filtro}
+    GROUP BY 1, 2, 3
+),
+clasificados AS (
+    SELECT c.*, CASE WHEN c.regla_id = %(regla_vencido)s THEN 'CRITICAL' ELSE 'WARN' END AS severidad
+    FROM candidatos c
+)
+INSERT INTO alertas (creado_en, regla_id, producto_id, ubicacion_id, severidad, mensaje)
+SELECT NOW(), c.regla_id, c.producto_id, c.ubicacion_id, c.severidad,
+       p.sku || ': ' || c.lotes || ' lote(s) con ' || TRIM(TRAILING '.' FROM TRIM(TRAILING '0' FROM c.cantidad::text))
+       || CASE WHEN c.severidad = 'CRITICAL' THEN ' u. vencido(s) desde ' ELSE ' u. que vence(n) el ' END
+       || TO_CHAR(c.vence, 'YYYY-MM-DD') || ' en ' || u.codigo
+FROM clasificados c
+JOIN productos p ON p.id = c.producto_id
+JOIN ubicaciones u ON u.id = c.ubicacion_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM alertas a
+    WHERE a.reconocida_en IS NULL
+      AND a.regla_id = c.regla_id
+      AND a.producto_id = c.producto_id
+      AND a.ubicacion_id = c.ubicacion_id
+)
+RETURNING id, severidad, mensaje, producto_id, ubicacion_id, creado_en
+"""
+
+
+def _reglas():
+    """``{codigo: {"id", "configuracion"}}`` de las reglas EXPIRY_SOON y EXPIRED."""
+    reglas = {
+        r.pop("codigo"): r
+        for r in ReglaAlerta.objects.using(alias_replica(ReglaAlerta))
+        .filter(codigo__in=[REGLA_POR_VENCER, REGLA_VENCIDO])
+        .values("codigo", "id", "configuracion")
+    }
+    if len(reglas) != 2:
+        raise ValidationError("Faltan las reglas de alerta EXPIRY_SOON / EXPIRED (migración 0013).")
+    return reglas
+
+
+def _dias(regla):
+    return int(regla["configuracion"].get("dias", 0))
+
+
+def dias_aviso():
+    """Horizonte de aviso: ``configuracion["dias"]`` de la regla EXPIRY_SOON."""
+    return _dias(_reglas()[REGLA_POR_VENCER])
+
+
+def stock_por_vencer(dias=None, bodega_id=None):
+    """Stock disponible en lotes que vencen dentro de ``dias`` (incluye vencidos)."""
+    limite = timezone.localdate() + timedelta(days=dias_aviso() if dias is None else dias)
+    qs = (
+        Stock.objects.using(alias_replica(Stock))
+        .filter(lote__fecha_vencimiento__lte=limite, cantidad_disponible__gt=0)
+        .select_related("producto", "lote", "ubicacion")
+        .order_by("lote__fecha_vencimiento", "id")
+    )
+    if bodega_id is not None:
+        qs = qs.filter(ubicacion__bodega_id=bodega_id)
+    return qs
+
+
+def resumen_por_bodega(dias=None):
+    """``{bodega_id: {"filas", "cantidad", "primer_vencimiento"}}`` en una consulta."""
+    limite = timezone.localdate() + timedelta(days=dias_aviso() if dias is None else dias)
+    filas = (
+        Stock.objects.using(alias_replica(Stock))
+        .filter(lote__fecha_vencimiento__lte=limite, cantidad_disponible__gt=0)
+        .values("ubicacion__bodega_id")
+        .annotate(filas=Count("id"), cantidad=Sum("cantidad_disponible"), primer_vencimiento=Min("lote__fecha_vencimiento"))
+        .order_by()
+    )
+    return {f.pop("ubicacion__bodega_id"): f for f in filas}
+
+
+@transaction.atomic
+def generar_alertas(dias=None, bodega_ids=None):
+    """
+    Crea las alertas de vencimiento que falten; devuelve cuántas se crearon.
+    ``dias`` reemplaza el horizonte de la regla EXPIRY_SOON.
+    """
+    reglas = _reglas()
+    hoy = timezone.localdate()
+    params = {
+        "vencido_antes_de": hoy - timedelta(days=_dias(reglas[REGLA_VENCIDO])),
+        "limite": hoy + timedelta(days=_dias(reglas[REGLA_POR_VENCER]) if dias is None else dias),
+        "regla_vencido": reglas[REGLA_VENCIDO]["id"],
+        "regla_por_vencer": reglas[REGLA_POR_VENCER]["id"],
+    }
+    filtro = ""
+    if bodega_ids:
+        filtro = "AND u.bodega_id = ANY(%(bodegas)s)"
+        params["bodegas"] = list(bodega_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_ALERTAS.format(filtro=filtro), params)
+        columnas = [c[0] for c in cursor.description]
+        creadas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+    eventos.publicar_varios([
+        {
+            "tipo": "alerta",
+            "alerta_id": a["id"],
+            "severidad": a["severidad"],
+            "mensaje": a["mensaje"],
+            "producto_id": a["producto_id"],
+            "ubicacion_id": a["ubicacion_id"],
+            "creado_en": a["creado_en"],
+        }
+        for a in creadas
+    ])
+    return len(creadas)
+
+
+# -------------------- Cuarentena --------------------
+def ubicacion_cuarentena(bodega_id):
+    codigo = getattr(settings, "VENCIMIENTO_UBICACION_CUARENTENA", "CUARENTENA")
+    ubicacion, _ = Ubicacion.objects.get_or_create(
+        bodega_id=bodega_id,
+        codigo=codigo,
+        defaults={"nombre": "Cuarentena (vencidos)", "pickeable": False, "almacenable": True},
+    )
+    return ubicacion
+
+
+def _mover_lote(stock_ids, destino, usuario):
+    with transaction.atomic():
+        # sólo lo libre: las reservas siguen apuntando a la fila de origen
+        filas = list(
+            Stock.objects.select_for_update()
+            .filter(pk__in=stock_ids, cantidad_disponible__gt=F("cantidad_reservada"))
+            .order_by("id")
+            .values_list(
+                "producto_id", "ubicacion_id", "lote_id", "serie_id", F("cantidad_disponible") - F("cantidad_reservada"),
+            )
+        )
+        lineas = [
+            inventario.LineaMovimiento(
+                producto_id=producto_id,
+                cantidad=cantidad,
+                ubicacion_desde_id=ubicacion_id,
+                ubicacion_hasta_id=destino.pk,
+                lote_id=lote_id,
+                serie_id=serie_id,
+                notas="Cuarentena por vencimiento",
+            )
+            for producto_id, ubicacion_id, lote_id, serie_id, cantidad in filas
+        ]
+        inventario.postear("TRANSFER", lineas, usuario=usuario, tabla_referencia="lotes_producto")
+        return len(lineas)
+
+
+def mover_a_cuarentena(bodega_ids=None, *, lote=5000, usuario=None):
+    """
+    Transfiere a cuarentena el stock libre de lotes ya vencidos que esté en
+    ubicaciones pickeables. Devuelve ``{bodega_id: filas_movidas}``.
+    """
+    hoy = timezone.localdate()
+    vencido = (
+        Stock.objects.using(alias_replica(Stock))
+        .filter(lote__fecha_vencimiento__lt=hoy, cantidad_disponible__gt=F("cantidad_reservada"), ubicacion__pickeable=True)
+        .order_by("ubicacion__bodega_id", "id")
+    )
+    if bodega_ids:
+        vencido = vencido.filter(ubicacion__bodega_id__in=bodega_ids)
+
+    movidos = {}
+    bodega_actual, pendientes, destino = None, [], None
+
+    def vaciar():
+        if not pendientes:
+            return
+        try:
+            movidos[bodega_actual] = movidos.get(bodega_actual, 0) + _mover_lote(list(pendientes), destino, usuario)
+        except ValidationError:
+            logger.exception("No se pudo mover a cuarentena un lote de stock de la bodega %s", bodega_actual)
+        pendientes.clear()
+
+    for stock_id, bodega_id in vencido.values_list("id", "ubicacion__bodega_id").iterator(chunk_size=lote):
+        if bodega_id != bodega_actual:
+            vaciar()
+            bodega_actual, destino = bodega_id, ubicacion_cuarentena(bodega_id)
+        pendientes.append(stock_id)
+        if len(pendientes) >= lote:
+            vaciar()
+    vaciar()
+    return movidos
@@ -0,0 +1,231 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import (
+    Alerta,
+    AtributoProducto,
+    CategoriaProducto,
+    DevolucionProveedor,
+    FacturaProveedor,
+    LineaOrdenCompra,
+    LineaRecepcionMercaderia,
+    LoteProducto,
+    Marca,
+    Notificacion,
+    OrdenCompra,
+    PrecioProducto,
+    Producto,
+    ProductoUsuarioProveedor,
+    RecepcionMercaderia,
+    SerieProducto,
+    Ubicacion,
+)
+from core.services import busqueda, conciliacion, desempeno, escaneo, eventos, numeracion, portal_proveedor, precios, totales
+
+
+# -------------------- Eventos en vivo --------------------
+@receiver(post_save, sender=Alerta)
+def publicar_alerta(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar_varios([eventos.evento_alerta(instance)])
+
+
+@receiver(post_save, sender=Notificacion)
+def publicar_notificacion(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar_varios([eventos.evento_notificacion(instance)])
+
+
+# -------------------- Precio vigente --------------------
+@receiver(post_save, sender=PrecioProducto)
+@receiver(post_delete, sender=PrecioProducto)
+def refrescar_precio_vigente(sender, instance, **kwargs):
+    producto_id = instance.producto_id
+    transaction.on_commit(lambda: precios.refrescar_vigentes([producto_id]))
+
+
+# -------------------- Totales de compras --------------------
+@receiver(post_save, sender=LineaOrdenCompra)
+@receiver(post_delete, sender=LineaOrdenCompra)
+def recalcular_total_orden(sender, instance, **kwargs):
+    totales.programar(orden_id=instance.orden_compra_id)
+    conciliacion.programar(instance.orden_compra_id)
+
+
+@receiver(post_save, sender=OrdenCompra)
+def recalcular_impuesto_orden(sender, instance, update_fields=None, **kwargs):
+    # la tasa de impuesto puede haber cambiado
+    if update_fields is None or "tasa_impuesto" in update_fields:
+        totales.programar(orden_id=instance.pk)
+    if update_fields is None or {"tasa_impuesto", "estado"} & set(update_fields):
+        conciliacion.programar(instance.pk)
+
+
+@receiver(post_save, sender=FacturaProveedor)
+def recalcular_desglose_factura(sender, instance, **kwargs):
+    totales.programar(factura_id=instance.pk)
+
+
+# -------------------- Conciliación de compras --------------------
+@receiver(pre_save, sender=FacturaProveedor)
+@receiver(pre_save, sender=RecepcionMercaderia)
+def recordar_orden_anterior(sender, instance, update_fields=None, **kwargs):
+    # si el documento pasa a otra OC, la anterior también debe reconciliarse
+    instance._orden_compra_anterior = None
+    if instance.pk is None or (update_fields is not None and not {"orden_compra", "orden_compra_id"} & set(update_fields)):
+        return
+    instance._orden_compra_anterior = (
+        sender.objects.filter(pk=instance.pk).values_list("orden_compra_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=FacturaProveedor)
+@receiver(post_delete, sender=FacturaProveedor)
+def reconciliar_por_factura(sender, instance, **kwargs):
+    conciliacion.programar(instance.orden_compra_id)
+    conciliacion.programar(getattr(instance, "_orden_compra_anterior", None))
+
+
+@receiver(post_save, sender=RecepcionMercaderia)
+@receiver(post_delete, sender=RecepcionMercaderia)
+def reconciliar_por_recepcion(sender, instance, **kwargs):
+    # sólo cuentan las recepciones posteadas; basta con reaccionar al cambio de estado
+    conciliacion.programar(instance.orden_compra_id)
+    conciliacion.programar(getattr(instance, "_orden_compra_anterior", None))
+
+
+@receiver(post_save, sender=LineaRecepcionMercaderia)
+@receiver(post_delete, sender=LineaRecepcionMercaderia)
+def reconciliar_por_linea_recepcion(sender, instance, **kwargs):
+    recepcion = RecepcionMercaderia.objects.filter(pk=instance.recepcion_id).values("orden_compra_id", "estado").first()
+    if recepcion and recepcion["estado"] == "POSTED":
+        conciliacion.programar(recepcion["orden_compra_id"])
+
+
+# -------------------- Numeración de documentos --------------------
+@receiver(pre_save, sender=OrdenCompra)
+def numerar_orden_compra(sender, instance, **kwargs):
+    if not instance.numero_orden and instance.bodega_id:
+        instance.numero_orden = numeracion.siguiente_numero("OC", instance.bodega_id)
+
+
+@receiver(pre_save, sender=RecepcionMercaderia)
+def numerar_recepcion(sender, instance, **kwargs):
+    if not instance.numero_recepcion and instance.bodega_id:
+        instance.numero_recepcion = numeracion.siguiente_numero("REC", instance.bodega_id)
+
+
+# -------------------- Portal de proveedores --------------------
+@receiver(post_save, sender=OrdenCompra)
+@receiver(post_delete, sender=OrdenCompra)
+@receiver(post_save, sender=FacturaProveedor)
+@receiver(post_delete, sender=FacturaProveedor)
+@receiver(post_save, sender=DevolucionProveedor)
+@receiver(post_delete, sender=DevolucionProveedor)
+@receiver(post_save, sender=ProductoUsuarioProveedor)
+@receiver(post_delete, sender=ProductoUsuarioProveedor)
+def invalidar_resumen_proveedor(sender, instance, **kwargs):
+    proveedor_id = instance.proveedor_id
+    transaction.on_commit(lambda: portal_proveedor.invalidar(proveedor_id))
+
+
+@receiver(post_save, sender=RecepcionMercaderia)
+@receiver(post_delete, sender=RecepcionMercaderia)
+def invalidar_resumen_por_recepcion(sender, instance, **kwargs):
+    if instance.orden_compra_id is None:
+        return
+    orden_id = instance.orden_compra_id
+
+    def invalidar():
+        proveedor_id = OrdenCompra.objects.filter(pk=orden_id).values_list("proveedor_id", flat=True).first()
+        portal_proveedor.invalidar(proveedor_id)
+
+    transaction.on_commit(invalidar)
+
+
+# -------------------- Desempeño de proveedores --------------------
+@receiver(post_save, sender=RecepcionMercaderia)
+def actualizar_desempeno_proveedor(sender, instance, **kwargs):
+    desempeno.programar_recepcion(instance)
+
+
+# -------------------- Búsqueda de productos --------------------
+@receiver(post_save, sender=Producto)
+def refrescar_busqueda_producto(sender, instance, **kwargs):
+    busqueda.programar(producto_id=instance.pk)
+
+
+@receiver(post_save, sender=ProductoUsuarioProveedor)
+@receiver(post_delete, sender=ProductoUsuarioProveedor)
+def refrescar_busqueda_sku_proveedor(sender, instance, **kwargs):
+    busqueda.programar(producto_id=instance.producto_id)
+
+
+@receiver(post_save, sender=AtributoProducto)
+@receiver(post_delete, sender=AtributoProducto)
+def refrescar_busqueda_atributo(sender, instance, **kwargs):
+    busqueda.programar(producto_id=instance.producto_id)
+
+
+@receiver(post_save, sender=Marca)
+def refrescar_busqueda_marca(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.programar(marca_id=instance.pk)
+
+
+@receiver(post_save, sender=CategoriaProducto)
+def refrescar_busqueda_categoria(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.programar(categoria_id=instance.pk)
+
+
+# -------------------- Índice de escaneo --------------------
+@receiver(post_save, sender=Producto)
+def indexar_escaneo_producto(sender, instance, **kwargs):
+    escaneo.producto_guardado(instance.pk, instance.sku)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_escaneo_producto(sender, instance, **kwargs):
+    escaneo.producto_borrado(instance.pk)
+
+
+@receiver(post_save, sender=ProductoUsuarioProveedor)
+def indexar_escaneo_sku_proveedor(sender, instance, **kwargs):
+    escaneo.sku_proveedor_guardado(instance.producto_id, instance.sku_proveedor)
+
+
+@receiver(post_delete, sender=ProductoUsuarioProveedor)
+def desindexar_escaneo_sku_proveedor(sender, instance, **kwargs):
+    escaneo.sku_proveedor_borrado(instance.producto_id, instance.sku_proveedor)
+
+
+@receiver(post_save, sender=LoteProducto)
+def indexar_escaneo_lote(sender, instance, **kwargs):
+    escaneo.lote_guardado(instance.pk, instance.producto_id, instance.codigo_lote, instance.fecha_vencimiento)
+
+
+@receiver(post_delete, sender=LoteProducto)
+def desindexar_escaneo_lote(sender, instance, **kwargs):
+    escaneo.lote_borrado(instance.pk)
+
+
+@receiver(post_save, sender=SerieProducto)
+def indexar_escaneo_serie(sender, instance, **kwargs):
+    escaneo.serie_guardada(instance.pk, instance.producto_id, instance.numero_serie, instance.lote_id)
+
+
+@receiver(post_delete, sender=SerieProducto)
+def desindexar_escaneo_serie(sender, instance, **kwargs):
+    escaneo.serie_borrada(instance.pk)
+
+
+@receiver(post_save, sender=Ubicacion)
+def indexar_escaneo_ubicacion(sender, instance, **kwargs):
+    escaneo.ubicacion_guardada(instance.pk, instance.bodega_id, instance.codigo)
+
+
+@receiver(post_delete, sender=Ubicacion)
+def desindexar_escaneo_ubicacion(sender, instance, **kwargs):
+    escaneo.ubicacion_borrada(instance.pk)
@@ -0,0 +1,25 @@
+"""
+Tareas que corren en segundo plano (``core.services.trabajos``). Reciben los
+``parametros`` del trabajo como argumentos con nombre y devuelven un resultado
+serializable a JSON.
+"""
+from django.contrib.auth.models import User
+
+from core.models import AjusteInventario
+from core.services import inventario, vencimientos
+from core.services.trabajos import ErrorPermanente, tarea
+
+
+@tarea("postear_ajuste")
+def postear_ajuste(ajuste_id, usuario_id=None):
+    try:
+        ajuste = AjusteInventario.objects.get(pk=ajuste_id)
+    except AjusteInventario.DoesNotExist:
+        raise ErrorPermanente(f"El ajuste {ajuste_id} no existe.")
+    usuario = User.objects.filter(pk=usuario_id).first() if usuario_id else None
+    return inventario.postear_ajuste(ajuste, usuario=usuario)
+
+
+@tarea("revisar_vencimientos")
+def revisar_vencimientos(dias=None, bodega_ids=None):
+    return {"alertas": vencimientos.generar_alertas(dias, bodega_ids)}
@@ -0,0 +1,54 @@
+"""
+Utilidades para tests.
+
+``dentro_de_presupuesto`` falla si el bloque ejecuta más consultas o más
+tiempo de base de datos que lo permitido; ``PresupuestoVistaMixin`` lo aplica
+a una vista con el presupuesto configurado en ``INSTRUMENTACION_PRESUPUESTOS``::
+
+    class DashboardTests(PresupuestoVistaMixin, TestCase):
+        def test_presupuesto(self):
+            self.client.force_login(self.usuario)
+            self.assertVistaDentroDePresupuesto("dashboard")
+"""
+from contextlib import contextmanager
+
+from django.urls import reverse
+
+from core import instrumentacion
+
+_SIN_DEFINIR = object()
+
+
+@contextmanager
+def dentro_de_presupuesto(consultas=_SIN_DEFINIR, ms_db=_SIN_DEFINIR, *, vista=None):
+    """
+    Sin límites explícitos usa el presupuesto de ``vista`` (o los máximos
+    generales); ``None`` desactiva un límite.
+    """
+    limites = instrumentacion.presupuesto(vista)
+    if consultas is not _SIN_DEFINIR:
+        limites["consultas"] = consultas
+    if ms_db is not _SIN_DEFINIR:
+        limites["ms_db"] = ms_db
+    with instrumentacion.medir() as medicion:
+        yield medicion
+    superados = instrumentacion.excesos(medicion, limites)
+    if superados:
+        detalle = "\n".join(f"  {s['ms']:>8.2f} ms  {s['sql']}" for s in medicion.sentencias_lentas())
+        raise AssertionError(
+            f"{vista or 'El bloque'} excede su presupuesto: {'; '.join(superados)}.\n"
+            f"Sentencias más lentas:\n{detalle}"
+        )
+
+
+class PresupuestoVistaMixin:
+    """Para ``django.test.TestCase``: usa ``self.client``."""
+
+    def assertVistaDentroDePresupuesto(self, nombre, *args, metodo="get", datos=None, kwargs=None, **limites):
+        url = reverse(nombre, args=args, kwargs=kwargs)
+        with dentro_de_presupuesto(vista=nombre, **limites):
+            respuesta = getattr(self.client, metodo)(url, datos)
+            if respuesta.streaming:
+                # el cuerpo en streaming también consulta la base
+                b"".join(respuesta.streaming_content)
+        return respuesta
@@ -1,3 +1,1407 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import (
+    Alerta, AtributoProducto, BitacoraAuditoria, Bodega, CapaCosto, ConciliacionOrdenCompra, ContadorNotificaciones,
+    DefinicionAtributo, DesempenoProveedorProducto, DocumentoBusquedaProducto, FacturaProveedor, IndicadorBodega,
+    LineaOrdenCompra, LineaRecepcionMercaderia, LoteProducto, Notificacion, OrdenCompra, PrecioProducto,
+    PrecioVigente, Producto, ProductoUsuarioProveedor, RecepcionMercaderia, ReglaAlerta, SerieDocumento,
+    SerieProducto, Stock, Sucursal, TasaImpuesto, Trabajo, Ubicacion, UnidadMedida, UsuarioPerfil,
+    ValorizacionInventario,
+)
+from core import instrumentacion, perfilado, routers, views
+from core.apps import preparar_servidor
+from core.asgi import ManejadorASGI
+from core.services import (
+    archivo,
+    auditoria,
+    busqueda,
+    desempeno,
+    escaneo,
+    eventos,
+    indicadores,
+    inventario,
+    notificaciones,
+    numeracion,
+    portal_proveedor,
+    precios,
+    totales,
+    trabajos,
+    validacion,
+    vencimientos,
+)
+from core.services.inventario import LineaMovimiento
+from core.testing import PresupuestoVistaMixin
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "La numeración usa secuencias de PostgreSQL.")
+class NumeracionConcurrenteTests(TransactionTestCase):
+    HILOS = 16
+    POR_HILO = 10
+
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.proveedor = User.objects.create(username="proveedor")
+        UsuarioPerfil.objects.filter(usuario=self.proveedor).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+
+    def _en_paralelo(self, trabajo):
+        errores = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def correr():
+            try:
+                barrera.wait()
+                trabajo()
+            except Exception as exc:  # se reporta en el hilo principal
+                errores.append(exc)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=correr) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+
+    def test_creadores_concurrentes_no_repiten_numero(self):
+        def crear():
+            for _ in range(self.POR_HILO):
+                OrdenCompra.objects.create(proveedor=self.proveedor, bodega=self.bodega)
+
+        self._en_paralelo(crear)
+        numeros = list(OrdenCompra.objects.values_list("numero_orden", flat=True))
+        self.assertEqual(len(numeros), self.HILOS * self.POR_HILO)
+        self.assertEqual(len(set(numeros)), len(numeros))
+
+    def test_bloques_concurrentes_son_disjuntos(self):
+        SerieDocumento.objects.create(tipo="REC", bodega=self.bodega, prefijo="REC-B1-", relleno=4, reinicio_anual=False)
+        bloques = []
+
+        def reservar():
+            bloques.append(numeracion.reservar_bloque("REC", self.bodega.pk, 25))
+
+        self._en_paralelo(reservar)
+        numeros = [n for bloque in bloques for n in bloque]
+        self.assertEqual(len(set(numeros)), self.HILOS * 25)
+        self.assertTrue(all(n.startswith("REC-B1-") and len(n) == len("REC-B1-") + 4 for n in numeros))
+
+
+class InstrumentacionTests(PresupuestoVistaMixin, TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.client.force_login(User.objects.create_superuser("admin", password="x"))
+        instrumentacion.reiniciar()
+
+    def test_dashboard_dentro_de_presupuesto(self):
+        self.assertVistaDentroDePresupuesto("dashboard")
+        metricas = self.client.get("/metricas/").content.decode()
+        self.assertIn('bodega_peticion_consultas_count{vista="dashboard"} 1', metricas)
+
+    def test_falla_si_excede_el_presupuesto(self):
+        with self.assertRaisesMessage(AssertionError, "excede su presupuesto"):
+            self.assertVistaDentroDePresupuesto("dashboard", consultas=1)
+
+
+class ReplicaStickinessMiddlewareTests(SimpleTestCase):
+    def test_async_no_adapta_la_vista_y_propaga_la_escritura(self):
+        async def vista(request):
+            # el ORM escribe en el hilo de sync_to_async
+            await sync_to_async(routers.marcar_escritura)()
+            return HttpResponse()
+
+        middleware = routers.ReplicaStickinessMiddleware(vista)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with mock.patch.object(routers, "alias_replicas", return_value=["replica"]):
+            respuesta = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertIn(routers.COOKIE_PEGADO, respuesta.cookies)
+
+
+class LecturasEnReplicaTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(routers, "alias_replicas", return_value=["replica"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # las escrituras de tests anteriores dejan marcado este hilo como recién escrito
+        token = routers._primario_hasta.set(0.0)
+        self.addCleanup(routers._primario_hasta.reset, token)
+
+    def test_listados_y_vencimientos_usan_la_replica(self):
+        proveedor = User(pk=1)
+        for consulta in (
+            portal_proveedor.ordenes, portal_proveedor.ordenes_abiertas, portal_proveedor.recepciones,
+            portal_proveedor.facturas, portal_proveedor.devoluciones, portal_proveedor.productos,
+        ):
+            with self.subTest(consulta.__name__):
+                self.assertEqual(consulta(proveedor).db, "replica")
+        self.assertEqual(vencimientos.stock_por_vencer(dias=10).db, "replica")
+        self.assertEqual(routers.alias_replica(ReglaAlerta), "replica")
+
+    def test_quien_acaba_de_escribir_lee_de_la_primaria(self):
+        def tras_escribir():
+            routers.marcar_escritura()
+            return portal_proveedor.ordenes(User(pk=1)).db, vencimientos.stock_por_vencer(dias=10).db
+
+        # en un contexto aparte: la marca de escritura no pasa a otros tests
+        self.assertEqual(contextvars.copy_context().run(tras_escribir), ("default", "default"))
+
+
+@override_settings(EVENTOS_LONG_POLL=30, EVENTOS_LATIDO=30)
+class EventosSinHiloPorClienteTests(TransactionTestCase):
+    """Clientes SSE y long-poll contra el handler ASGI real, no el cliente de tests."""
+    CLIENTES = 20
+
+    def setUp(self):
+        user = User.objects.create_user("eventos", password="x")
+        sesion = SessionStore()
+        sesion.update({
+            SESSION_KEY: str(user.pk),
+            BACKEND_SESSION_KEY: "django.contrib.auth.backends.ModelBackend",
+            HASH_SESSION_KEY: user.get_session_auth_hash(),
+        })
+        sesion.create()
+        self.cookie = f"sessionid={sesion.session_key}".encode()
+
+    async def _cliente(self, app, ruta, conectado, cortar):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": ruta, "root_path": "", "query_string": b"", "server": ("testserver", 80),
+            "client": ("127.0.0.1", 1000), "headers": [(b"host", b"testserver"), (b"cookie", self.cookie)],
+        }
+        pedido = False
+
+        async def receive():
+            nonlocal pedido
+            if not pedido:
+                pedido = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await cortar.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(mensaje):
+            if mensaje["type"] == "http.response.body" and mensaje.get("body"):
+                conectado.release()
+
+        await app(scope, receive, send)
+
+    async def _conectar(self):
+        app, cortar, base = ManejadorASGI(), asyncio.Event(), threading.active_count()
+        streams = asyncio.Semaphore(0)
+        tareas = [asyncio.create_task(self._cliente(app, "/eventos/stream/", streams, cortar)) for _ in range(self.CLIENTES)]
+        tareas += [asyncio.create_task(self._cliente(app, "/eventos/poll/", streams, cortar)) for _ in range(self.CLIENTES)]
+        try:
+            for _ in range(self.CLIENTES):
+                await asyncio.wait_for(streams.acquire(), 30)
+            while eventos.broker.conectados < 2 * self.CLIENTES:
+                await asyncio.sleep(0.05)
+            return base, threading.active_count(), eventos.broker.conectados
+        finally:
+            cortar.set()
+            await asyncio.gather(*tareas, return_exceptions=True)
+
+    def test_clientes_en_espera_no_retienen_hilos(self):
+        base, durante, conectados = asyncio.run(self._conectar())
+        self.assertEqual(conectados, 2 * self.CLIENTES)
+        # las consultas usan el pool por defecto del loop (tamaño documentado de
+        # ThreadPoolExecutor) más el hilo único de asgiref: no crece con los clientes
+        pool = min(32, (os.cpu_count() or 1) + 4)
+        self.assertLessEqual(durante, base + pool + 1)
+        self.assertLess(pool + 1, 2 * self.CLIENTES)
+
+
+class EventosIdsTests(TransactionTestCase):
+    HILOS = 8
+    POR_LOTE = 5
+
+    def _publicar_en_paralelo(self):
+        barrera = threading.Barrier(self.HILOS)
+
+        def publicar(hilo):
+            try:
+                barrera.wait()
+                eventos._enviar([{"tipo": "alerta", "hilo": hilo, "n": n} for n in range(self.POR_LOTE)])
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=publicar, args=(h,)) for h in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+    @override_settings(EVENTOS_BACKEND="postgres")
+    def test_ids_postgres_crecen_en_orden_de_entrega(self):
+        oyente = connections.create_connection("default")
+        try:
+            oyente.ensure_connection()
+            oyente.set_autocommit(True)
+            with oyente.connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {eventos.CANAL_POSTGRES}")
+            self._publicar_en_paralelo()
+            recibidos = []
+            while len(recibidos) < self.HILOS * self.POR_LOTE:
+                avisos = eventos._leer_avisos(oyente.connection, 5)
+                self.assertTrue(avisos, "no llegaron todos los avisos")
+                recibidos += [json.loads(aviso.payload) for aviso in avisos]
+        finally:
+            oyente.close()
+        ids = [e["id"] for e in recibidos]
+        self.assertEqual(ids, sorted(set(ids)))
+        # cada lote llega junto y en su orden
+        for i in range(0, len(recibidos), self.POR_LOTE):
+            lote = recibidos[i:i + self.POR_LOTE]
+            self.assertEqual({e["hilo"] for e in lote}, {lote[0]["hilo"]})
+            self.assertEqual([e["n"] for e in lote], list(range(self.POR_LOTE)))
+
+    def test_ids_locales_siguen_el_orden_del_historial(self):
+        broker = eventos.Broker()
+        with mock.patch.object(eventos, "broker", broker):
+            self._publicar_en_paralelo()
+            historial = broker.desde(0)
+            ids = [e["id"] for e in historial]
+            self.assertEqual(len(ids), self.HILOS * self.POR_LOTE)
+            self.assertEqual(ids, sorted(set(ids)))
+            self.assertEqual(broker.desde(ids[9]), historial[10:])
+
+
+class CosteoTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.b1 = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.b2 = Bodega.objects.create(sucursal=sucursal, codigo="B2", nombre="Bodega 2")
+        self.u1 = Ubicacion.objects.create(bodega=self.b1, codigo="U1")
+        self.u1b = Ubicacion.objects.create(bodega=self.b1, codigo="U1B")
+        self.u2 = Ubicacion.objects.create(bodega=self.b2, codigo="U2")
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.producto = Producto.objects.create(sku="P1", nombre="Producto 1", unidad_base=unidad)
+
+    def _entrada(self, cantidad, costo, ubicacion=None):
+        inventario.postear("IN", [LineaMovimiento(
+            self.producto.pk, Decimal(cantidad), ubicacion_hasta_id=(ubicacion or self.u1).pk, costo_unitario=Decimal(costo),
+        )])
+
+    def _valorizacion(self, bodega):
+        return ValorizacionInventario.objects.get(producto=self.producto, bodega=bodega)
+
+    def test_promedio_ponderado(self):
+        self._entrada(10, 100)
+        self._entrada(10, 200)
+        salida, = inventario.postear("OUT", [LineaMovimiento(self.producto.pk, Decimal(5), ubicacion_desde_id=self.u1.pk)])
+        self.assertEqual(salida.costo_unitario, Decimal(150))
+        val = self._valorizacion(self.b1)
+        self.assertEqual((val.cantidad, val.valor_total, val.costo_promedio), (15, 2250, 150))
+
+    @override_settings(COSTEO_METODO="FIFO")
+    def test_fifo_consume_las_capas_mas_antiguas(self):
+        self._entrada(10, 100)
+        self._entrada(10, 200)
+        salida, = inventario.postear("OUT", [LineaMovimiento(self.producto.pk, Decimal(15), ubicacion_desde_id=self.u1.pk)])
+        self.assertEqual(salida.costo_unitario, Decimal("133.333333"))
+        restantes = list(CapaCosto.objects.filter(cantidad_restante__gt=0).values_list("cantidad_restante", "costo_unitario"))
+        self.assertEqual(restantes, [(5, 200)])
+        self.assertEqual(self._valorizacion(self.b1).valor_total, 1000)
+
+    def test_transferencia_lleva_el_costo_de_origen(self):
+        self._entrada(10, 100)
+        self._entrada(10, 200)
+        inventario.postear("TRANSFER", [LineaMovimiento(
+            self.producto.pk, Decimal(4), ubicacion_desde_id=self.u1.pk, ubicacion_hasta_id=self.u2.pk,
+        )])
+        origen, destino = self._valorizacion(self.b1), self._valorizacion(self.b2)
+        self.assertEqual((origen.cantidad, origen.valor_total), (16, 2400))
+        self.assertEqual((destino.cantidad, destino.valor_total, destino.costo_promedio), (4, 600, 150))
+
+        # dentro de la misma bodega el valor no cambia
+        inventario.postear("TRANSFER", [LineaMovimiento(
+            self.producto.pk, Decimal(6), ubicacion_desde_id=self.u1.pk, ubicacion_hasta_id=self.u1b.pk,
+        )])
+        origen = self._valorizacion(self.b1)
+        self.assertEqual((origen.cantidad, origen.valor_total), (16, 2400))
+
+    def test_salida_no_toma_stock_reservado(self):
+        self._entrada(10, 100)
+        inventario.reservar(self.producto.pk, self.u1.pk, Decimal(8))
+        with self.assertRaisesMessage(ValidationError, "faltan 1"):
+            inventario.postear("OUT", [LineaMovimiento(self.producto.pk, Decimal(3), ubicacion_desde_id=self.u1.pk)])
+        inventario.postear("OUT", [LineaMovimiento(self.producto.pk, Decimal(2), ubicacion_desde_id=self.u1.pk)])
+        self.assertEqual(Stock.objects.get(producto=self.producto, ubicacion=self.u1).cantidad_disponible, 8)
+
+    def _valorizar_existente(self, fifo):
+        migracion = importlib.import_module("core.migrations.0018_valorizacion_inicial")
+        with connection.cursor() as cursor:
+            cursor.execute(migracion.VALORIZAR_EXISTENTE, {"fifo": fifo})
+
+    @override_settings(COSTEO_METODO="FIFO")
+    def test_valoriza_el_stock_previo_al_costeo(self):
+        # stock cargado sin pasar por postear (anterior a 0004) y una entrada ya costeada
+        Stock.objects.create(producto=self.producto, ubicacion=self.u1, cantidad_disponible=6)
+        Stock.objects.create(producto=self.producto, ubicacion=self.u2, cantidad_disponible=3)
+        self._entrada(4, 50, self.u1)
+        self._valorizar_existente(fifo=True)
+        b1, b2 = self._valorizacion(self.b1), self._valorizacion(self.b2)
+        self.assertEqual((b1.cantidad, b1.valor_total, b1.costo_promedio), (10, 500, 50))
+        self.assertEqual((b2.cantidad, b2.valor_total), (3, 150))
+        capas = CapaCosto.objects.filter(bodega=self.b1).order_by("fecha")
+        self.assertEqual([(c.movimiento_id is None, c.cantidad_restante) for c in capas], [(True, 6), (False, 4)])
+        # una segunda pasada no encuentra diferencias
+        self._valorizar_existente(fifo=True)
+        self.assertEqual(CapaCosto.objects.count(), 3)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Prueba bloqueos de fila de PostgreSQL.")
+class BloqueoStockTests(TransactionTestCase):
+    def test_solo_bloquea_las_claves_del_posteo(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        p1, p2 = (Producto.objects.create(sku=f"P{n}", nombre=f"P{n}", unidad_base=unidad) for n in (1, 2))
+        u1, u2 = (Ubicacion.objects.create(bodega=bodega, codigo=f"U{n}") for n in (1, 2))
+        cruzado = Stock.objects.create(producto=p1, ubicacion=u2)
+        resultado = []
+
+        def tomar_cruzado():
+            try:
+                with transaction.atomic():
+                    # NOWAIT: falla de inmediato si la fila ya está bloqueada
+                    resultado.append(len(Stock.objects.select_for_update(nowait=True).filter(pk=cruzado.pk)))
+            except DatabaseError as exc:
+                resultado.append(exc)
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            inventario._bloquear_stock({(p1.pk, u1.pk, None, None), (p2.pk, u2.pk, None, None)})
+            hilo = threading.Thread(target=tomar_cruzado)
+            hilo.start()
+            hilo.join()
+        self.assertEqual(resultado, [1])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Los triggers de rol son de PostgreSQL.")
+class RolProveedorTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.proveedor = User.objects.create(username="proveedor")
+        self.otro = User.objects.create(username="bodeguero")
+        UsuarioPerfil.objects.filter(usuario=self.proveedor).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+
+    def _verificar_diferidos(self):
+        # el trigger de usuarios_perfil es diferido: forzarlo sin esperar al commit
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def test_no_permite_quitar_el_rol_a_un_proveedor_con_ordenes(self):
+        OrdenCompra.objects.create(proveedor=self.proveedor, bodega=self.bodega)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UsuarioPerfil.objects.filter(usuario=self.proveedor).update(rol=UsuarioPerfil.Rol.BODEGUERO)
+            self._verificar_diferidos()
+
+    def test_permite_quitar_el_rol_sin_registros_y_borrar_en_cascada(self):
+        OrdenCompra.objects.create(proveedor=self.proveedor, bodega=self.bodega)
+        self.proveedor.delete()
+        self._verificar_diferidos()
+        self.assertFalse(OrdenCompra.objects.exists())
+
+    def test_validar_proveedores_en_una_consulta(self):
+        ordenes = [OrdenCompra(proveedor=self.proveedor, bodega=self.bodega) for _ in range(5)]
+        with self.assertNumQueries(1):
+            validacion.validar_proveedores(ordenes)
+        self.assertTrue(all(o._proveedor_validado == self.proveedor.pk for o in ordenes))
+        with self.assertRaises(ValidationError) as error, self.assertNumQueries(1):
+            validacion.validar_proveedores(ordenes + [OrdenCompra(proveedor=self.otro, bodega=self.bodega)])
+        self.assertEqual(list(error.exception.message_dict), ["5.proveedor"])
+
+
+class ConciliacionTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.proveedor = User.objects.create(username="proveedor")
+        UsuarioPerfil.objects.filter(usuario=self.proveedor).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+        self.unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.producto = Producto.objects.create(sku="P1", nombre="Producto 1", unidad_base=self.unidad)
+        self.tasa = TasaImpuesto.objects.create(nombre="IVA", porcentaje=Decimal(19))
+
+    def _orden(self, cantidad=10, precio=100, descuento=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            orden = OrdenCompra.objects.create(
+                proveedor=self.proveedor, bodega=self.bodega, tasa_impuesto=self.tasa, estado="APPROVED",
+            )
+            LineaOrdenCompra.objects.create(
+                orden_compra=orden, producto=self.producto, unidad=self.unidad,
+                cantidad_pedida=Decimal(cantidad), precio=Decimal(precio), descuento_pct=Decimal(descuento),
+            )
+        return orden
+
+    def _recibir(self, orden, cantidad, estado="POSTED"):
+        with self.captureOnCommitCallbacks(execute=True):
+            recepcion = RecepcionMercaderia.objects.create(orden_compra=orden, bodega=self.bodega, estado=estado)
+            LineaRecepcionMercaderia.objects.create(
+                recepcion=recepcion, producto=self.producto, cantidad_recibida=Decimal(cantidad),
+            )
+        return recepcion
+
+    def _facturar(self, orden, monto):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FacturaProveedor.objects.create(
+                proveedor=self.proveedor, orden_compra=orden, numero_factura=f"F-{FacturaProveedor.objects.count()}",
+                tasa_impuesto=self.tasa, monto_total=Decimal(monto), fecha_factura=date.today(),
+            )
+
+    def _estado(self, orden):
+        return ConciliacionOrdenCompra.objects.get(orden_compra=orden)
+
+    def test_estados_del_match_de_tres_vias(self):
+        orden = self._orden(cantidad=10, precio=100, descuento=10)
+        conciliada = self._estado(orden)
+        self.assertEqual(conciliada.estado, "PENDIENTE_RECEPCION")
+        # neto 900, con 19 % de impuesto
+        self.assertEqual((conciliada.monto_pedido, conciliada.monto_recibido), (Decimal("1071"), 0))
+
+        self._recibir(orden, 10)
+        conciliada = self._estado(orden)
+        self.assertEqual((conciliada.estado, conciliada.cantidad_recibida), ("PENDIENTE_FACTURA", 10))
+        self.assertEqual(conciliada.monto_recibido, Decimal("1071"))
+
+        self._facturar(orden, "1071")
+        conciliada = self._estado(orden)
+        self.assertEqual((conciliada.estado, conciliada.diferencia), ("OK", 0))
+
+        self._facturar(orden, "100")
+        conciliada = self._estado(orden)
+        self.assertEqual((conciliada.estado, conciliada.diferencia), ("DIFERENCIA", Decimal("100")))
+
+    def test_tolerancia_y_recepciones_no_posteadas(self):
+        orden = self._orden(cantidad=100, precio=10)
+        self._recibir(orden, 100, estado="OPEN")
+        self.assertEqual(self._estado(orden).cantidad_recibida, 0)
+        self._recibir(orden, 99)
+        # 1 % por debajo de lo pedido y facturado 1 % por encima: dentro del 2 %
+        self._facturar(orden, "1190")
+        self.assertEqual(self._estado(orden).estado, "OK")
+        # 103 recibidas: más del 2 % sobre lo pedido
+        self._recibir(orden, 4)
+        self.assertEqual(self._estado(orden).estado, "DIFERENCIA")
+
+    def test_linea_agregada_a_recepcion_posteada_reconcilia(self):
+        orden = self._orden(cantidad=10)
+        recepcion = self._recibir(orden, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            LineaRecepcionMercaderia.objects.create(
+                recepcion=recepcion, producto=self.producto, cantidad_recibida=Decimal(6),
+            )
+        self.assertEqual(self._estado(orden).cantidad_recibida, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            recepcion.lineas.filter(cantidad_recibida=6).delete()
+        self.assertEqual(self._estado(orden).cantidad_recibida, 4)
+
+    def test_factura_reasignada_reconcilia_ambas_ordenes(self):
+        primera, segunda = self._orden(), self._orden()
+        factura = self._facturar(primera, "500")
+        self.assertEqual(self._estado(primera).monto_facturado, 500)
+        factura.orden_compra = segunda
+        with self.captureOnCommitCallbacks(execute=True):
+            factura.save()
+        self.assertEqual((self._estado(primera).monto_facturado, self._estado(segunda).monto_facturado), (0, 500))
+
+    def test_orden_anulada_pierde_su_conciliacion(self):
+        orden = self._orden()
+        orden.estado = "CANCELED"
+        with self.captureOnCommitCallbacks(execute=True):
+            orden.save(update_fields=["estado"])
+        self.assertFalse(ConciliacionOrdenCompra.objects.filter(orden_compra=orden).exists())
+
+
+class VencimientosTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.ubicacion = Ubicacion.objects.create(bodega=self.bodega, codigo="U1")
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.producto = Producto.objects.create(sku="P1", nombre="Producto 1", unidad_base=unidad)
+
+    def _stock(self, vence_en_dias, cantidad=10):
+        lote = LoteProducto.objects.create(
+            producto=self.producto, codigo_lote=f"L{vence_en_dias}",
+            fecha_vencimiento=timezone.localdate() + timedelta(days=vence_en_dias),
+        )
+        inventario.postear("IN", [LineaMovimiento(
+            self.producto.pk, Decimal(cantidad), ubicacion_hasta_id=self.ubicacion.pk, lote_id=lote.pk,
+            costo_unitario=Decimal(1),
+        )])
+        return lote
+
+    def _dias_regla(self, codigo, dias):
+        regla = ReglaAlerta.objects.get(codigo=codigo)
+        regla.configuracion = {**regla.configuracion, "dias": dias}
+        regla.save()
+
+    def test_el_horizonte_es_el_de_la_regla(self):
+        self._stock(20)
+        self._dias_regla(vencimientos.REGLA_POR_VENCER, 10)
+        self.assertEqual(vencimientos.dias_aviso(), 10)
+        self.assertFalse(vencimientos.stock_por_vencer().exists())
+        self.assertEqual(vencimientos.generar_alertas(), 0)
+
+        self._dias_regla(vencimientos.REGLA_POR_VENCER, 30)
+        self.assertEqual(vencimientos.stock_por_vencer().count(), 1)
+        self.assertEqual(vencimientos.generar_alertas(), 1)
+        self.assertEqual(Alerta.objects.get().severidad, "WARN")
+        # la alerta abierta no se repite
+        self.assertEqual(vencimientos.generar_alertas(), 0)
+
+    def test_vencido_es_critico_pasados_los_dias_de_gracia(self):
+        self._stock(-2)
+        self._dias_regla(vencimientos.REGLA_VENCIDO, 5)
+        vencimientos.generar_alertas()
+        self.assertEqual(Alerta.objects.get().regla.codigo, vencimientos.REGLA_POR_VENCER)
+
+        self._dias_regla(vencimientos.REGLA_VENCIDO, 0)
+        vencimientos.generar_alertas()
+        self.assertEqual(Alerta.objects.get(severidad="CRITICAL").regla.codigo, vencimientos.REGLA_VENCIDO)
+
+    def test_cuarentena_mueve_solo_lo_libre(self):
+        lote = self._stock(-1)
+        reserva = inventario.reservar(self.producto.pk, self.ubicacion.pk, Decimal(4), lote_id=lote.pk)
+
+        movidos = vencimientos.mover_a_cuarentena()
+        self.assertEqual(movidos, {self.bodega.pk: 1})
+        origen = Stock.objects.get(ubicacion=self.ubicacion, lote=lote)
+        self.assertEqual((origen.cantidad_disponible, origen.cantidad_reservada), (4, 4))
+        cuarentena = Stock.objects.get(ubicacion=vencimientos.ubicacion_cuarentena(self.bodega.pk), lote=lote)
+        self.assertEqual((cuarentena.cantidad_disponible, cuarentena.cantidad_reservada), (6, 0))
+
+        # lo reservado sigue en origen: liberar la reserva lo deja libre allí
+        self.assertEqual(vencimientos.mover_a_cuarentena(), {})
+        inventario.liberar_reserva(reserva)
+        self.assertEqual(vencimientos.mover_a_cuarentena(), {self.bodega.pk: 1})
+        self.assertFalse(Stock.objects.filter(ubicacion=self.ubicacion, cantidad_disponible__gt=0).exists())
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "El documento de búsqueda usa tsvector.")
+class DocumentoBusquedaTests(TestCase):
+    def test_incluye_atributos_de_texto(self):
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        producto = Producto.objects.create(sku="P1", nombre="Polera", unidad_base=unidad)
+        color = DefinicionAtributo.objects.create(codigo="COLOR", nombre="Color", tipo_dato="TEXT")
+        with self.captureOnCommitCallbacks(execute=True):
+            atributo = AtributoProducto.objects.create(producto=producto, atributo=color, valor_texto="Burdeo")
+        documento = DocumentoBusquedaProducto.objects.get(producto=producto)
+        self.assertIn("burdeo", documento.texto)
+        with self.captureOnCommitCallbacks(execute=True):
+            atributo.delete()
+        documento.refresh_from_db()
+        self.assertNotIn("burdeo", documento.texto)
+
+    def _productos(self, skus, activo=True):
+        unidad, _ = UnidadMedida.objects.get_or_create(codigo="EA", defaults={"descripcion": "Unidad"})
+        with self.captureOnCommitCallbacks(execute=True):
+            return [Producto.objects.create(sku=sku, nombre="Taladro", unidad_base=unidad, activo=activo) for sku in skus]
+
+    def test_sku_exacto_no_queda_fuera_del_tope_de_candidatos(self):
+        # creados antes que el exacto: un LIMIT sin orden los tomaría primero
+        self._productos([f"AB1-{i}" for i in range(5)])
+        exacto, = self._productos(["AB1"])
+        with mock.patch.object(busqueda, "MAX_CANDIDATOS", 2):
+            resultados = busqueda.buscar("ab1")
+        self.assertEqual(resultados[0]["id"], exacto.pk)
+        self.assertEqual(len(resultados), 3)
+
+    def test_inactivos_no_ocupan_el_tope_de_candidatos(self):
+        self._productos([f"TAL-{i}" for i in range(5)], activo=False)
+        activo, = self._productos(["TAL-9"])
+        with mock.patch.object(busqueda, "MAX_CANDIDATOS", 2):
+            self.assertEqual([r["id"] for r in busqueda.buscar("tal")], [activo.pk])
+            self.assertEqual(len(busqueda.buscar("tal", solo_activos=False)), 2)
+
+    def test_la_migracion_genera_los_documentos_existentes(self):
+        producto, = self._productos(["MIG-1"])
+        DocumentoBusquedaProducto.objects.all().delete()
+        migracion = importlib.import_module("core.migrations.0012_busqueda_productos")
+        with connection.cursor() as cursor:
+            cursor.execute(migracion.POBLAR_DOCUMENTOS)
+        self.assertIn("mig-1", DocumentoBusquedaProducto.objects.get(producto=producto).texto)
+
+
+class ParsearGS1Tests(SimpleTestCase):
+    def test_fnc1_con_prefijo_de_simbologia(self):
+        self.assertEqual(
+            escaneo.parsear_gs1("]d20107801234567891" "17251231" "10L-01\x1d" "21S/123"),
+            {"01": "07801234567891", "17": "251231", "10": "L-01", "21": "S/123"},
+        )
+
+    def test_forma_legible(self):
+        self.assertEqual(
+            escaneo.parsear_gs1("(01)07801234567891(10)L-01(21)S123"),
+            {"01": "07801234567891", "10": "L-01", "21": "S123"},
+        )
+
+    def test_codigo_simple_no_es_gs1(self):
+        self.assertIsNone(escaneo.parsear_gs1("ABX-1234"))
+
+    def test_dia_00_es_el_ultimo_del_mes(self):
+        self.assertEqual(escaneo._fecha_gs1("240200"), date(2024, 2, 29))
+        self.assertEqual(escaneo._fecha_gs1("251200"), date(2025, 12, 31))
+        self.assertIsNone(escaneo._fecha_gs1("251399"))
+
+
+@override_settings(ESCANEO_TTL=300)
+class ResolverEscaneoTests(TestCase):
+    def setUp(self):
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.p1 = Producto.objects.create(sku="07801234567891", nombre="P1", unidad_base=unidad)
+        self.p2 = Producto.objects.create(sku="P2", nombre="P2", unidad_base=unidad)
+        self.lote = LoteProducto.objects.create(producto=self.p1, codigo_lote="L-01", fecha_vencimiento=date(2030, 1, 1))
+        self.s1 = SerieProducto.objects.create(producto=self.p1, numero_serie="SN1", lote=self.lote)
+        self.s2 = SerieProducto.objects.create(producto=self.p2, numero_serie="SN1")
+        patcher = mock.patch.object(escaneo, "_indice", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        escaneo.calentar()
+
+    def test_serie_repetida_entre_productos(self):
+        resultado = escaneo.resolver("sn1")
+        self.assertEqual((resultado["tipo"], resultado["serie_id"], resultado["ambiguo"]), ("serie", self.s1.pk, True))
+        resultado = escaneo.resolver("(01)07801234567891(10)L-01(21)SN1")
+        self.assertEqual(
+            (resultado["tipo"], resultado["producto_id"], resultado["serie_id"], resultado["lote_id"]),
+            ("serie", self.p1.pk, self.s1.pk, self.lote.pk),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.s2.delete()
+        resultado = escaneo.resolver("SN1")
+        self.assertEqual((resultado["serie_id"], resultado["ambiguo"]), (self.s1.pk, False))
+
+    def test_codigo_desconocido_consulta_una_vez(self):
+        self.assertIsNone(escaneo.resolver("NO-EXISTE")["tipo"])
+        with self.assertNumQueries(0):
+            self.assertIsNone(escaneo.resolver("no-existe")["tipo"])
+
+    @override_settings(ESCANEO_TTL=0)
+    def test_sin_ttl_no_recuerda_desconocidos(self):
+        escaneo.resolver("NO-EXISTE")
+        with self.assertNumQueries(4):
+            escaneo.resolver("NO-EXISTE")
+
+    def test_las_altas_esperan_el_lock_del_indice(self):
+        idx = escaneo.indice()
+        hilo = threading.Thread(target=idx.agregar_serie, args=(10**9, self.p2.pk, "SN9", None))
+        with idx.lock:
+            hilo.start()
+            hilo.join(0.2)
+            self.assertTrue(hilo.is_alive())
+            self.assertNotIn("SN9", idx.series_por_numero)
+        hilo.join()
+        self.assertEqual(escaneo.resolver("SN9")["producto_id"], self.p2.pk)
+
+    def test_resolver_mientras_otro_hilo_modifica_el_indice(self):
+        idx, errores, parar = escaneo.indice(), [], threading.Event()
+
+        def modificar():
+            i = 0
+            while not parar.is_set():
+                serie_id = 10**9 + i % 50
+                idx.agregar_serie(serie_id, self.p2.pk, "SN1", None)
+                idx.agregar_lote(serie_id, self.p2.pk, "L-01", None)
+                idx.quitar_serie(serie_id)
+                idx.quitar_lote(serie_id)
+                i += 1
+
+        hilo = threading.Thread(target=modificar)
+        hilo.start()
+        try:
+            for _ in range(2000):
+                try:
+                    escaneo.resolver("SN1")
+                    escaneo.resolver("L-01")
+                except Exception as exc:  # se reporta abajo
+                    errores.append(exc)
+        finally:
+            parar.set()
+            hilo.join()
+        self.assertEqual(errores, [])
+
+    def test_los_procesos_web_precalientan_por_defecto(self):
+        with mock.patch.object(escaneo, "precalentar_en_segundo_plano") as precalentar:
+            preparar_servidor()
+        precalentar.assert_called_once_with()
+
+
+class CuerpoStreamingTests(SimpleTestCase):
+    def test_asgi_consume_el_generador_por_trozos(self):
+        generados, cerrado = [], []
+
+        def contenido():
+            try:
+                for n in range(10):
+                    generados.append(n)
+                    yield f"{n}\n"
+            finally:
+                cerrado.append(True)
+
+        cuerpo = views._cuerpo_streaming(AsyncRequestFactory().get("/"), contenido(), 3)
+
+        async def dos_primeros():
+            partes = [await anext(cuerpo), await anext(cuerpo)]
+            await cuerpo.aclose()
+            return partes
+
+        self.assertEqual(async_to_sync(dos_primeros)(), ["0\n", "1\n"])
+        self.assertEqual((generados, cerrado), ([0, 1, 2], [True]))
+
+    def test_wsgi_devuelve_el_generador(self):
+        contenido = iter(["a"])
+        self.assertIs(views._cuerpo_streaming(RequestFactory().get("/"), contenido, 3), contenido)
+
+
+class NotificacionesTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create(username="bodeguero")
+
+    def test_contador_nuevo_parte_del_conteo_real(self):
+        Notificacion.objects.bulk_create([Notificacion(usuario=self.usuario, titulo=f"previa {n}") for n in range(3)])
+        notificaciones.notificar([self.usuario.pk], "nueva")
+        self.assertEqual(ContadorNotificaciones.objects.get(usuario=self.usuario).no_leidas, 4)
+        notificaciones.notificar([self.usuario.pk], "otra")
+        self.assertEqual(notificaciones.no_leidas(self.usuario), 5)
+
+    def test_leer_todas_no_redirige_fuera_del_sitio(self):
+        self.client.force_login(self.usuario)
+        url = reverse("notificaciones_leer_todas")
+        respuesta = self.client.post(url, {"next": "https://evil.example/"})
+        self.assertEqual(respuesta["Location"], reverse("dashboard"))
+        respuesta = self.client.post(url, {"next": "/notificaciones/"})
+        self.assertEqual(respuesta["Location"], "/notificaciones/")
+
+
+
+def _tarea_que_falla(permanente=False):
+    raise (trabajos.ErrorPermanente if permanente else RuntimeError)("falla de prueba")
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "La cola usa FOR UPDATE SKIP LOCKED.")
+@override_settings(TRABAJOS_BACKOFF_BASE=10, TRABAJOS_BACKOFF_MAX=3600, TRABAJOS_TIMEOUT_SEGUNDOS=60)
+class TrabajosTests(TransactionTestCase):
+    # ``ejecutar`` cierra conexiones y revierte transacciones abiertas: no puede correr dentro de TestCase
+    def setUp(self):
+        registro = mock.patch.dict(trabajos.REGISTRO, {"prueba_ok": lambda n=0: {"n": n}, "prueba_falla": _tarea_que_falla})
+        registro.start()
+        self.addCleanup(registro.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_dos_workers_no_se_esperan_ni_repiten(self):
+        primero, _ = trabajos.encolar("prueba_ok")
+        segundo, _ = trabajos.encolar("prueba_ok")
+        tomados = []
+
+        def otro_worker():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET lock_timeout = '2s'")
+                tomados.append(trabajos.reclamar("w2"))
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            # w1 mantiene bloqueada la fila que reclamó mientras w2 reclama
+            tomados.append(trabajos.reclamar("w1"))
+            hilo = threading.Thread(target=otro_worker)
+            hilo.start()
+            hilo.join()
+        self.assertEqual({t.pk for t in tomados}, {primero.pk, segundo.pk})
+        self.assertEqual([t.bloqueado_por for t in tomados], ["w1", "w2"])
+        self.assertIsNone(trabajos.reclamar("w3"))
+
+    def test_reintenta_con_espera_hasta_max_intentos(self):
+        trabajo, _ = trabajos.encolar("prueba_falla", max_intentos=2)
+        self.assertFalse(trabajos.ejecutar(trabajos.reclamar("w1"), "w1"))
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (Trabajo.Estado.PENDING, 1))
+        espera = (trabajo.disponible_en - timezone.now()).total_seconds()
+        self.assertTrue(7 < espera <= 12, espera)
+        self.assertIsNone(trabajos.reclamar("w1"))
+
+        Trabajo.objects.filter(pk=trabajo.pk).update(disponible_en=timezone.now())
+        self.assertFalse(trabajos.ejecutar(trabajos.reclamar("w1"), "w1"))
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (Trabajo.Estado.FAILED, 2))
+        self.assertIn("falla de prueba", trabajo.error)
+
+    def test_error_permanente_no_reintenta(self):
+        trabajo, _ = trabajos.encolar("prueba_falla", {"permanente": True})
+        trabajos.ejecutar(trabajos.reclamar("w1"), "w1")
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (Trabajo.Estado.FAILED, 1))
+
+    def test_trabajo_sin_latido_vuelve_a_la_cola(self):
+        trabajo, _ = trabajos.encolar("prueba_ok", {"n": 3})
+        reclamado = trabajos.reclamar("caido")
+        Trabajo.objects.filter(pk=trabajo.pk).update(latido_en=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(trabajos.recuperar_vencidos(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.bloqueado_por), (Trabajo.Estado.PENDING, ""))
+
+        self.assertTrue(trabajos.ejecutar(trabajos.reclamar("w2"), "w2"))
+        # el worker caído que reaparece no pisa el resultado
+        trabajos._terminar(reclamado, "caido", estado=Trabajo.Estado.FAILED)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.resultado, trabajo.intentos), (Trabajo.Estado.DONE, {"n": 3}, 2))
+
+    def test_encolar_idempotente_y_reencolar_fallidos(self):
+        trabajo, creado = trabajos.encolar("prueba_falla", {"permanente": True}, clave="k1")
+        repetido, creado_otra_vez = trabajos.encolar("prueba_falla", {"permanente": True}, clave="k1")
+        self.assertEqual((repetido.pk, creado, creado_otra_vez), (trabajo.pk, True, False))
+
+        trabajos.ejecutar(trabajos.reclamar("w1"), "w1")
+        reencolado, creado = trabajos.encolar("prueba_falla", {"permanente": False}, clave="k1")
+        self.assertEqual((reencolado.pk, creado), (trabajo.pk, True))
+        self.assertEqual(
+            (reencolado.estado, reencolado.intentos, reencolado.error, reencolado.parametros),
+            (Trabajo.Estado.PENDING, 0, "", {"permanente": False}),
+        )
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "La consolidación usa SQL de PostgreSQL.")
+class AuditoriaTests(TransactionTestCase):
+    def _acciones(self):
+        return sorted(BitacoraAuditoria.objects.values_list("accion", flat=True))
+
+    def test_se_inserta_al_confirmar_en_una_sentencia(self):
+        with transaction.atomic():
+            for accion in ("A", "B", "C"):
+                auditoria.registrar(accion)
+            self.assertEqual(self._acciones(), [])
+        self.assertEqual(self._acciones(), ["A", "B", "C"])
+
+        with CaptureQueriesContext(connection) as consultas, transaction.atomic():
+            auditoria.registrar("D")
+            auditoria.registrar("E")
+        self.assertEqual(sum("bitacora_auditoria" in q["sql"] for q in consultas.captured_queries), 1)
+
+    def test_rollback_descarta_y_la_siguiente_transaccion_empieza_de_cero(self):
+        with transaction.atomic():
+            auditoria.registrar("REVERTIDA")
+            transaction.set_rollback(True)
+        with transaction.atomic():
+            auditoria.registrar("CONFIRMADA")
+        self.assertEqual(self._acciones(), ["CONFIRMADA"])
+
+    def test_savepoint_revertido_descarta_solo_sus_entradas(self):
+        with transaction.atomic():
+            auditoria.registrar("ANTES")
+            try:
+                with transaction.atomic():
+                    auditoria.registrar("REVERTIDA")
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                auditoria.registrar("LIBERADA")
+            auditoria.registrar("DESPUES")
+        self.assertEqual(self._acciones(), ["ANTES", "DESPUES", "LIBERADA"])
+
+    def test_cola_llena_aplica_contrapresion_y_escribe_directo(self):
+        escritor = auditoria.EscritorAuditoria(maxsize=1)
+        self.assertTrue(escritor.encolar(BitacoraAuditoria(accion="EN_COLA"), timeout=0.05))
+        self.assertFalse(escritor.encolar(BitacoraAuditoria(accion="RECHAZADA"), timeout=0.05))
+
+        with mock.patch.object(auditoria, "_escritor", escritor), \
+                override_settings(AUDITORIA_MODO="hilo", AUDITORIA_TIMEOUT_COLA=0.05), \
+                self.assertLogs("core.services.auditoria", "WARNING"):
+            auditoria.registrar("DIRECTA")
+        self.assertEqual(self._acciones(), ["DIRECTA"])
+
+        escritor.start()
+        escritor.vaciar()
+        self.assertEqual(self._acciones(), ["DIRECTA", "EN_COLA"])
+
+
+class IndicadoresTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.ubicacion = Ubicacion.objects.create(bodega=self.bodega, codigo="U1")
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.producto = Producto.objects.create(sku="P1", nombre="Producto 1", unidad_base=unidad)
+        indicadores.invalidar([self.bodega.pk])
+
+    def _hora(self, hora, movimientos, valor_stock):
+        return IndicadorBodega.objects.create(
+            bodega=self.bodega, granularidad=IndicadorBodega.Granularidad.HORA,
+            periodo=indicadores.inicio_dia() + timedelta(hours=hora),
+            movimientos=movimientos, movimientos_entrada=movimientos, valor_stock=valor_stock,
+        )
+
+    def test_consolidar_hora_toma_fotografia_y_movimientos(self):
+        inventario.postear("IN", [LineaMovimiento(
+            self.producto.pk, Decimal(4), ubicacion_hasta_id=self.ubicacion.pk, costo_unitario=Decimal(25),
+        )])
+        self.assertEqual(indicadores.consolidar_hora(bodega_ids=[self.bodega.pk]), 1)
+        fila = IndicadorBodega.objects.get(bodega=self.bodega, granularidad=IndicadorBodega.Granularidad.HORA)
+        self.assertEqual(
+            (fila.valor_stock, fila.unidades_stock, fila.movimientos, fila.movimientos_entrada, fila.movimientos_salida),
+            (100, 4, 1, 1, 0),
+        )
+
+    def test_consolidar_dia_suma_horas_y_conserva_la_ultima_fotografia(self):
+        self._hora(0, 3, 100)
+        self._hora(1, 2, 250)
+        indicadores.consolidar_dia(bodega_ids=[self.bodega.pk])
+        dia = IndicadorBodega.objects.get(bodega=self.bodega, granularidad=IndicadorBodega.Granularidad.DIA)
+        self.assertEqual((dia.periodo, dia.movimientos, dia.valor_stock), (indicadores.inicio_dia(), 5, 250))
+
+        datos = indicadores.indicadores([self.bodega.pk])[self.bodega.pk]
+        self.assertEqual((datos["movimientos_hoy"], datos["valor_stock"]), (5, 250))
+
+    def test_tablero_usa_la_cache_hasta_invalidar(self):
+        self._hora(0, 3, 100)
+        indicadores.consolidar_dia(bodega_ids=[self.bodega.pk])
+        self.assertEqual(indicadores.tablero()["totales"]["movimientos_hoy"], 3)
+        IndicadorBodega.objects.filter(granularidad=IndicadorBodega.Granularidad.DIA).update(movimientos=7)
+        with self.assertNumQueries(0):
+            self.assertEqual(indicadores.indicadores([self.bodega.pk])[self.bodega.pk]["movimientos_hoy"], 3)
+        indicadores.invalidar([self.bodega.pk])
+        self.assertEqual(indicadores.tablero()["totales"]["movimientos_hoy"], 7)
+
+    def test_dashboard_no_es_para_proveedores(self):
+        proveedor = User.objects.create(username="proveedor")
+        UsuarioPerfil.objects.filter(usuario=proveedor).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+        self.client.force_login(proveedor)
+        self.assertEqual(self.client.get(reverse("dashboard")).status_code, 302)
+
+
+class ArchivoTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.destino = Path(directorio.name)
+        self.ahora = timezone.now()
+
+    def _bitacora(self, accion, dias, entidad_id=1):
+        entrada = BitacoraAuditoria.objects.create(accion=accion, tabla="productos", entidad_id=entidad_id, detalle={"n": accion})
+        BitacoraAuditoria.objects.filter(pk=entrada.pk).update(creado_en=self.ahora - timedelta(days=dias))
+        return entrada
+
+    def test_exporta_por_lotes_indexa_y_el_historial_une_vivo_y_archivado(self):
+        antiguas = [self._bitacora(f"A{n}", 90 + n) for n in range(3)] + [self._bitacora("OTRA", 95, entidad_id=2)]
+        reciente = self._bitacora("RECIENTE", 1)
+
+        corte = self.ahora - timedelta(days=30)
+        self.assertEqual(archivo.archivar("bitacora", corte, lote=2, destino=self.destino), (4, 4))
+        self.assertEqual(list(BitacoraAuditoria.objects.values_list("pk", flat=True)), [reciente.pk])
+
+        carpetas = sorted((self.destino / "bitacora_auditoria").iterdir())
+        self.assertTrue(carpetas)
+        indices = [json.loads((carpeta / "index.json").read_text())["claves"] for carpeta in carpetas]
+        self.assertTrue(all(len(partes) == 1 for claves in indices for partes in claves.values()))
+        self.assertEqual(set().union(*indices), {"productos:1", "productos:2"})
+
+        filas = archivo.historial_entidad("productos", 1, destino=self.destino)
+        self.assertEqual([f["accion"] for f in filas], ["A2", "A1", "A0", "RECIENTE"])
+        self.assertEqual([f["archivada"] for f in filas], [True, True, True, False])
+        self.assertEqual(filas[0]["detalle"], {"n": "A2"})
+        self.assertEqual(filas[0]["id"], antiguas[2].pk)
+
+    def test_solo_borra_lo_exportado(self):
+        usuario = User.objects.create(username="lector")
+        # id menor que el de la leída: el keyset ya la dejó atrás cuando se marca
+        tardia = Notificacion.objects.create(usuario=usuario, titulo="se lee durante la exportación")
+        leida = Notificacion.objects.create(usuario=usuario, titulo="leída", leida=True)
+        sin_leer = Notificacion.objects.create(usuario=usuario, titulo="sin leer")
+        Notificacion.objects.update(creado_en=self.ahora - timedelta(days=90))
+
+        escribir = archivo._EscritorMes.escribir
+
+        def escribir_y_leer(escritor, filas, archivable):
+            Notificacion.objects.filter(pk=tardia.pk).update(leida=True)
+            return escribir(escritor, filas, archivable)
+
+        with mock.patch.object(archivo._EscritorMes, "escribir", escribir_y_leer):
+            self.assertEqual(archivo.archivar("notificaciones", self.ahora, destino=self.destino), (1, 1))
+        self.assertFalse(Notificacion.objects.filter(pk=leida.pk).exists())
+        self.assertEqual(set(Notificacion.objects.values_list("pk", flat=True)), {tardia.pk, sin_leer.pk})
+
+        filas = archivo.historial("notificaciones", destino=self.destino, usuario_id=usuario.pk)
+        self.assertEqual([(f["id"], f["archivada"]) for f in sorted(filas, key=lambda f: f["id"])],
+                         [(tardia.pk, False), (leida.pk, True), (sin_leer.pk, False)])
+
+
+class PreciosTests(TestCase):
+    def setUp(self):
+        self.hoy = timezone.localdate()
+        unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.productos = [
+            Producto.objects.create(sku=f"P{n}", nombre=f"Producto {n}", unidad_base=unidad) for n in range(3)
+        ]
+
+    def _precio(self, producto, precio, desde, hasta=None, activo=True):
+        return PrecioProducto.objects.create(
+            producto=producto, precio=Decimal(precio), vigente_desde=self.hoy + timedelta(days=desde),
+            vigente_hasta=None if hasta is None else self.hoy + timedelta(days=hasta), activo=activo,
+        )
+
+    def test_precios_en_fecha_resuelve_todo_en_una_consulta(self):
+        p0, p1, p2 = self.productos
+        self._precio(p0, 10, -30, -11)
+        actual = self._precio(p0, 12, -10)
+        self._precio(p0, 99, -5, activo=False)
+        futuro = self._precio(p1, 20, 5)
+        self._precio(p2, 30, -20, -1)
+
+        with CaptureQueriesContext(connection) as consultas:
+            vigentes = precios.precios_en_fecha([p.pk for p in self.productos])
+        self.assertEqual(len(consultas.captured_queries), 1)
+        self.assertIn("DISTINCT ON", consultas.captured_queries[0]["sql"])
+        self.assertEqual({k: v.pk for k, v in vigentes.items()}, {p0.pk: actual.pk})
+
+        en_una_semana = precios.precios_en_fecha(fecha=self.hoy + timedelta(days=7), skus=["P0", "P1", "P2"])
+        self.assertEqual({k: v.pk for k, v in en_una_semana.items()}, {p0.pk: actual.pk, p1.pk: futuro.pk})
+
+    def test_vigencias_activas_no_se_solapan(self):
+        p0 = self.productos[0]
+        self._precio(p0, 10, -10, 0)
+        solapado = PrecioProducto(producto=p0, precio=Decimal(11), vigente_desde=self.hoy)
+        with self.assertRaisesMessage(ValidationError, "se solapa con esas fechas"):
+            solapado.full_clean()
+        # contiguo o inactivo no viola la restricción
+        PrecioProducto(producto=p0, precio=Decimal(11), vigente_desde=self.hoy + timedelta(days=1)).full_clean()
+        PrecioProducto(producto=p0, precio=Decimal(11), vigente_desde=self.hoy, activo=False).full_clean()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = 'excl_precio_vigencia_solapada'")
+            if cursor.fetchone() is None:
+                self.skipTest("La restricción de exclusión requiere btree_gist.")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            solapado.save()
+
+    def test_refrescar_vigentes_hace_upsert_y_borra_sin_precio(self):
+        p0, p1, p2 = self.productos
+        anterior = self._precio(p0, 10, -10)
+        vence = self._precio(p1, 20, -10)
+        otro = self._precio(p2, 30, -10)
+        self.assertEqual(precios.refrescar_vigentes(), 3)
+
+        PrecioProducto.objects.filter(pk=anterior.pk).update(vigente_hasta=self.hoy - timedelta(days=1))
+        nuevo = self._precio(p0, 15, 0)
+        PrecioProducto.objects.filter(pk__in=[vence.pk, otro.pk]).update(activo=False)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(precios.refrescar_vigentes([p0.pk, p1.pk]), 1)
+        borrado = next(q["sql"] for q in consultas.captured_queries if q["sql"].startswith("DELETE"))
+        self.assertIn("NOT EXISTS", borrado)
+        self.assertNotIn("NOT IN", borrado)
+
+        self.assertEqual(precios.precios_actuales([p.pk for p in self.productos]), {p0.pk: Decimal(15), p2.pk: Decimal(30)})
+        self.assertEqual(PrecioVigente.objects.get(producto=p0).precio_producto_id, nuevo.pk)
+
+
+class TotalesTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.proveedor = User.objects.create(username="proveedor")
+        UsuarioPerfil.objects.filter(usuario=self.proveedor).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+        self.unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.producto = Producto.objects.create(sku="P1", nombre="Producto 1", unidad_base=self.unidad)
+        self.tasa = TasaImpuesto.objects.create(nombre="IVA", porcentaje=Decimal(19))
+
+    def _orden_con_lineas(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            orden = OrdenCompra.objects.create(proveedor=self.proveedor, bodega=self.bodega, tasa_impuesto=self.tasa)
+            for cantidad, precio, descuento in ((10, 100, 10), (3, 50, 0)):
+                LineaOrdenCompra.objects.create(
+                    orden_compra=orden, producto=self.producto, unidad=self.unidad,
+                    cantidad_pedida=Decimal(cantidad), precio=Decimal(precio), descuento_pct=Decimal(descuento),
+                )
+        actualizaciones = [q for q in consultas.captured_queries if q["sql"].lstrip().startswith("UPDATE ordenes_compra")]
+        return orden, actualizaciones
+
+    def _factura(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FacturaProveedor.objects.create(
+                proveedor=self.proveedor, numero_factura="F-1", tasa_impuesto=self.tasa,
+                monto_total=Decimal(119), fecha_factura=timezone.localdate(),
+            )
+
+    def test_lineas_de_una_transaccion_se_totalizan_en_un_update(self):
+        orden, actualizaciones = self._orden_con_lineas()
+        self.assertEqual(len(actualizaciones), 1)
+        orden.refresh_from_db()
+        self.assertEqual((orden.subtotal, orden.monto_impuesto, orden.total), (1050, Decimal("199.5"), Decimal("1249.5")))
+
+        factura = self._factura()
+        factura.refresh_from_db()
+        self.assertEqual((factura.subtotal, factura.monto_impuesto), (100, 19))
+
+        # sin cambios no se reescribe ninguna fila
+        self.assertEqual(totales.recalcular_ordenes(), 0)
+        self.assertEqual(totales.recalcular_facturas(), 0)
+
+    def test_recalcular_invalida_el_resumen_del_proveedor_al_confirmar(self):
+        orden, _ = self._orden_con_lineas()
+        OrdenCompra.objects.filter(pk=orden.pk).update(total=0)
+        with mock.patch.object(portal_proveedor, "invalidar") as invalidar:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(totales.recalcular_ordenes([orden.pk]), 1)
+                invalidar.assert_not_called()
+        invalidar.assert_called_once_with(self.proveedor.pk)
+
+    def test_la_migracion_completa_los_totales_existentes(self):
+        orden, _ = self._orden_con_lineas()
+        factura = self._factura()
+        OrdenCompra.objects.update(subtotal=0, monto_impuesto=0, total=0)
+        FacturaProveedor.objects.update(subtotal=0, monto_impuesto=0)
+
+        migracion = importlib.import_module("core.migrations.0006_totales_compras")
+        with connection.cursor() as cursor:
+            cursor.execute(migracion.RECALCULAR_ORDENES)
+            self.assertEqual(cursor.rowcount, 1)
+            cursor.execute(migracion.RECALCULAR_FACTURAS)
+            self.assertEqual(cursor.rowcount, 1)
+        orden.refresh_from_db()
+        factura.refresh_from_db()
+        self.assertEqual((orden.subtotal, orden.total), (1050, Decimal("1249.5")))
+        self.assertEqual((factura.subtotal, factura.monto_impuesto), (100, 19))
+
+
+class PortalProveedorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.proveedor, self.otro = User.objects.create(username="proveedor"), User.objects.create(username="otro")
+        UsuarioPerfil.objects.filter(usuario__in=[self.proveedor, self.otro]).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+
+    def _orden(self, proveedor, estado="APPROVED"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return OrdenCompra.objects.create(proveedor=proveedor, bodega=self.bodega, estado=estado)
+
+    def _factura(self, proveedor, numero):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FacturaProveedor.objects.create(
+                proveedor=proveedor, numero_factura=numero, monto_total=Decimal(100), fecha_factura=timezone.localdate(),
+            )
+
+    def test_cada_proveedor_ve_solo_sus_documentos(self):
+        propias = [self._orden(self.proveedor).pk for _ in range(2)]
+        ajena = self._orden(self.otro).pk
+        factura = self._factura(self.proveedor, "F-1").pk
+        self._factura(self.otro, "F-1")
+
+        self.assertEqual(sorted(o.pk for o in portal_proveedor.ordenes(self.proveedor)), propias)
+        self.assertEqual([o.pk for o in portal_proveedor.ordenes(self.otro)], [ajena])
+
+        self.client.force_login(self.proveedor)
+        datos = self.client.get(reverse("proveedor_listado", args=["ordenes"])).json()
+        self.assertEqual(sorted(f["id"] for f in datos["resultados"]), propias)
+        datos = self.client.get(reverse("proveedor_listado", args=["facturas"])).json()
+        self.assertEqual([f["id"] for f in datos["resultados"]], [factura])
+        self.assertEqual(self.client.get(reverse("proveedor_resumen")).json()["ordenes_total"], 2)
+
+    def test_pagina_pide_una_fila_extra_en_vez_de_contar(self):
+        ordenes = [self._orden(self.proveedor).pk for _ in range(3)][::-1]
+        with CaptureQueriesContext(connection) as consultas:
+            filas, hay_mas = portal_proveedor.pagina(portal_proveedor.ordenes(self.proveedor), 1, tamano=2)
+        self.assertEqual(([f.pk for f in filas], hay_mas), (ordenes[:2], True))
+        self.assertEqual(len(consultas.captured_queries), 1)
+        self.assertIn("LIMIT 3", consultas.captured_queries[0]["sql"])
+        self.assertNotIn("COUNT(*)", consultas.captured_queries[0]["sql"])
+
+        filas, hay_mas = portal_proveedor.pagina(portal_proveedor.ordenes(self.proveedor), 2, tamano=2)
+        self.assertEqual(([f.pk for f in filas], hay_mas), (ordenes[2:], False))
+
+    def test_el_resumen_se_cachea_hasta_que_cambia_un_documento(self):
+        self._orden(self.proveedor)
+        self.assertEqual(portal_proveedor.resumen(self.proveedor)["ordenes_abiertas"], 1)
+
+        # un UPDATE sin señales no invalida: se sigue sirviendo la caché
+        OrdenCompra.objects.filter(proveedor=self.proveedor).update(estado="CLOSED")
+        with self.assertNumQueries(0):
+            self.assertEqual(portal_proveedor.resumen(self.proveedor)["ordenes_abiertas"], 1)
+
+        # guardar un documento invalida sólo el resumen de su proveedor
+        otro_resumen = portal_proveedor.resumen(self.otro)
+        self._factura(self.proveedor, "F-1")
+        resumen = portal_proveedor.resumen(self.proveedor)
+        self.assertEqual((resumen["ordenes_abiertas"], resumen["facturas_abiertas"]), (0, 1))
+        with self.assertNumQueries(0):
+            self.assertEqual(portal_proveedor.resumen(self.otro), otro_resumen)
+
+
+class DesempenoTests(TestCase):
+    def setUp(self):
+        sucursal = Sucursal.objects.create(codigo="S1", nombre="Sucursal 1")
+        self.bodega = Bodega.objects.create(sucursal=sucursal, codigo="B1", nombre="Bodega 1")
+        self.proveedor, self.otro = User.objects.create(username="proveedor"), User.objects.create(username="otro")
+        UsuarioPerfil.objects.filter(usuario__in=[self.proveedor, self.otro]).update(rol=UsuarioPerfil.Rol.PROVEEDOR)
+        self.unidad = UnidadMedida.objects.create(codigo="EA", descripcion="Unidad")
+        self.producto = Producto.objects.create(sku="P1", nombre="Producto 1", unidad_base=self.unidad)
+        self.ahora = timezone.now()
+
+    def _orden(self, pedida=10, estado="APPROVED"):
+        orden = OrdenCompra.objects.create(proveedor=self.proveedor, bodega=self.bodega, estado=estado)
+        LineaOrdenCompra.objects.create(
+            orden_compra=orden, producto=self.producto, unidad=self.unidad,
+            cantidad_pedida=Decimal(pedida), precio=Decimal(1),
+        )
+        OrdenCompra.objects.filter(pk=orden.pk).update(creado_en=self.ahora - timedelta(days=10))
+        return orden
+
+    def _recibir(self, orden, cantidad, dias_despues):
+        recepcion = RecepcionMercaderia.objects.create(orden_compra=orden, bodega=self.bodega, estado="POSTED")
+        LineaRecepcionMercaderia.objects.create(recepcion=recepcion, producto=self.producto, cantidad_recibida=Decimal(cantidad))
+        RecepcionMercaderia.objects.filter(pk=recepcion.pk).update(
+            recibido_en=self.ahora - timedelta(days=10 - dias_despues)
+        )
+
+    def test_percentiles_y_cumplimiento_con_upsert(self):
+        for recibida, dias in ((10, 2), (12, 4), (5, 6)):
+            self._recibir(self._orden(), recibida, dias)
+        pendiente = self._orden()
+        self._recibir(self._orden(estado="CANCELED"), 10, 1)
+
+        self.assertEqual(desempeno.recalcular(), 1)
+        fila = DesempenoProveedorProducto.objects.get(proveedor=self.proveedor, producto=self.producto)
+        self.assertEqual(
+            (fila.ordenes, fila.recepciones, fila.lead_time_promedio, fila.lead_time_p50, fila.lead_time_p90),
+            (4, 3, Decimal("4.00"), Decimal("4.00"), Decimal("5.60")),
+        )
+        # lo recibido de más en una orden no compensa el faltante de otra
+        self.assertEqual((fila.cantidad_pedida, fila.cantidad_recibida, fila.tasa_cumplimiento), (40, 27, Decimal("0.6250")))
+
+        ProductoUsuarioProveedor.objects.create(producto=self.producto, proveedor=self.proveedor)
+        self.assertEqual(desempeno.sincronizar_tiempos_entrega(minimo_recepciones=3), 1)
+        self.assertEqual(ProductoUsuarioProveedor.objects.get().tiempo_entrega_dias, 6)
+
+        self._recibir(pendiente, 10, 1)
+        self.assertEqual(desempeno.recalcular(self.proveedor.pk, [self.producto.pk]), 1)
+        actualizada = DesempenoProveedorProducto.objects.get()
+        self.assertEqual(actualizada.pk, fila.pk)
+        self.assertEqual((actualizada.recepciones, actualizada.tasa_cumplimiento), (4, Decimal("0.8750")))
+
+    def test_borra_los_pares_sin_ordenes_en_la_ventana(self):
+        self._orden()
+        otro_producto = Producto.objects.create(sku="P2", nombre="Producto 2", unidad_base=self.unidad)
+        for proveedor in (self.proveedor, self.otro):
+            DesempenoProveedorProducto.objects.create(proveedor=proveedor, producto=otro_producto, ordenes=1)
+        DesempenoProveedorProducto.objects.update(actualizado_en=self.ahora - timedelta(days=1))
+
+        # el recálculo de un proveedor sólo toca sus filas
+        desempeno.recalcular(self.proveedor.pk)
+        self.assertEqual(
+            set(DesempenoProveedorProducto.objects.values_list("proveedor_id", "producto_id")),
+            {(self.proveedor.pk, self.producto.pk), (self.otro.pk, otro_producto.pk)},
+        )
+        desempeno.recalcular()
+        self.assertEqual(
+            list(DesempenoProveedorProducto.objects.values_list("proveedor_id", "producto_id")),
+            [(self.proveedor.pk, self.producto.pk)],
+        )
+
+
+class PerfiladoTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+
+    def _consulta(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    def test_etapas_anidadas_acumulan_en_la_ruta_y_en_los_padres(self):
+        @perfilado.etapa("hija")
+        def hija():
+            self._consulta()
+            perfilado.filas(3)
+
+        with perfilado.corrida("prueba", guardar=False) as corrida:
+            with perfilado.etapa("padre"):
+                self._consulta()
+                perfilado.filas(5)
+                hija()
+                hija()
+        etapas = {e.nombre: e for e in corrida.etapas.values()}
+        self.assertEqual(list(etapas), ["prueba", "prueba/padre", "prueba/padre/hija"])
+        self.assertEqual(
+            [(e.llamadas, e.consultas, e.filas) for e in etapas.values()],
+            [(1, 3, 0), (1, 3, 5), (2, 2, 6)],
+        )
+        self.assertGreaterEqual(etapas["prueba/padre"].pared_s, etapas["prueba/padre/hija"].pared_s)
+        self.assertEqual(corrida.activas, [])
+
+        # fuera de una corrida no se registra nada
+        self.assertIsNone(perfilado.activa())
+        hija()
+
+    def test_profile_imprime_el_desglose_y_guarda_la_corrida(self):
+        salida = io.StringIO()
+        with override_settings(PERFILADO_DIR=self.directorio):
+            call_command("recalcular_totales", stdout=salida)
+            self.assertEqual(list(self.directorio.iterdir()), [])
+            call_command("recalcular_totales", "--profile", stdout=salida)
+        texto = salida.getvalue()
+        self.assertIn("consultas", texto)
+        self.assertIn("Perfil recalcular_totales-", texto)
+
+        guardada, = self.directorio.glob("*.json")
+        datos = perfilado.cargar(guardada)
+        self.assertEqual(datos["etapas"][0]["nombre"], "recalcular_totales")
+        self.assertGreaterEqual(datos["etapas"][0]["consultas"], 2)
+        self.assertIsNone(datos["cprofile"])
+
+    def test_comparar_corridas(self):
+        def guardar(id_, etapas):
+            ruta = self.directorio / f"{id_}.json"
+            ruta.write_text(json.dumps({"id": id_, "etapas": [
+                {"nombre": nombre, "pared_s": pared, "cpu_s": cpu, "consultas": consultas, "filas_por_s": 0.0}
+                for nombre, (pared, cpu, consultas) in etapas.items()
+            ]}))
+            return ruta
+
+        anterior = guardar("antes", {"carga": (2.0, 1.0, 10), "vieja": (1.0, 1.0, 1)})
+        actual = guardar("despues", {"carga": (1.0, 1.5, 10), "nueva": (1.0, 1.0, 1)})
+        deltas = perfilado.comparar(perfilado.cargar(actual), perfilado.cargar(anterior))
+        self.assertEqual(deltas, {"carga": {"pared_s": -50.0, "cpu_s": 50.0, "consultas": 0.0, "filas_por_s": None}})
+
+        salida = io.StringIO()
+        call_command("comparar_perfiles", str(actual), str(anterior), "--json", stdout=salida)
+        self.assertEqual(json.loads(salida.getvalue()), deltas)
+        with override_settings(PERFILADO_DIR=self.directorio):
+            salida = io.StringIO()
+            call_command("comparar_perfiles", "despues", "antes", stdout=salida)
+        self.assertIn("-50.0%", salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("comparar_perfiles", "no-existe", "antes")
@@ -8,6 +8,18 @@ urlpatterns = [
     path("products/", views.products, name="products"),
     path("category/<slug:slug>/", views.category, name="category"),
     path("products/add/", views.product_add, name="product_add"),
+    path("products/buscar/", views.productos_buscar, name="productos_buscar"),
+    path("escaneo/resolver/", views.escaneo_resolver, name="escaneo_resolver"),
+    path("trazabilidad/serie/<int:serie_id>/", views.trazabilidad_serie, name="trazabilidad_serie"),
+    path("trazabilidad/lote/<int:lote_id>/", views.trazabilidad_lote, name="trazabilidad_lote"),
+    path("exportar/<slug:nombre>/", views.exportar_datos, name="exportar_datos"),
+
+    # Trabajos en segundo plano
+    path("ajustes/<int:ajuste_id>/postear/", views.ajuste_postear, name="ajuste_postear"),
+    path("trabajos/<int:trabajo_id>/", views.trabajo_estado, name="trabajo_estado"),
+
+    # Métricas de instrumentación (Prometheus)
+    path("metricas/", views.metricas, name="metricas"),
 
     # Auth propias
     path("login/", views.login_view, name="login"),
@@ -17,6 +29,15 @@ urlpatterns = [
     path('home/', views.dashboard_view, name='accounts_home'),
     path('home/auditor/', views.auditor_home, name='auditor_home'),
     path('home/proveedor/', views.proveedor_home, name='proveedor_home'),
+    path('proveedor/resumen/', views.proveedor_resumen, name='proveedor_resumen'),
+    path('proveedor/<slug:listado>/', views.proveedor_listado, name='proveedor_listado'),
+
+    # Notificaciones
+    path("notificaciones/leer-todas/", views.notificaciones_leer_todas, name="notificaciones_leer_todas"),
+
+    # Eventos en vivo (alertas / notificaciones)
+    path("eventos/stream/", views.eventos_stream, name="eventos_stream"),
+    path("eventos/poll/", views.eventos_poll, name="eventos_poll"),
 
     # Signup (si lo usas)
     path("signup/", views.signup, name="accounts-signup"),
@@ -1,20 +1,57 @@
+import asyncio
+import hmac
+import json
+from datetime import date
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.http import require_POST
 from django.urls import reverse, NoReverseMatch
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.conf import settings
+from django.db import connections, router, transaction
 from django import forms
+from core import instrumentacion
 from core.forms import SignupUserForm, UsuarioPerfilForm
-from core.models import UsuarioPerfil
+from core.models import AjusteInventario, Trabajo, UsuarioPerfil
+from core.routers import usar_replica
+from core.services import auditoria, busqueda, escaneo, eventos, exportacion, indicadores, notificaciones, portal_proveedor, trabajos, trazabilidad
+
+
 
+def _es_proveedor(user):
+    perfil = getattr(user, 'perfil', None)
+    return bool(perfil and perfil.rol == UsuarioPerfil.Rol.PROVEEDOR)
+
+
+def _no_es_proveedor(user):
+    return not _es_proveedor(user)
 
 
 # -------------------- Vistas principales --------------------
+@login_required
+@user_passes_test(_no_es_proveedor)
 def dashboard(request):
-    return render(request, "core/dashboard.html")
+    datos = indicadores.tablero()
+    totales = datos["totales"]
+    series = (
+        ("Movimientos", totales["movimientos_hoy"]),
+        ("Entradas", totales["movimientos_entrada_hoy"]),
+        ("Salidas", totales["movimientos_salida_hoy"]),
+    )
+    maximo = max(max(valor for _, valor in series), 1)
+    barras = [(etiqueta, valor, int(140 * valor / maximo)) for etiqueta, valor in series]
+    return render(request, "core/dashboard.html", {**datos, "barras": barras})
 
 @login_required
 def products(request):
@@ -28,6 +65,94 @@ def category(request, slug):
 def product_add(request):
     return render(request, "core/product_add.html")
 
+@login_required
+def productos_buscar(request):
+    """Búsqueda rankeada por sku, SKU de proveedor, nombre, marca o categoría (``?q=``)."""
+    try:
+        limite = min(int(request.GET.get("limite", busqueda.LIMITE_POR_DEFECTO)), 100)
+    except ValueError:
+        limite = busqueda.LIMITE_POR_DEFECTO
+    resultados = busqueda.buscar(request.GET.get("q", ""), limite)
+    return JsonResponse({"resultados": resultados})
+
+
+# -------------------- Escaneo --------------------
+@login_required
+@require_POST
+def escaneo_resolver(request):
+    """
+    Resuelve en lote los códigos de un escáner:
+    ``{"bodega_id": 1, "codigos": ["SKU1", "]C1010...17...10LOTE"]}``.
+    """
+    try:
+        datos = json.loads(request.body or b"{}")
+        codigos = [str(c) for c in datos.get("codigos", [])]
+        bodega_id = int(datos["bodega_id"]) if datos.get("bodega_id") is not None else None
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"error": "JSON inválido."}, status=400)
+    if len(codigos) > 500:
+        return JsonResponse({"error": "Máximo 500 códigos por solicitud."}, status=400)
+    return JsonResponse({"resultados": escaneo.resolver_varios(codigos, bodega_id)})
+
+
+# -------------------- Trazabilidad (NDJSON) --------------------
+def _ndjson(primera, eventos_):
+    yield json.dumps(primera, cls=DjangoJSONEncoder) + "\n"
+    for evento in eventos_:
+        yield json.dumps(evento, cls=DjangoJSONEncoder) + "\n"
+
+
+async def _iterar_en_hilo(contenido, por_viaje):
+    """
+    Recorre un generador síncrono desde el event loop: cada salto al hilo de la
+    petición (el de su conexión y su cursor) trae ``por_viaje`` elementos.
+    """
+    siguientes = sync_to_async(lambda: list(islice(contenido, por_viaje)))
+    try:
+        while trozo := await siguientes():
+            for parte in trozo:
+                yield parte
+    finally:
+        await sync_to_async(contenido.close)()
+
+
+def _cuerpo_streaming(request, contenido, por_viaje):
+    """
+    Bajo ASGI, ``StreamingHttpResponse`` materializa en memoria un iterador
+    síncrono antes de enviarlo; allí el generador se entrega envuelto en un
+    iterador asíncrono que lo consume por trozos.
+    """
+    if isinstance(request, ASGIRequest):
+        return _iterar_en_hilo(contenido, por_viaje)
+    return contenido
+
+
+@login_required
+@user_passes_test(_no_es_proveedor)
+def trazabilidad_serie(request, serie_id):
+    """Primera línea: ubicación actual; después, la línea de tiempo de la serie."""
+    cabecera = {"tipo": "serie", "serie_id": serie_id, "ubicacion_actual": trazabilidad.ubicacion_actual_serie(serie_id)}
+    return StreamingHttpResponse(
+        _cuerpo_streaming(request, _ndjson(cabecera, trazabilidad.linea_tiempo_serie(serie_id)), trazabilidad.TAMANO_BLOQUE),
+        content_type="application/x-ndjson",
+    )
+
+
+@login_required
+@user_passes_test(_no_es_proveedor)
+def trazabilidad_lote(request, lote_id):
+    """Primera línea: resumen del lote; después, la línea de tiempo (lote y sus series)."""
+    cabecera = dict(trazabilidad.resumen_lote(lote_id), tipo="lote")
+    incluir_series = request.GET.get("series", "1") != "0"
+    return StreamingHttpResponse(
+        _cuerpo_streaming(
+            request,
+            _ndjson(cabecera, trazabilidad.linea_tiempo_lote(lote_id, incluir_series=incluir_series)),
+            trazabilidad.TAMANO_BLOQUE,
+        ),
+        content_type="application/x-ndjson",
+    )
+
 
 # -------------------- Login Helpers --------------------
 def _redirect_url_by_role(perfil):
@@ -89,9 +214,197 @@ def auditor_home(request):
     # Puedes crear accounts/auditor_home.html si quieres contenido propio
     return render(request, 'accounts/auditor_home.html')
 
+
 @login_required
+@user_passes_test(_es_proveedor)
 def proveedor_home(request):
-    return render(request, 'accounts/proveedor_home.html')
+    ordenes, hay_mas = portal_proveedor.pagina(portal_proveedor.ordenes_abiertas(request.user), tamano=10)
+    return render(request, 'accounts/proveedor_home.html', {
+        'resumen': portal_proveedor.resumen(request.user),
+        'ordenes': ordenes,
+        'hay_mas_ordenes': hay_mas,
+    })
+
+
+# -------------------- Portal proveedor (JSON) --------------------
+def _fila_orden(oc):
+    conciliacion = getattr(oc, 'conciliacion', None)
+    return {
+        'id': oc.pk, 'numero': oc.numero_orden, 'estado': oc.estado, 'bodega': oc.bodega.nombre,
+        'fecha_esperada': oc.fecha_esperada, 'lineas': oc.n_lineas,
+        'subtotal': oc.subtotal, 'impuesto': oc.monto_impuesto, 'total': oc.total,
+        'conciliacion': conciliacion.estado if conciliacion else None,
+    }
+
+
+def _fila_recepcion(r):
+    return {
+        'id': r.pk, 'numero': r.numero_recepcion, 'estado': r.estado, 'bodega': r.bodega.nombre,
+        'orden': r.orden_compra.numero_orden, 'recibido_en': r.recibido_en,
+        'lineas': r.n_lineas, 'cantidad': r.cantidad_total,
+    }
+
+
+def _fila_factura(f):
+    return {
+        'id': f.pk, 'numero': f.numero_factura, 'estado': f.estado,
+        'orden': f.orden_compra.numero_orden if f.orden_compra else None,
+        'fecha': f.fecha_factura, 'vencimiento': f.fecha_vencimiento,
+        'subtotal': f.subtotal, 'impuesto': f.monto_impuesto, 'total': f.monto_total,
+    }
+
+
+def _fila_devolucion(d):
+    return {
+        'id': d.pk, 'estado': d.estado, 'bodega': d.bodega.nombre, 'motivo': d.motivo,
+        'creado_en': d.creado_en, 'lineas': d.n_lineas, 'cantidad': d.cantidad_total,
+    }
+
+
+def _fila_producto(pp):
+    return {
+        'producto_id': pp.producto_id, 'sku': pp.producto.sku, 'nombre': pp.producto.nombre,
+        'unidad': pp.producto.unidad_base.codigo, 'sku_proveedor': pp.sku_proveedor,
+        'tiempo_entrega_dias': pp.tiempo_entrega_dias, 'cantidad_min_pedido': pp.cantidad_min_pedido,
+    }
+
+
+_LISTADOS_PROVEEDOR = {
+    'ordenes': (portal_proveedor.ordenes, _fila_orden),
+    'ordenes-abiertas': (portal_proveedor.ordenes_abiertas, _fila_orden),
+    'recepciones': (portal_proveedor.recepciones, _fila_recepcion),
+    'facturas': (portal_proveedor.facturas, _fila_factura),
+    'devoluciones': (portal_proveedor.devoluciones, _fila_devolucion),
+    'productos': (portal_proveedor.productos, _fila_producto),
+}
+
+
+@login_required
+@user_passes_test(_es_proveedor)
+def proveedor_listado(request, listado):
+    """Página JSON de un listado del proveedor autenticado (``?pagina=N``)."""
+    if listado not in _LISTADOS_PROVEEDOR:
+        return JsonResponse({'error': 'Listado desconocido.'}, status=404)
+    consulta, fila = _LISTADOS_PROVEEDOR[listado]
+    try:
+        numero = int(request.GET.get('pagina', 1))
+    except ValueError:
+        numero = 1
+    filas, hay_mas = portal_proveedor.pagina(consulta(request.user), numero)
+    return JsonResponse({'pagina': numero, 'hay_mas': hay_mas, 'resultados': [fila(f) for f in filas]})
+
+
+@login_required
+@user_passes_test(_es_proveedor)
+def proveedor_resumen(request):
+    return JsonResponse(portal_proveedor.resumen(request.user), encoder=DjangoJSONEncoder)
+
+
+# -------------------- Notificaciones --------------------
+@login_required
+@require_POST
+def notificaciones_leer_todas(request):
+    notificaciones.marcar_todas_leidas(request.user)
+    destino = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(destino, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        destino = 'dashboard'
+    return redirect(destino)
+
+
+# -------------------- Eventos en vivo (requiere ASGI para el stream) --------------------
+def _leer_usuario_y_rol(request):
+    # corre en el pool del loop (thread_sensitive=False): la conexión de ese hilo
+    # se cierra aquí mismo, nadie más la cerraría al terminar la petición
+    try:
+        user = request.user
+        if not user.is_authenticated:
+            return None, None
+        return user, UsuarioPerfil.objects.filter(usuario=user).values_list("rol", flat=True).first()
+    finally:
+        connections.close_all()
+
+
+async def _usuario_y_rol(request):
+    return await sync_to_async(_leer_usuario_y_rol, thread_sensitive=False)(request)
+
+
+def _ultimo_id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+async def eventos_stream(request):
+    """
+    Server-Sent Events con alertas y notificaciones nuevas. Cada cliente es una
+    cola en el event loop del worker ASGI, sin hilo propio (ver
+    ``core.asgi.ManejadorASGI``); no hay consultas periódicas a la BD.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("El stream de eventos requiere un servidor ASGI.", status=501)
+    user, rol = await _usuario_y_rol(request)
+    if user is None:
+        return HttpResponse(status=401)
+
+    suscripcion = eventos.suscribir()
+    ultimo = _ultimo_id(request.headers.get("Last-Event-ID"))
+    latido = getattr(settings, "EVENTOS_LATIDO", 15)
+
+    def formatear(evento):
+        datos = json.dumps(evento, cls=DjangoJSONEncoder)
+        return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+    async def flujo():
+        # el cuerpo se envía después del middleware: aquí ya no queda código síncrono
+        try:
+            yield "retry: 5000\n\n"
+            if ultimo is not None:
+                for evento in eventos.broker.desde(ultimo):
+                    if eventos.visible_para(evento, user.pk, rol):
+                        yield formatear(evento)
+            while True:
+                try:
+                    evento = await suscripcion.siguiente(timeout=latido)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if eventos.visible_para(evento, user.pk, rol):
+                    yield formatear(evento)
+        finally:
+            suscripcion.cerrar()
+
+    response = StreamingHttpResponse(flujo(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def eventos_poll(request):
+    """
+    Long-poll: responde apenas hay eventos posteriores a ``?desde=<id>`` o tras
+    ``EVENTOS_LONG_POLL`` segundos con una lista vacía.
+    """
+    user, rol = await _usuario_y_rol(request)
+    if user is None:
+        return JsonResponse({"error": "no autenticado"}, status=401)
+
+    suscripcion = eventos.suscribir()
+    try:
+        desde = _ultimo_id(request.GET.get("desde"))
+        pendientes = eventos.broker.desde(desde) if desde is not None else []
+        if not pendientes:
+            try:
+                pendientes = [await suscripcion.siguiente(timeout=getattr(settings, "EVENTOS_LONG_POLL", 25))]
+            except asyncio.TimeoutError:
+                pendientes = []
+            pendientes += suscripcion.pendientes()
+    finally:
+        suscripcion.cerrar()
+
+    visibles = [e for e in pendientes if eventos.visible_para(e, user.pk, rol)]
+    ultimo = max((e["id"] for e in pendientes), default=desde)
+    return JsonResponse({"eventos": visibles, "ultimo_id": ultimo}, encoder=DjangoJSONEncoder)
 
 
 # -------------------- Signup (opcional, solo ADMIN) --------------------
@@ -131,6 +444,7 @@ def signup(request):
             for field, value in perfil_form.cleaned_data.items():
                 setattr(perfil, field, value)
             perfil.save()
+            auditoria.registrar_instancia("USUARIO_CREADO", user, usuario=request.user, detalle={"rol": perfil.rol})
 
             login(request, user)
             messages.success(request, "✅ Usuario creado correctamente.")
@@ -173,6 +487,7 @@ def user_create(request):
             for field, value in perfil_form.cleaned_data.items():
                 setattr(perfil, field, value)
             perfil.save()  # tu señal post_save ya sincroniza grupos por rol
+            auditoria.registrar_instancia("USUARIO_CREADO", user, usuario=request.user, detalle={"rol": perfil.rol})
 
             messages.success(request, "✅ Usuario creado correctamente.")
             return redirect("usuario-list")
@@ -189,6 +504,7 @@ def user_create(request):
 
 
 @user_passes_test(_is_admin)
+@usar_replica
 def user_list(request):
     """
     Listado simple de usuarios para navegación después de crear.
@@ -199,4 +515,112 @@ def user_list(request):
         .select_related("perfil")
         .order_by("username")
     )
-    return render(request, "account/user_list.html", {"users": data})
\ No newline at end of file
+    return render(request, "account/user_list.html", {"users": data})
+
+
+# -------------------- Exportaciones (finanzas / BI) --------------------
+def _puede_exportar(user):
+    try:
+        return user.is_authenticated and user.perfil.rol in (UsuarioPerfil.Rol.ADMIN, UsuarioPerfil.Rol.AUDITOR)
+    except Exception:
+        return False
+
+
+def _fecha_param(request, nombre):
+    valor = request.GET.get(nombre)
+    return date.fromisoformat(valor) if valor else None
+
+
+@user_passes_test(_puede_exportar)
+@usar_replica
+def exportar_datos(request, nombre):
+    """
+    CSV (``?formato=csv``) o CSV gzip (``?formato=csv.gz``) en streaming, con
+    filtros ``desde``/``hasta`` (AAAA-MM-DD) y ``bodega``. La base se elige
+    aquí: el generador corre después de que la vista retorna.
+    """
+    if nombre not in exportacion.EXPORTABLES:
+        return JsonResponse({"error": f"Exportación desconocida: {nombre}"}, status=404)
+    formato = request.GET.get("formato", "csv")
+    if formato not in ("csv", "csv.gz"):
+        return JsonResponse({"error": "En línea sólo se sirven csv y csv.gz; use manage.py exportar para parquet/xlsx."}, status=400)
+    try:
+        filtros = {
+            "desde": _fecha_param(request, "desde"),
+            "hasta": _fecha_param(request, "hasta"),
+            "bodega_id": int(request.GET["bodega"]) if request.GET.get("bodega") else None,
+        }
+        using = router.db_for_read(exportacion.EXPORTABLES[nombre].modelo)
+        contenido = exportacion.csv_en_bloques(nombre, comprimir=formato == "csv.gz", using=using, **filtros)
+        # el primer trozo arma el queryset: los filtros inválidos fallan aquí y no a mitad de respuesta
+        primer_trozo = next(contenido)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    def cuerpo():
+        yield primer_trozo
+        yield from contenido
+
+    # cada trozo ya es un bloque de filas: un salto al hilo por bloque
+    respuesta = StreamingHttpResponse(
+        _cuerpo_streaming(request, cuerpo(), 1), content_type="application/gzip" if formato == "csv.gz" else "text/csv; charset=utf-8"
+    )
+    respuesta["Content-Disposition"] = f'attachment; filename="{nombre}-{date.today():%Y%m%d}.{formato}"'
+    return respuesta
+
+
+# -------------------- Trabajos en segundo plano --------------------
+def _rol(user):
+    perfil = getattr(user, "perfil", None)
+    return perfil.rol if perfil else None
+
+
+def _puede_ajustar(user):
+    return user.is_authenticated and (user.is_staff or _rol(user) in (UsuarioPerfil.Rol.ADMIN, UsuarioPerfil.Rol.BODEGUERO))
+
+
+@user_passes_test(_puede_ajustar)
+@require_POST
+def ajuste_postear(request, ajuste_id):
+    """
+    Encola el posteo del ajuste y responde 202 con el trabajo; repetir la
+    solicitud devuelve el mismo trabajo (clave ``ajuste:<id>``), o lo vuelve a
+    encolar si falló.
+    """
+    if not AjusteInventario.objects.filter(pk=ajuste_id).exists():
+        return JsonResponse({"error": f"El ajuste {ajuste_id} no existe."}, status=404)
+    trabajo, creado = trabajos.encolar(
+        "postear_ajuste", {"ajuste_id": ajuste_id, "usuario_id": request.user.pk},
+        clave=f"ajuste:{ajuste_id}", usuario=request.user,
+    )
+    url = reverse("trabajo_estado", args=[trabajo.pk])
+    respuesta = JsonResponse(
+        {"trabajo_id": trabajo.pk, "estado": trabajo.estado, "creado": creado, "url": url}, status=202,
+    )
+    respuesta["Location"] = url
+    return respuesta
+
+
+@login_required
+def trabajo_estado(request, trabajo_id):
+    """Estado y avance de un trabajo; lo ve quien lo creó, staff o ADMIN."""
+    trabajo = Trabajo.objects.filter(pk=trabajo_id).first()
+    if trabajo is None:
+        return JsonResponse({"error": "Trabajo inexistente."}, status=404)
+    usuario = request.user
+    if trabajo.creado_por_id != usuario.pk and not usuario.is_staff and _rol(usuario) != UsuarioPerfil.Rol.ADMIN:
+        return JsonResponse({"error": "Sin permiso."}, status=403)
+    return JsonResponse(trabajos.estado(trabajo))
+
+
+# -------------------- Métricas (Prometheus) --------------------
+def metricas(request):
+    """Histogramas de ``core.instrumentacion`` en formato de texto de Prometheus."""
+    token = settings.INSTRUMENTACION_METRICAS_TOKEN
+    autorizacion = request.headers.get("Authorization", "")
+    permitido = request.user.is_authenticated and request.user.is_superuser
+    if token and hmac.compare_digest(autorizacion.encode(), f"Bearer {token}".encode()):
+        permitido = True
+    if not permitido:
+        return HttpResponse(status=403)
+    return HttpResponse(instrumentacion.metricas_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""
+Punto de entrada liviano para cron y workers: ``python worker.py <comando> [opciones]``.
+
+Frente a ``manage.py``: usa ``bodega.settings_worker`` (sin admin, sesiones,
+mensajes, estáticos ni middleware) y no corre los chequeos del sistema, que
+importan la URLconf, todas las vistas y el admin; esos chequeos corren en el
+deploy con ``manage.py check``. Las conexiones a la base se abren recién en la
+primera consulta. ``manage.py bench_arranque`` compara ambos caminos.
+"""
+import os
+import sys
+
+
+def main():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bodega.settings_worker")
+    if len(sys.argv) < 2 or sys.argv[1] in ("help", "-h", "--help"):
+        from django.core.management import execute_from_command_line
+        execute_from_command_line([sys.argv[0], "help", *sys.argv[2:]])
+        return
+
+    import django
+    from django.core.management import ManagementUtility
+
+    django.setup()
+    comando = ManagementUtility(sys.argv).fetch_command(sys.argv[1])
+    comando.requires_system_checks = []
+    comando.run_from_argv(sys.argv)
+
+
+if __name__ == "__main__":
+    main()